@@ -40,22 +40,126 @@ EXAMPLES:
 
 """
 
-import datetime
-
 import numpy as np
 
-from .utils import Tappy
+from .result import HarmonicResults
+from .utils import Tappy, as_datetime64
 
 deg2rad = np.pi / 180.0
 rad2deg = 180.0 / np.pi
 
 
+def _quiet_tappy(**kwds):
+    """Return a Tappy that prints and writes nothing.
+
+    `kwds` are analysis options that override the defaults.
+    """
+    options = {
+        "outputts": False,
+        "outputxml": "",
+        "quiet": True,
+        "debug": False,
+        "ephemeris": False,
+        "rayleigh": 1.0,
+        "print_vau_table": False,
+        "missing_data": "ignore",
+        "linear_trend": False,
+        "remove_extreme": False,
+        "zero_ts": None,
+        "filter": None,
+        "pad_filters": None,
+        "include_inferred": True,
+    }
+    options.update(kwds)
+    return Tappy(**options)
+
+
+def _fit(x, ray):
+    """Fit the constituents to the observations loaded in the Tappy `x`.
+
+    Returns the astronomic package of the dates that were fitted.
+    """
+    if x.missing_data == "fail":
+        x.dates_filled, x.elevation_filled = x.missing(
+            x.missing_data, x.dates, x.elevation
+        )
+
+    if x.remove_extreme:
+        x.remove_extreme_values()
+
+    package = x.astronomic(x.dates, node_interval=x.node_interval)
+    (
+        x.zeta,
+        x.nu,
+        x.nup,
+        x.nupp,
+        x.kap_p,
+        x.ii,
+        x.R,
+        x.Q,
+        x.T,
+        x.jd,
+        x.s,
+        x.h,
+        x.N,
+        x.p,
+        x.p1,
+    ) = package
+
+    (x.speed_dict, x.key_list) = x.which_constituents(
+        len(x.dates), package, rayleigh_comp=ray
+    )
+    if x.zero_ts:
+        # FIX - have to run the constituents package here in order to have
+        # filters available , and then run AGAIN later on.
+        x.constituents()
+        x.dates_filled, x.elevation_filled = x.missing("fill", x.dates, x.elevation)
+        filter_dates, filtered = x.filters(
+            x.zero_ts, x.dates_filled, x.elevation_filled
+        )
+        # The filters work on hourly values and can trim the ends, so the
+        # filtered series is interpolated to the observations it covers.
+        filter_dates = as_datetime64(filter_dates)
+        keep = (x.dates_filled >= filter_dates[0]) & (
+            x.dates_filled <= filter_dates[-1]
+        )
+        x.dates = x.dates_filled[keep]
+        x.elevation = x.elevation_filled[keep] - np.interp(
+            x.dates2hours(x.dates), x.dates2hours(filter_dates), filtered
+        )
+        package = x.astronomic(x.dates, node_interval=x.node_interval)
+        (
+            x.zeta,
+            x.nu,
+            x.nup,
+            x.nupp,
+            x.kap_p,
+            x.ii,
+            x.R,
+            x.Q,
+            x.T,
+            x.jd,
+            x.s,
+            x.h,
+            x.N,
+            x.p,
+            x.p1,
+        ) = package
+        (x.speed_dict, x.key_list) = x.which_constituents(
+            len(x.dates), package, rayleigh_comp=ray
+        )
+
+    x.constituents()
+    return package
+
+
 def analysis(
     data_filename,
     def_filename=None,
     quiet=False,
     debug=False,
     outputts=False,
+    outputts_file=None,
     outputxml="",
     ephemeris=False,
     rayleigh=1.0,
@@ -67,6 +171,12 @@ def analysis(
     filter=None,
     pad_filters=None,
     include_inferred=True,
+    node_interval=None,
+    parse_workers=None,
+    cache_dir=None,
+    cache_size=1024.0,
+    cache_mtime=False,
+    out_of_core=False,
     xmlname="A port in a storm",
     xmlcountry="A man without a country",
     xmllatitude=0.0,
@@ -89,7 +199,9 @@ def analysis(
         that is parsed with a companion definition file or a CSV, WDM,
         HDF5, or XLSX file.  The options for each file type are listed in
         "tstoolbox read --help" on the command line or "help(tstoolbox.read)
-        in Python.
+        in Python.  Binary ".npy", ".npz", ".h5", ".hdf5", ".parquet", and
+        ".feather" files are read directly into arrays without text
+        parsing, see `tappy.utils.read_binary`.
     def_filename : str, optional
         Contains the definition string to parse the input data.
     quiet : bool, optional
@@ -98,6 +210,13 @@ def analysis(
         Print debug messages.
     outputts : bool, optional
         Output time series for each constituent.
+    outputts_file : str, optional
+        Write the time series of each constituent, their node factors, the
+        total of the tidal components, and the original data as the columns
+        of this one file instead of two files per constituent.  The format
+        is set by the extension: ".csv", ".npz", or ".h5"/".hdf5".  Implies
+        outputts.  The filled and filtered series have their own dates and
+        are still written to separate files.
     ephemeris : bool, optional
         Print out ephemeris tables.
     rayleigh : float, optional
@@ -125,6 +244,36 @@ def analysis(
     include_inferred : bool, optional
         Do not incorporate any inferred constituents into the least squares
         fit.
+    node_interval : float, optional
+        Evaluate the node factors every `node_interval` hours and linearly
+        interpolate to the observation times instead of evaluating them at
+        every observation.  With 24 the relative error of the node factors
+        is at most about 2.5e-6.  Speeds up analysis of long records.
+    parse_workers : int, optional
+        Number of processes used to parse a data file read with a
+        definition file.  Large files are split into chunks at line
+        boundaries that are parsed concurrently.  Default is to parse in
+        this process.
+    cache_dir : str, optional
+        Keep the dates and water levels parsed from text data files in this
+        directory and load them from there when the same data file is
+        analyzed again with the same definition file.  Warnings about lines
+        that could not be parsed are only printed when the file is parsed.
+        Default is no cache.
+    cache_size : float, optional
+        Size limit of `cache_dir` in megabytes.  The least recently used
+        entries are removed to stay under it.  [default: 1024]
+    cache_mtime : bool, optional
+        Identify a data file in the cache by its path, size, and
+        modification time instead of a hash of its content.
+    out_of_core : bool, optional
+        Read the data file in chunks and accumulate the normal equations
+        of the least squares fit one chunk at a time, so that memory does
+        not depend on the length of the record.  Text files need a
+        definition file that can be compiled and binary files must be
+        ".npy" to not be read whole.  Cannot be used with `outputts`,
+        `outputts_file`, `filter`, `zero_ts`, `remove_extreme`, or a
+        `missing_data` other than "ignore", which need the whole record.
     print_vau_table : bool, optional
         For debugging - will print a table of V and u values to compare
         against Schureman.
@@ -160,7 +309,7 @@ def analysis(
         of decimal places.
     """
     x = Tappy(
-        outputts=outputts,
+        outputts=outputts or bool(outputts_file),
         outputxml=outputxml,
         quiet=quiet,
         debug=debug,
@@ -174,6 +323,11 @@ def analysis(
         filter=filter,
         pad_filters=pad_filters,
         include_inferred=include_inferred,
+        node_interval=node_interval,
+        parse_workers=parse_workers,
+        cache_dir=cache_dir,
+        cache_size=cache_size,
+        cache_mtime=cache_mtime,
     )
 
     if ephemeris:
@@ -181,72 +335,26 @@ def analysis(
     if print_vau_table:
         x.print_v_u_table()
 
-    x.open(data_filename, def_filename=def_filename)
-
-    if x.missing_data == "fail":
-        x.dates_filled, x.elevation_filled = x.missing(
-            x.missing_data, x.dates, x.elevation
-        )
-
-    if x.remove_extreme:
-        x.remove_extreme_values()
-
-    package = x.astronomic(x.dates)
-    (
-        x.zeta,
-        x.nu,
-        x.nup,
-        x.nupp,
-        x.kap_p,
-        x.ii,
-        x.R,
-        x.Q,
-        x.T,
-        x.jd,
-        x.s,
-        x.h,
-        x.N,
-        x.p,
-        x.p1,
-    ) = package
-
     ray = float(rayleigh) if rayleigh else 1.0
-    (x.speed_dict, x.key_list) = x.which_constituents(
-        len(x.dates), package, rayleigh_comp=ray
-    )
-    if x.zero_ts:
-        # FIX - have to run the constituents package here in order to have
-        # filters available , and then run AGAIN later on.
-        x.constituents()
-        print(len(x.dates), len(x.elevation))
-        x.dates_filled, x.elevation_filled = x.missing("fill", x.dates, x.elevation)
-        print(len(x.dates_filled), len(x.elevation_filled))
-        x.dates, filtered = x.filters(zero_ts, x.dates_filled, x.elevation_filled)
-        print(len(x.dates), len(filtered))
-        x.elevation = x.elevation_filled - filtered
-        package = x.astronomic(x.dates)
-        (
-            x.zeta,
-            x.nu,
-            x.nup,
-            x.nupp,
-            x.kap_p,
-            x.ii,
-            x.R,
-            x.Q,
-            x.T,
-            x.jd,
-            x.s,
-            x.h,
-            x.N,
-            x.p,
-            x.p1,
-        ) = package
-        (x.speed_dict, x.key_list) = x.which_constituents(
-            len(x.dates), package, rayleigh_comp=ray
+    if out_of_core:
+        if (
+            x.outputts
+            or x.filter
+            or x.zero_ts
+            or x.remove_extreme
+            or x.missing_data != "ignore"
+        ):
+            raise ValueError(
+                "out_of_core cannot be used with outputts, outputts_file, "
+                'filter, zero_ts, remove_extreme, or missing_data other than "ignore"'
+            )
+        x.constituents_streaming(
+            x.read_chunks(data_filename, def_filename=def_filename),
+            rayleigh_comp=ray,
         )
-
-    x.constituents()
+    else:
+        x.open(data_filename, def_filename=def_filename)
+        package = _fit(x, ray)
 
     if x.missing_data == "fill":
         x.dates_filled, x.elevation_filled = x.missing(
@@ -275,8 +383,20 @@ def analysis(
 
     if not x.quiet:
         x.print_con()
+        if x.missing_data == "fill" and x.gaps is not None:
+            x.print_gaps()
 
-    if x.outputts:
+    if outputts_file:
+        columns = {}
+        for key in x.key_list:
+            columns[key] = x.sum_signals([key], x.dates, x.speed_dict)
+            columns[f"ff_{key}"] = x.speed_dict[key]["FF"]
+        columns["total_tidal_components"] = x.sum_signals(
+            x.key_list, x.dates, x.tidal_dict
+        )
+        columns["original"] = x.elevation
+        x.write_table(x.dates, columns, outputts_file)
+    elif x.outputts:
         for key in x.key_list:
             x.write_file(
                 x.dates,
@@ -292,115 +412,157 @@ def analysis(
         x.write_file(x.dates, x.elevation, fname="outts_original.dat")
 
     if x.outputxml:
-        import xml.etree.ElementTree as et
-
-        def indent(elem, level=0):
-            i = f"\n{level * '  '}"
-            if len(elem):
-                if not elem.text or not elem.text.strip():
-                    elem.text = f"{i}  "
-                if not elem.tail or not elem.tail.strip():
-                    elem.tail = i
-                for elem in elem:
-                    indent(elem, level + 1)
-                if not elem.tail or not elem.tail.strip():
-                    elem.tail = i
-            else:
-                if level and (not elem.tail or not elem.tail.strip()):
-                    elem.tail = i
-
-        transfer = et.Element(
-            "Transfer",
-            attrib={
-                "ns0:noNamespaceSchemaLocation": "HC_Schema_V1.xsd",
-                "xmlns:ns0": "http://www.w3.org/2001/XMLSchema-instance",
-            },
+        x.result().to_xml(
+            x.outputxml,
+            name=xmlname,
+            country=xmlcountry,
+            latitude=xmllatitude,
+            longitude=xmllongitude,
+            timezone=xmltimezone,
+            comments=xmlcomments,
+            units=xmlunits,
+            decimalplaces=xmldecimalplaces,
         )
 
-        port = et.SubElement(transfer, "Port")
-
-        name = et.SubElement(port, "name")
-        name.text = xmlname
-
-        country = et.SubElement(port, "country")
-        country.text = xmlcountry
-
-        position = et.SubElement(port, "position")
-
-        latitude = et.SubElement(position, "latitude")
-        latitude.text = str(xmllatitude)
-
-        longitude = et.SubElement(position, "longitude")
-        longitude.text = str(xmllongitude)
-
-        timezone = et.SubElement(port, "timeZone")
-        timezone.text = str(xmltimezone)
-
-        units = et.SubElement(port, "units")
-        units.text = str(xmlunits)
-
-        observationstart = et.SubElement(port, "observationStart")
-        observationstart.text = x.dates[0].isoformat()
-
-        comments = et.SubElement(port, "comments")
-        comments.text = xmlcomments
-
-        observationend = et.SubElement(port, "observationEnd")
-        observationend.text = x.dates[-1].isoformat()
-
-        ndict = {"Z0": 0.0}
-        for k in x.key_list + x.inferred_key_list:
-            ndict[k] = x.tidal_dict[k]["speed"]
-        klist = [i[0] for i in x.sortbyvalue(ndict)]
-
-        if xmldecimalplaces == "ihotc":
-            ampformatstr = "{0:.3f}"
-            phaformatstr = "{0:.1f}"
-            daterange = x.dates[-1] - x.dates[0]
-            if daterange < datetime.timedelta(days=90):
-                ampformatstr = "{0:.2f}"
-                phaformatstr = "{0:.0f}"
-        elif xmldecimalplaces == "full":
-            ampformatstr = "{0}"
-            phaformatstr = ampformatstr
-        else:
-            ampformatstr = f"{{0:.{xmldecimalplaces}f}}"
-            phaformatstr = ampformatstr
-
-        for key in klist:
-            if key in x.key_list:
-                if float(ampformatstr.format(x.r[key])) == 0.0:
-                    continue
-            elif key in x.inferred_key_list:
-                if float(ampformatstr.format(x.inferred_r[key])) == 0.0:
-                    continue
-
-            tmp = et.SubElement(port, "Harmonic")
-
-            hname = et.SubElement(tmp, "name")
-            hname.text = key
-
-            speed = et.SubElement(tmp, "speed")
-            inferred = et.SubElement(tmp, "inferred")
-            phaseangle = et.SubElement(tmp, "phaseAngle")
-            amplitude = et.SubElement(tmp, "amplitude")
-
-            if key in x.key_list:
-                inferred.text = "false"
-                amplitude.text = ampformatstr.format(x.r[key])
-                phaseangle.text = phaformatstr.format(x.phase[key])
-                speed.text = str(x.tidal_dict[key]["speed"] * rad2deg)
-            elif key in x.inferred_key_list:
-                inferred.text = "true"
-                amplitude.text = ampformatstr.format(x.inferred_r[key])
-                phaseangle.text = phaformatstr.format(x.inferred_phase[key])
-                speed.text = str(x.tidal_dict[key]["speed"] * rad2deg)
-            elif key == "Z0":
-                inferred.text = "false"
-                amplitude.text = ampformatstr.format(x.fitted_average)
-                phaseangle.text = phaformatstr.format(0.0)
-                speed.text = "0.0"
-
-        indent(transfer)
-        tree = et.ElementTree(transfer)
-        tree.write(x.outputxml)
+
+def analyze(
+    dates,
+    elevation=None,
+    rayleigh=1.0,
+    missing_data="ignore",
+    linear_trend=False,
+    remove_extreme=False,
+    zero_ts=None,
+    include_inferred=True,
+    node_interval=None,
+):
+    """
+    Harmonic analysis of water levels that are already in memory.
+
+    Same analysis as `analysis`, but the observations are passed as arrays
+    instead of a file name, nothing is printed or written, and the result
+    is returned.
+
+    Parameters
+    ----------
+    dates : array or pandas.Series
+        The observation times as a datetime64 array, a pandas
+        DatetimeIndex, or a sequence of datetime.datetime.  If `elevation`
+        is None, a pandas Series of water levels with a DatetimeIndex.
+        datetime64[ns] dates and float64 water levels are used without
+        making a copy.
+    elevation : array, optional
+        The water level at each of `dates`.
+    rayleigh : float, optional
+        The Rayleigh coefficient, see `analysis`.
+    missing_data : str, optional
+        One of "fail" or "ignore", see `analysis`.  "fail" stops with
+        SystemExit if there is a gap of more than an hour.
+    linear_trend : bool, optional
+        Include a linear trend in the least squares fit.
+    remove_extreme : bool, optional
+        Remove values outside of 2 standard deviations before analysis.
+    zero_ts : str, optional
+        Zero the time series with this filter before analysis, see
+        `analysis`.
+    include_inferred : bool, optional
+        Include the inferred constituents.
+    node_interval : float, optional
+        Interval in hours of the node factor grid, see `analysis`.
+
+    Returns
+    -------
+    tappy.result.HarmonicResult
+        Speed, amplitude, and phase of each constituent, the average (Z0),
+        and the slope of the linear trend.
+    """
+    if elevation is None:
+        elevation = dates.to_numpy()
+        dates = dates.index
+    x = _quiet_tappy(
+        rayleigh=rayleigh,
+        missing_data=missing_data,
+        linear_trend=linear_trend,
+        remove_extreme=remove_extreme,
+        zero_ts=zero_ts,
+        include_inferred=include_inferred,
+        node_interval=node_interval,
+    )
+    x.load(dates, elevation)
+    _fit(x, float(rayleigh) if rayleigh else 1.0)
+    return x.result()
+
+
+def analyze_many(
+    dates,
+    elevation,
+    rayleigh=1.0,
+    linear_trend=False,
+    include_inferred=True,
+    node_interval=None,
+):
+    """
+    Harmonic analysis of many series sampled at the same dates.
+
+    The astronomic arguments, node factors, and design matrix are computed
+    once and the normal equations are factored once for all of the series,
+    which are solved as multiple right hand sides.  Gives the same result
+    as `analyze` of each series, to the tolerance of the fit of the
+    inferred constituents.
+
+    Parameters
+    ----------
+    dates : array
+        The observation times as a datetime64 array, a pandas
+        DatetimeIndex, or a sequence of datetime.datetime.
+    elevation : array
+        A 2-D (time, series) array of water levels, or a pandas DataFrame
+        with a column for each series.  Read one block of times at a time,
+        so it can be a numpy.memmap larger than memory.  Must not have
+        missing values.
+    rayleigh : float, optional
+        The Rayleigh coefficient, see `analysis`.
+    linear_trend : bool, optional
+        Include a linear trend in the least squares fit.
+    include_inferred : bool, optional
+        Include the inferred constituents.
+    node_interval : float, optional
+        Interval in hours of the node factor grid, see `analysis`.
+
+    Returns
+    -------
+    tappy.result.HarmonicResults
+        The amplitude and phase of each constituent as (series,
+        constituent) arrays and the average and slope of each series.
+    """
+    if hasattr(elevation, "to_numpy"):
+        elevation = elevation.to_numpy()
+    elevation = np.asarray(elevation)
+    x = _quiet_tappy(
+        rayleigh=rayleigh,
+        linear_trend=linear_trend,
+        include_inferred=include_inferred,
+        node_interval=node_interval,
+    )
+    x.dates = as_datetime64(dates)
+    if elevation.ndim != 2 or len(elevation) != len(x.dates):
+        raise ValueError("elevation must be a (time, series) array of the dates")
+    if np.any(np.diff(x.dates) < np.timedelta64(0)):
+        raise ValueError("The dates must be increasing")
+    package = x.astronomic(x.dates, node_interval=x.node_interval)
+    x.jd = package[9]
+    (x.speed_dict, x.key_list) = x.which_constituents(
+        len(x.dates), package, rayleigh_comp=float(rayleigh) if rayleigh else 1.0
+    )
+    keys, amplitude, phase, average, slope = x.constituents_many(elevation)
+    return HarmonicResults.from_arrays(
+        keys,
+        [x.tidal_dict[key]["speed"] * rad2deg for key in keys],
+        x.inferred_key_list,
+        amplitude,
+        phase,
+        average,
+        slope,
+        start=x.dates[0],
+        end=x.dates[-1],
+    )
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+
+"""
+NAME:
+    batch.py
+
+SYNOPSIS:
+    tappy batch-analysis [options] manifest
+
+DESCRIPTION:
+    Harmonic analysis of many stations listed in a manifest.
+
+    The stations are analyzed by a pool of worker processes that each
+    import tappy and load the time scale once and then analyze one station
+    after another.  The constituents of each station are written to their
+    own file and a summary table of all of the stations is written at the
+    end.
+
+#Copyright (C) 2026  Tim Cera timcera@earthlink.net
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+"""
+
+import contextlib
+import csv
+import io
+import time
+from pathlib import Path
+
+from .analysis import _fit, _quiet_tappy
+
+output_formats = {"xml": ".xml", "json": ".json", "npz": ".npz"}
+
+# Manifest columns that complete the XML file, and the to_xml keyword for
+# each.
+_port_columns = {
+    "country": "country",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "timezone": "timezone",
+    "comments": "comments",
+    "units": "units",
+}
+
+# Manifest columns that override the analysis options for the station.
+_option_columns = ("missing_data", "zero_ts")
+
+summary_columns = [
+    "name",
+    "data_filename",
+    "status",
+    "output",
+    "start",
+    "end",
+    "observations",
+    "constituents",
+    "average",
+    "slope",
+    "seconds",
+]
+
+
+def read_manifest(manifest):
+    """Return the stations in the CSV file `manifest` as a list of dicts.
+
+    The "data_filename" column is required.  "def_filename" and "name",
+    which defaults to the stem of the data file, are optional, as are the
+    "country", "latitude", "longitude", "timezone", "comments", and "units"
+    columns that are copied into the XML files and the "missing_data" and
+    "zero_ts" columns that override the analysis options.  Relative file
+    names are relative to the directory of the manifest.
+    """
+    manifest = Path(manifest)
+    with open(manifest, newline="", encoding="utf-8") as fpi:
+        rows = list(csv.DictReader(fpi, skipinitialspace=True))
+    if rows and "data_filename" not in rows[0]:
+        raise ValueError(f'The manifest "{manifest}" has no "data_filename" column')
+    stations = []
+    for row in rows:
+        row = {key: value for key, value in row.items() if value}
+        if "data_filename" not in row:
+            continue
+        for key in ("data_filename", "def_filename"):
+            if key in row:
+                row[key] = str(manifest.parent / row[key])
+        row.setdefault("name", Path(row["data_filename"]).stem)
+        stations.append(row)
+    return stations
+
+
+def _analyze_station(station, options, output_dir, output_format, xml_options):
+    """Analyze one station of the manifest and write its constituents.
+
+    Runs in a worker process.  Everything the analysis prints is captured;
+    if the analysis stops or fails, or the output cannot be written, the
+    last printed line or the error is the status in the summary.  Station
+    names that are not plain file names, for example with a path
+    separator, are an error of the station.
+
+    Returns the row of the summary table.
+    """
+    begin = time.perf_counter()
+    summary = {
+        "name": station["name"],
+        "data_filename": station["data_filename"],
+    }
+    options = {
+        **options,
+        **{column: station[column] for column in _option_columns if column in station},
+    }
+    printed = io.StringIO()
+    try:
+        name = station["name"]
+        if name in ("", ".", "..") or Path(name).name != name:
+            raise ValueError(
+                f'The station name "{name}" cannot be used as a file name'
+            )
+        with contextlib.redirect_stdout(printed):
+            x = _quiet_tappy(**options)
+            x.open(station["data_filename"], def_filename=station.get("def_filename"))
+            _fit(x, float(options["rayleigh"]) if options["rayleigh"] else 1.0)
+            result = x.result()
+
+        output = Path(output_dir) / f"{name}{output_formats[output_format]}"
+        if output_format == "xml":
+            port = {
+                keyword: station[column]
+                for column, keyword in _port_columns.items()
+                if column in station
+            }
+            result.to_xml(output, name=name, **{**xml_options, **port})
+        elif output_format == "json":
+            result.to_json(output)
+        else:
+            result.save(output)
+    except (Exception, SystemExit) as error:
+        lines = printed.getvalue().strip().splitlines()
+        summary["status"] = str(error) or (lines[-1] if lines else repr(error))
+        summary["seconds"] = time.perf_counter() - begin
+        return summary
+
+    summary.update(
+        status="ok",
+        output=str(output),
+        start=result.start,
+        end=result.end,
+        observations=len(x.dates),
+        constituents=len(result),
+        average=result.average,
+        slope=result.slope,
+        seconds=time.perf_counter() - begin,
+    )
+    return summary
+
+
+def batch_analysis(
+    manifest,
+    output_dir=".",
+    output_format="xml",
+    summary="summary.csv",
+    workers=None,
+    rayleigh=1.0,
+    missing_data="ignore",
+    linear_trend=False,
+    remove_extreme=False,
+    zero_ts=None,
+    include_inferred=True,
+    node_interval=None,
+    cache_dir=None,
+    cache_size=1024.0,
+    cache_mtime=False,
+    xmlunits="m",
+    xmldecimalplaces="full",
+):
+    """
+    Analyze every station in a manifest with a pool of processes.
+
+    Parameters
+    ----------
+    manifest : str
+        CSV file with a header and one row per station.  The
+        "data_filename" column is required.  Optional columns are
+        "def_filename", "name" for the name of the output file, without a
+        path separator, and the station name in the XML file (default is
+        the stem of the data file), and "country", "latitude", "longitude", "timezone",
+        "comments", and "units" that are copied into the XML file.  The
+        "missing_data" and "zero_ts" columns override the options of the
+        same name for a station.  Relative file names are relative to the
+        directory of the manifest.
+    output_dir : str, optional
+        Directory for the constituent files and the summary.  Created if
+        needed.  [default: .]
+    output_format : str, optional
+        Format of the constituent file of each station.  One of "xml"
+        (IHOTC XML transfer format), "json", or "npz" (see
+        tappy.result.HarmonicResult).  [default: xml]
+    summary : str, optional
+        Name of the CSV summary table in `output_dir` with one row per
+        station listing the status ("ok" or why the analysis failed), the
+        output file, the first and last dates, the number of observations
+        and constituents, the average, the slope, and the run time in
+        seconds.  [default: summary.csv]
+    workers : int, optional
+        Number of worker processes.  Default is the number of CPUs.  With
+        1 the stations are analyzed in this process.
+    rayleigh : float, optional
+        The Rayleigh coefficient, see "tappy analysis".
+    missing_data : str, optional
+        One of "fail" or "ignore", see "tappy analysis".
+    linear_trend : bool, optional
+        Include a linear trend in the least squares fit.
+    remove_extreme : bool, optional
+        Remove values outside of 2 standard deviations before analysis.
+    zero_ts : str, optional
+        Zero the time series with this filter before analysis, see
+        "tappy analysis".
+    include_inferred : bool, optional
+        Include the inferred constituents.
+    node_interval : float, optional
+        Interval in hours of the node factor grid, see "tappy analysis".
+    cache_dir : str, optional
+        Cache of parsed data files, see "tappy analysis".
+    cache_size : float, optional
+        Size limit of `cache_dir` in megabytes.  [default: 1024]
+    cache_mtime : bool, optional
+        Identify data files in the cache by path, size, and modification
+        time.
+    xmlunits : str, optional
+        Units in the XML files of stations without a "units" column.
+        [default: m]
+    xmldecimalplaces : str, optional
+        Decimal places in the XML files, see "tappy analysis".
+        [default: full]
+    """
+    if output_format not in output_formats:
+        raise ValueError(
+            f"output_format must be one of {', '.join(output_formats)}, "
+            f'not "{output_format}"'
+        )
+    stations = read_manifest(manifest)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    options = {
+        "rayleigh": rayleigh,
+        "missing_data": missing_data,
+        "linear_trend": linear_trend,
+        "remove_extreme": remove_extreme,
+        "zero_ts": zero_ts,
+        "include_inferred": include_inferred,
+        "node_interval": node_interval,
+        "cache_dir": cache_dir,
+        "cache_size": cache_size,
+        "cache_mtime": cache_mtime,
+    }
+    xml_options = {"units": xmlunits, "decimalplaces": xmldecimalplaces}
+    arguments = (
+        stations,
+        [options] * len(stations),
+        [output_dir] * len(stations),
+        [output_format] * len(stations),
+        [xml_options] * len(stations),
+    )
+    workers = int(workers) if workers else None
+    if workers == 1 or len(stations) <= 1:
+        rows = list(map(_analyze_station, *arguments))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows = list(pool.map(_analyze_station, *arguments))
+
+    with open(output_dir / summary, "w", newline="", encoding="utf-8") as fpo:
+        writer = csv.DictWriter(fpo, fieldnames=summary_columns)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+
+"""
+NAME:
+    incremental.py
+
+SYNOPSIS:
+    tappy update [options] state_filename data_filename
+
+DESCRIPTION:
+    Harmonic analysis that is updated with new observations.
+
+    The state of the analysis is the normal equations of the least squares
+    fit of every candidate constituent, the number of observations, the
+    epoch, and the date of the last observation.  New observations are
+    added to the normal equations in time proportional to their number and
+    the constituents are solved from the normal equations, so the earlier
+    observations are never needed again.  The state is saved to and loaded
+    from a ".npz" file.
+
+#Copyright (C) 2026  Tim Cera timcera@earthlink.net
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from .analysis import _quiet_tappy
+from .utils import as_datetime64, min_hours
+
+# Bump when the layout of a saved state changes so that old states are
+# never loaded.
+state_version = 1
+
+
+class IncrementalAnalysis:
+    """Harmonic analysis of observations that arrive over time.
+
+    Parameters
+    ----------
+    rayleigh : float, optional
+        The Rayleigh coefficient, see `tappy.analysis.analysis`.
+    linear_trend : bool, optional
+        Include a linear trend in the least squares fit.
+    include_inferred : bool, optional
+        Include the inferred constituents.
+    node_interval : float, optional
+        Interval in hours of the node factor grid, see
+        `tappy.analysis.analysis`.
+    forgetting : float, optional
+        Between 0 and 1.  The weight of an observation in the fit is
+        multiplied by `forgetting` for every hour it is older than the last
+        observation, so the constituents follow slow changes, for example
+        in an estuary.  The constituents are then chosen for a record of at
+        most the time constant -1 / ln(forgetting) hours.  Default is to
+        weight all observations the same.
+    """
+
+    def __init__(
+        self,
+        rayleigh=1.0,
+        linear_trend=False,
+        include_inferred=True,
+        node_interval=None,
+        forgetting=None,
+    ):
+        if forgetting is not None and not 0 < float(forgetting) <= 1:
+            raise ValueError(f"forgetting must be between 0 and 1, not {forgetting}")
+        self.rayleigh = float(rayleigh) if rayleigh else 1.0
+        self.forgetting = float(forgetting) if forgetting else None
+        self._tappy = _quiet_tappy(
+            linear_trend=linear_trend,
+            include_inferred=include_inferred,
+            node_interval=float(node_interval) if node_interval else None,
+        )
+        self._started = False
+
+    @property
+    def nobs(self):
+        """Number of observations added."""
+        return self._tappy.nobs if self._started else 0
+
+    @property
+    def start(self):
+        """The epoch, the first observation time, or None."""
+        return self._tappy.dates[0] if self._started else None
+
+    @property
+    def end(self):
+        """The last observation time, or None."""
+        return self._tappy.last_date if self._started else None
+
+    def update(self, dates, elevation):
+        """Add observations, see `add`, and return the updated `result`."""
+        self.add(dates, elevation)
+        return self.result()
+
+    def add(self, dates, elevation):
+        """Add observations to the normal equations.
+
+        Observations at or before the last one already added are skipped,
+        so data that overlaps the previous update can be passed again.
+
+        Parameters
+        ----------
+        dates : array
+            The observation times as a datetime64 array, a pandas
+            DatetimeIndex, or a sequence of datetime.datetime, increasing.
+        elevation : array
+            The water level at each of `dates`.
+        """
+        dates = as_datetime64(dates)
+        if dates is None:
+            raise ValueError("The dates must be datetime64 or datetime.datetime")
+        elevation = np.asarray(elevation, dtype="float64")
+        if elevation.shape != dates.shape:
+            raise ValueError("The dates and elevation must have the same length")
+        x = self._tappy
+        if self._started:
+            new = dates > x.last_date
+            dates = dates[new]
+            elevation = elevation[new]
+        if len(dates):
+            if not self._started:
+                x.start_normal_equations(dates[0])
+                self._started = True
+            x.add_observations(dates, elevation, forgetting=self.forgetting)
+
+    def result(self):
+        """Return the constituents of the observations added so far as a
+        tappy.result.HarmonicResult.
+        """
+        x = self._tappy
+        if not self._started:
+            raise ValueError("No observations have been added")
+        span = (x.last_date - x.dates[0]) / np.timedelta64(1, "h")
+        if span < min_hours:
+            raise ValueError(
+                f"Cannot calculate any constituents from {span} hours of observations"
+            )
+        max_hours = None
+        if self.forgetting and self.forgetting < 1:
+            max_hours = -1 / np.log(self.forgetting)
+        x.solve_normal_equations(self.rayleigh, max_hours=max_hours)
+        return x.result()
+
+    def save(self, filename):
+        """Write the state to the ".npz" file `filename`.
+
+        The state is written to a temporary file that is renamed into
+        place, so `filename` is always a complete state.
+        """
+        x = self._tappy
+        if not self._started:
+            raise ValueError("No observations have been added")
+        filename = Path(filename)
+        fd, tmpname = tempfile.mkstemp(
+            dir=filename.resolve().parent, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                np.savez(
+                    fp,
+                    version=state_version,
+                    ata=x.ata,
+                    aty=x.aty,
+                    counts=np.array([x.nobs, x.weight, x.total]),
+                    dates=np.array([x.dates[0], x.last_date]),
+                    candidates=np.array(x.candidate_keys),
+                    options=np.array(
+                        [
+                            self.rayleigh,
+                            x.linear_trend,
+                            x.include_inferred,
+                            x.node_interval or np.nan,
+                            self.forgetting or np.nan,
+                        ],
+                        dtype="f8",
+                    ),
+                )
+            os.replace(tmpname, filename)
+        except BaseException:
+            Path(tmpname).unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, filename):
+        """Read a state written by save."""
+        with np.load(filename) as state:
+            if int(state["version"]) != state_version:
+                raise ValueError(
+                    f'"{filename}" is a version {state["version"]} state, '
+                    f"not {state_version}"
+                )
+            rayleigh, linear_trend, include_inferred, node_interval, forgetting = (
+                None if np.isnan(value) else value for value in state["options"]
+            )
+            analysis = cls(
+                rayleigh=rayleigh,
+                linear_trend=bool(linear_trend),
+                include_inferred=bool(include_inferred),
+                node_interval=node_interval,
+                forgetting=forgetting,
+            )
+            x = analysis._tappy
+            x.start_normal_equations(state["dates"][0])
+            if x.candidate_keys != state["candidates"].tolist():
+                raise ValueError(
+                    f'The constituents of "{filename}" are not those of this '
+                    "version of tappy"
+                )
+            x.ata = state["ata"]
+            x.aty = state["aty"]
+            nobs, x.weight, x.total = state["counts"]
+            x.nobs = int(nobs)
+            x.last_date = state["dates"][1]
+        analysis._started = True
+        return analysis
+
+
+def update(
+    state_filename,
+    data_filename,
+    def_filename=None,
+    quiet=False,
+    rayleigh=1.0,
+    linear_trend=False,
+    include_inferred=True,
+    node_interval=None,
+    forgetting=None,
+    outputxml="",
+    xmlname="A port in a storm",
+    xmlunits="m",
+    xmldecimalplaces="full",
+):
+    """
+    Add new observations to a saved analysis state and print the updated
+    constituents.
+
+    The state holds the normal equations of the least squares fit, so only
+    the new observations are read and the update takes time proportional
+    to their number.  The state file is created if it does not exist and
+    rewritten after the update.
+
+    Parameters
+    ----------
+    state_filename : str
+        The ".npz" file with the state of the analysis.
+    data_filename : str
+        The new observations, see "tappy analysis".  Observations at or
+        before the last one in the state are skipped, so the file can
+        overlap the one of the previous update.
+    def_filename : str, optional
+        Contains the definition string to parse the input data.
+    quiet : bool, optional
+        Print nothing to the screen.
+    rayleigh : float, optional
+        The Rayleigh coefficient, see "tappy analysis".  Only used when
+        the state is created, after that the options of the state are
+        used.
+    linear_trend : bool, optional
+        Include a linear trend in the least squares fit.  Only used when
+        the state is created.
+    include_inferred : bool, optional
+        Include the inferred constituents.  Only used when the state is
+        created.
+    node_interval : float, optional
+        Interval in hours of the node factor grid, see "tappy analysis".
+        Only used when the state is created.
+    forgetting : float, optional
+        Between 0 and 1.  The weight of an observation is multiplied by
+        `forgetting` for every hour it is older than the last observation
+        so that the constituents follow slow changes.  Only used when the
+        state is created.  Default is no forgetting.
+    outputxml : str, optional
+        File name to output constituents as IHOTC XML format.
+    xmlname : str, optional
+        Name of the station in the XML file.
+    xmlunits : str, optional
+        Units of the observed water level in the XML file.
+    xmldecimalplaces : str, optional
+        Decimal places in the XML file, see "tappy analysis".
+    """
+    if Path(state_filename).exists():
+        state = IncrementalAnalysis.load(state_filename)
+    else:
+        state = IncrementalAnalysis(
+            rayleigh=rayleigh,
+            linear_trend=linear_trend,
+            include_inferred=include_inferred,
+            node_interval=node_interval,
+            forgetting=forgetting,
+        )
+    for dates, elevation in _quiet_tappy().read_chunks(
+        data_filename, def_filename=def_filename
+    ):
+        state.add(dates, elevation)
+    result = state.result()
+    state.save(state_filename)
+
+    if not quiet:
+        state._tappy.print_con()
+    if outputxml:
+        result.to_xml(
+            outputxml,
+            name=xmlname,
+            units=xmlunits,
+            decimalplaces=xmldecimalplaces,
+        )
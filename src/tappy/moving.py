@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+"""
+NAME:
+    moving.py
+
+SYNOPSIS:
+    tappy moving-analysis [options] data_filename
+
+DESCRIPTION:
+    Harmonic analysis in a window moved along the record.
+
+    The amplitude and phase of each constituent are found for overlapping
+    windows to follow changes of the tide with time.  The normal equations
+    of the least squares fit are updated from one window to the next by
+    adding the observations that enter the window and removing those that
+    leave it, instead of fitting every window from the start.
+
+#Copyright (C) 2026  Tim Cera timcera@earthlink.net
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+"""
+
+import numpy as np
+
+from .analysis import _quiet_tappy
+
+
+def _moving_columns(x, dates, elevation, window, step, rayleigh):
+    """Run Tappy.constituents_moving on `x` and return the window starts
+    and the columns of the output table.
+    """
+    if not float(window) > 0 or not float(step) > 0:
+        raise ValueError(
+            f"window and step must be positive, not {window} and {step}"
+        )
+    starts, keys, amplitude, phase, average, slope, nobs = x.constituents_moving(
+        dates,
+        elevation,
+        window,
+        step,
+        rayleigh_comp=float(rayleigh) if rayleigh else 1.0,
+    )
+    columns = {}
+    for index, key in enumerate(keys):
+        columns[f"{key}_amplitude"] = amplitude[:, index]
+        columns[f"{key}_phase"] = phase[:, index]
+    columns["average"] = average
+    if x.linear_trend:
+        columns["slope"] = slope
+    columns["observations"] = nobs
+    return starts, columns
+
+
+def analyze_moving(
+    dates,
+    elevation=None,
+    window=720.0,
+    step=24.0,
+    rayleigh=1.0,
+    linear_trend=False,
+    include_inferred=True,
+    node_interval=None,
+):
+    """
+    Harmonic analysis in a window moved along water levels in memory.
+
+    Parameters
+    ----------
+    dates : array or pandas.Series
+        The observation times as a datetime64 array, a pandas
+        DatetimeIndex, or a sequence of datetime.datetime.  If `elevation`
+        is None, a pandas Series of water levels with a DatetimeIndex.
+    elevation : array, optional
+        The water level at each of `dates`.  Values that are not finite
+        are skipped.
+    window : float, optional
+        Length of the window in hours.  The constituents are those that a
+        record this long can separate, see "tappy analysis".  [default:
+        720]
+    step : float, optional
+        Hours the window moves between analyses.  [default: 24]
+    rayleigh : float, optional
+        The Rayleigh coefficient, see `tappy.analysis.analysis`.
+    linear_trend : bool, optional
+        Include a linear trend in the least squares fit of each window.
+    include_inferred : bool, optional
+        Include the inferred constituents.
+    node_interval : float, optional
+        Interval in hours of the node factor grid, see
+        `tappy.analysis.analysis`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per window indexed by the first observation time in the
+        window, which is the time the phases are referenced to, with the
+        columns "{name}_amplitude" and "{name}_phase" (degrees) of each
+        constituent, "average" (Z0), "slope" if `linear_trend`, and the
+        number of "observations".
+    """
+    import pandas as pd
+
+    if elevation is None:
+        elevation = dates.values
+        dates = dates.index
+    x = _quiet_tappy(
+        linear_trend=linear_trend,
+        include_inferred=include_inferred,
+        node_interval=node_interval,
+    )
+    starts, columns = _moving_columns(x, dates, elevation, window, step, rayleigh)
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(starts, name="Datetime"))
+
+
+def moving_analysis(
+    data_filename,
+    def_filename=None,
+    window=720.0,
+    step=24.0,
+    output="moving.csv",
+    rayleigh=1.0,
+    linear_trend=False,
+    include_inferred=True,
+    node_interval=None,
+    parse_workers=None,
+    cache_dir=None,
+    cache_size=1024.0,
+    cache_mtime=False,
+):
+    """
+    Harmonic analysis in a window moved along the record.
+
+    Writes the amplitude and phase of each constituent in every window as
+    time series.  The least squares fit is not repeated for every window,
+    the observations that enter the window are added and those that leave
+    are removed from the normal equations of the window before, which are
+    accumulated from scratch every 64 windows to keep rounding errors
+    small.  The phases of each window are referenced to V + u of its first
+    observation, like an analysis of the window alone.  With inferred
+    constituents the nonlinear fit of each window starts from the solution
+    of the window before, which usually needs only a few iterations.
+
+    Parameters
+    ----------
+    data_filename : str
+        The time-series of elevations to be analyzed, see "tappy analysis".
+    def_filename : str, optional
+        Contains the definition string to parse the input data.
+    window : float, optional
+        Length of the window in hours.  The constituents are those that a
+        record this long can separate, the same for every window.
+        [default: 720]
+    step : float, optional
+        Hours the window moves between analyses.  [default: 24]
+    output : str, optional
+        Output file with one row per window: the first observation time in
+        the window, "{name}_amplitude" and "{name}_phase" of each
+        constituent, "average", "slope" with `linear_trend`, and the
+        number of "observations".  The format is set by the extension:
+        ".csv", ".npz", or ".h5"/".hdf5".  [default: moving.csv]
+    rayleigh : float, optional
+        The Rayleigh coefficient, see "tappy analysis".
+    linear_trend : bool, optional
+        Include a linear trend in the least squares fit of each window.
+    include_inferred : bool, optional
+        Include the inferred constituents.
+    node_interval : float, optional
+        Interval in hours of the node factor grid, see "tappy analysis".
+    parse_workers : int, optional
+        Number of processes used to parse a data file, see "tappy
+        analysis".
+    cache_dir : str, optional
+        Cache of parsed data files, see "tappy analysis".
+    cache_size : float, optional
+        Size limit of `cache_dir` in megabytes.  [default: 1024]
+    cache_mtime : bool, optional
+        Identify data files in the cache by path, size, and modification
+        time.
+    """
+    x = _quiet_tappy(
+        linear_trend=linear_trend,
+        include_inferred=include_inferred,
+        node_interval=float(node_interval) if node_interval else None,
+        parse_workers=parse_workers,
+        cache_dir=cache_dir,
+        cache_size=cache_size,
+        cache_mtime=cache_mtime,
+    )
+    x.open(data_filename, def_filename=def_filename)
+    starts, columns = _moving_columns(
+        x, x.dates, x.elevation, window, step, rayleigh
+    )
+    x.write_table(starts, columns, output)
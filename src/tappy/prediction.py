@@ -39,6 +39,7 @@ EXAMPLES:
 
 """
 
+import contextlib
 import datetime
 from contextlib import suppress
 
@@ -49,9 +50,20 @@ from .utils import Util
 deg2rad = np.pi / 180.0
 rad2deg = 180.0 / np.pi
 
+# Number of times predicted and written at once.
+chunk_size = 131072
+
 
 def prediction(
-    xml_filename, start_date, end_date, interval, include_inferred=True, fname="-"
+    xml_filename,
+    start_date,
+    end_date,
+    interval,
+    include_inferred=True,
+    fname="-",
+    node_interval=None,
+    phasor=False,
+    decimals=None,
 ):
     """Prediction based upon earlier constituent analysis saved in IHOTC XML transfer format.
 
@@ -69,6 +81,18 @@ def prediction(
         Include the inferred constituents.
     fname : str, optional
         Output filename, default is '-' to print to screen.
+    node_interval : float, optional
+        Evaluate the node factors every `node_interval` hours and linearly
+        interpolate to the prediction times.  With 24 the relative error of
+        the node factors is at most about 2.5e-6.
+    phasor : bool, optional
+        Advance each constituent from one time to the next by complex
+        multiplication instead of evaluating a cosine at every time.
+        Faster for long predictions and agrees with the default to
+        rounding error.
+    decimals : int, optional
+        Number of decimal places written for the water levels.  Default is
+        full precision.
     """
     import xml.etree.ElementTree as et
 
@@ -78,7 +102,7 @@ def prediction(
     phasein = {}
     skey_list = []
     for constituent in root.iter("Harmonic"):
-        inf = constituent.findtext("inferred")
+        inf = constituent.findtext("inferred") or "false"
         if (not include_inferred) and (inf.lower() == "true"):
             continue
         nam = constituent.findtext("name")
@@ -88,33 +112,58 @@ def prediction(
         phasein[nam] = float(pha)
         skey_list.append(nam)
 
-    u = Util(rin, phasein)
-    u.dates = [datetime.datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%S")]
-    delta = datetime.timedelta(minutes=int(interval))
-    nextdate = u.dates[0] + delta
-    end_date = datetime.datetime.strptime(
-        end_date, "%Y-%m-%dT%H:%M:%S"
-    ) + datetime.timedelta(minutes=1)
-    while nextdate < end_date:
-        u.dates.append(nextdate)
-        nextdate = u.dates[-1] + delta
-
-    package = u.astronomic(u.dates)
-    (zeta, nu, nup, nupp, kap_p, ii, R, Q, T, u.jd, s, h, Nv, p, p1) = package
-
-    # Should change this - runs ONLY to get tidal_dict filled in...
-    (_, key_list) = u.which_constituents(len(u.dates), package)
-
-    prediction = 0.0
+    u = Util(rin, phasein, node_interval=node_interval)
+    start_date = np.datetime64(
+        datetime.datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%S"), "ns"
+    )
+    end_date = np.datetime64(
+        datetime.datetime.strptime(end_date, "%Y-%m-%dT%H:%M:%S"), "ns"
+    ) + np.timedelta64(1, "m")
+    delta = np.timedelta64(int(interval), "m")
+    step = float(interval) / 60.0
+    count = max(1, -((start_date - end_date) // delta))
+
+    z0 = 0.0
     with suppress(KeyError):
-        prediction = rin["Z0"]
+        z0 = rin["Z0"]
 
     with suppress(ValueError):
         skey_list.remove("Z0")
 
-    calcdates = (
-        np.array(list(range(len(u.dates))), dtype=np.float64) * float(interval) / 60.0
-    )
-    prediction = prediction + u.sum_signals(skey_list, calcdates, u.tidal_dict)
-
-    u.write_file(u.dates, prediction, fname=fname)
+    # The prediction is made and written one chunk of times at a time so
+    # that memory use does not depend on the length of the prediction.
+    # Speed and V + u are from the first date, the node factors from each
+    # chunk.
+    with contextlib.ExitStack() as stack:
+        for start in range(0, count, chunk_size):
+            stop = min(start + chunk_size, count)
+            u.dates = start_date + np.arange(start, stop) * delta
+            package = u.astronomic(u.dates, node_interval=u.node_interval)
+            (zeta, nu, nup, nupp, kap_p, ii, R, Q, T, u.jd, s, h, Nv, p, p1) = package
+
+            if start == 0:
+                # Should change this - runs ONLY to get tidal_dict filled in...
+                (_, key_list) = u.which_constituents(len(u.dates), package)
+                first = tidal_dict = u.tidal_dict
+            else:
+                chunk_dict = u.tidal_constituents(len(u.dates), package)
+                tidal_dict = {
+                    key: {
+                        "speed": first[key]["speed"],
+                        "VAU": first[key]["VAU"],
+                        "FF": chunk_dict[key]["FF"],
+                    }
+                    for key in skey_list
+                }
+
+            if phasor:
+                prediction = z0 + u.sum_signals_regular(
+                    skey_list, step, len(u.dates), tidal_dict, start=start * step
+                )
+            else:
+                hours = np.arange(start, stop, dtype=np.float64) * step
+                prediction = z0 + u.sum_signals(skey_list, hours, tidal_dict)
+
+            if start == 0:
+                fpo = stack.enter_context(u.open_output(fname))
+            u.write_rows(fpo, u.dates, prediction, decimals=decimals)
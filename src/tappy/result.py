@@ -0,0 +1,505 @@
+#!/usr/bin/env python
+
+"""
+NAME:
+    result.py
+
+SYNOPSIS:
+    result.py is only an importable library
+
+DESCRIPTION:
+    The result of a harmonic analysis.
+
+    HarmonicResult holds one row per constituent in a NumPy structured array
+    and a few scalars.  It does not keep references to the observations or
+    to any other per sample array, so many results can be held in memory.
+
+    A result can be written to and read from the IHOTC XML transfer format,
+    JSON, and a binary ".npz" file.
+
+EXAMPLES:
+    As library
+        from tappy.analysis import analyze
+        result = analyze(dates, elevation)
+        result["M2"]["amplitude"]
+        result.to_json("station.json")
+        result = HarmonicResult.from_json("station.json")
+
+#Copyright (C) 2026  Tim Cera timcera@earthlink.net
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program; if not, write to the Free Software
+#    Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+"""
+
+import json
+import xml.etree.ElementTree as et
+
+import numpy as np
+
+
+def constituent_dtype(name_length=8):
+    """Return the dtype of the rows of HarmonicResult.constituents."""
+    return np.dtype(
+        [
+            ("name", f"U{name_length}"),
+            ("speed", "f8"),
+            ("amplitude", "f8"),
+            ("phase", "f8"),
+            ("inferred", "?"),
+        ]
+    )
+
+
+def _indent(elem, level=0):
+    """Indent the XML tree `elem` in place."""
+    i = f"\n{level * '  '}"
+    if len(elem):
+        if not elem.text or not elem.text.strip():
+            elem.text = f"{i}  "
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+        for elem in elem:
+            _indent(elem, level + 1)
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+    else:
+        if level and (not elem.tail or not elem.tail.strip()):
+            elem.tail = i
+
+
+def _date(value):
+    return None if value is None else np.datetime64(value, "s")
+
+
+def _pack_dates(*dates):
+    return np.array(
+        [np.datetime64("NaT", "s") if date is None else date for date in dates],
+        dtype="datetime64[s]",
+    )
+
+
+def _unpack_dates(dates):
+    return [None if np.isnat(date) else date for date in dates]
+
+
+class HarmonicResult:
+    """Constituents, average, and trend found by a harmonic analysis.
+
+    Attributes
+    ----------
+    constituents : structured array
+        One row per constituent sorted by speed, with the fields "name",
+        "speed" (degrees per hour), "amplitude" (units of the observations),
+        "phase" (degrees), and "inferred" (True if the constituent was
+        inferred from the others rather than fitted).
+    average : float
+        The fitted average water level, Z0.
+    slope : float
+        The slope of the linear trend per hour, 0.0 if no trend was fitted.
+    start, end : numpy.datetime64
+        The first and last observation times.
+    """
+
+    __slots__ = ("constituents", "average", "slope", "start", "end")
+
+    def __init__(self, constituents, average, slope=0.0, start=None, end=None):
+        self.constituents = constituents
+        self.average = float(average)
+        self.slope = float(slope)
+        self.start = _date(start)
+        self.end = _date(end)
+
+    @classmethod
+    def from_dicts(
+        cls, speed, amplitude, phase, inferred, average, slope=0.0, **kwds
+    ):
+        """Build a result from dicts keyed by constituent name.
+
+        `speed` is in degrees per hour and must have every name in
+        `amplitude`.  `inferred` is the collection of inferred names.
+        """
+        names = sorted(amplitude, key=lambda name: speed[name])
+        length = max((len(name) for name in names), default=1)
+        constituents = np.empty(len(names), dtype=constituent_dtype(length))
+        constituents["name"] = names
+        constituents["speed"] = [speed[name] for name in names]
+        constituents["amplitude"] = [amplitude[name] for name in names]
+        constituents["phase"] = [phase[name] for name in names]
+        constituents["inferred"] = [name in inferred for name in names]
+        return cls(constituents, average, slope=slope, **kwds)
+
+    @property
+    def names(self):
+        return self.constituents["name"]
+
+    @property
+    def speed(self):
+        return self.constituents["speed"]
+
+    @property
+    def amplitude(self):
+        return self.constituents["amplitude"]
+
+    @property
+    def phase(self):
+        return self.constituents["phase"]
+
+    @property
+    def inferred(self):
+        return self.constituents["inferred"]
+
+    def __len__(self):
+        return len(self.constituents)
+
+    def __contains__(self, name):
+        return name in self.constituents["name"]
+
+    def __getitem__(self, name):
+        """Return the row of the constituent `name`."""
+        index = np.flatnonzero(self.constituents["name"] == name)
+        if len(index) == 0:
+            raise KeyError(name)
+        return self.constituents[index[0]]
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({len(self)} constituents, "
+            f"average={self.average}, slope={self.slope}, "
+            f"start={self.start}, end={self.end})"
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, HarmonicResult):
+            return NotImplemented
+        return (
+            self.average == other.average
+            and self.slope == other.slope
+            and self.start == other.start
+            and self.end == other.end
+            and np.array_equal(self.constituents, other.constituents)
+        )
+
+    __hash__ = None
+
+    def to_xml(
+        self,
+        filename,
+        name="A port in a storm",
+        country="A man without a country",
+        latitude=0.0,
+        longitude=0.0,
+        timezone="0000",
+        comments="No comment",
+        units="m",
+        decimalplaces="full",
+    ):
+        """Write the IHOTC XML transfer format to `filename`.
+
+        The port information is only used to complete the file.
+        `decimalplaces` is "full", "ihotc" for the number of decimal places
+        of the IHOTC standard, or the number of decimal places.
+        Constituents with an amplitude that formats to zero are left out.
+        """
+        transfer = et.Element(
+            "Transfer",
+            attrib={
+                "ns0:noNamespaceSchemaLocation": "HC_Schema_V1.xsd",
+                "xmlns:ns0": "http://www.w3.org/2001/XMLSchema-instance",
+            },
+        )
+        port = et.SubElement(transfer, "Port")
+        for tag, text in (
+            ("name", name),
+            ("country", country),
+            ("position", None),
+            ("timeZone", timezone),
+            ("units", units),
+            ("observationStart", self.start),
+            ("comments", comments),
+            ("observationEnd", self.end),
+        ):
+            elem = et.SubElement(port, tag)
+            if tag == "position":
+                et.SubElement(elem, "latitude").text = str(latitude)
+                et.SubElement(elem, "longitude").text = str(longitude)
+            else:
+                elem.text = str(text)
+
+        if decimalplaces == "ihotc":
+            ampformatstr = "{0:.3f}"
+            phaformatstr = "{0:.1f}"
+            if self.end - self.start < np.timedelta64(90, "D"):
+                ampformatstr = "{0:.2f}"
+                phaformatstr = "{0:.0f}"
+        elif decimalplaces == "full":
+            ampformatstr = "{0}"
+            phaformatstr = ampformatstr
+        else:
+            ampformatstr = f"{{0:.{decimalplaces}f}}"
+            phaformatstr = ampformatstr
+
+        rows = [("Z0", "0.0", False, self.average, 0.0)]
+        for row in self.constituents:
+            rows.append(
+                (
+                    row["name"],
+                    str(row["speed"]),
+                    row["inferred"],
+                    row["amplitude"],
+                    row["phase"],
+                )
+            )
+        for key, speed, inferred, amplitude, phase in rows:
+            if key != "Z0" and float(ampformatstr.format(amplitude)) == 0.0:
+                continue
+            harmonic = et.SubElement(port, "Harmonic")
+            et.SubElement(harmonic, "name").text = str(key)
+            et.SubElement(harmonic, "speed").text = speed
+            et.SubElement(harmonic, "inferred").text = str(bool(inferred)).lower()
+            et.SubElement(harmonic, "phaseAngle").text = phaformatstr.format(phase)
+            et.SubElement(harmonic, "amplitude").text = ampformatstr.format(amplitude)
+
+        _indent(transfer)
+        et.ElementTree(transfer).write(filename)
+
+    @classmethod
+    def from_xml(cls, filename):
+        """Read a result from the IHOTC XML transfer format.
+
+        The "Z0" harmonic is the average.  The slope is not part of the
+        format and is 0.0.
+        """
+        port = et.parse(filename).getroot().find("Port")
+        speed = {}
+        amplitude = {}
+        phase = {}
+        inferred = set()
+        average = 0.0
+        for harmonic in port.iter("Harmonic"):
+            key = harmonic.findtext("name")
+            if key == "Z0":
+                average = float(harmonic.findtext("amplitude"))
+                continue
+            speed[key] = float(harmonic.findtext("speed"))
+            amplitude[key] = float(harmonic.findtext("amplitude"))
+            phase[key] = float(harmonic.findtext("phaseAngle"))
+            if (harmonic.findtext("inferred") or "false").lower() == "true":
+                inferred.add(key)
+        return cls.from_dicts(
+            speed,
+            amplitude,
+            phase,
+            inferred,
+            average,
+            start=port.findtext("observationStart"),
+            end=port.findtext("observationEnd"),
+        )
+
+    def as_dict(self):
+        """Return the result as a dictionary of JSON types."""
+        return {
+            "average": self.average,
+            "slope": self.slope,
+            "start": None if self.start is None else str(self.start),
+            "end": None if self.end is None else str(self.end),
+            "constituents": [
+                {
+                    "name": str(row["name"]),
+                    "speed": float(row["speed"]),
+                    "amplitude": float(row["amplitude"]),
+                    "phase": float(row["phase"]),
+                    "inferred": bool(row["inferred"]),
+                }
+                for row in self.constituents
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Inverse of as_dict."""
+        rows = data["constituents"]
+        length = max((len(row["name"]) for row in rows), default=1)
+        dtype = constituent_dtype(length)
+        constituents = np.array(
+            [tuple(row[field] for field in dtype.names) for row in rows], dtype=dtype
+        )
+        return cls(
+            constituents,
+            data["average"],
+            slope=data.get("slope", 0.0),
+            start=data.get("start"),
+            end=data.get("end"),
+        )
+
+    def to_json(self, filename=None):
+        """Write the result as JSON to `filename`, or return the JSON string
+        if `filename` is None.  Floats are written with full precision.
+        """
+        text = json.dumps(self.as_dict(), indent=1)
+        if filename is None:
+            return text
+        with open(filename, "w", encoding="utf-8") as fpo:
+            fpo.write(text)
+
+    @classmethod
+    def from_json(cls, filename):
+        """Read a result written by to_json."""
+        with open(filename, encoding="utf-8") as fpi:
+            return cls.from_dict(json.load(fpi))
+
+    def save(self, filename):
+        """Write the result to the binary ".npz" file `filename`."""
+        np.savez(
+            filename,
+            constituents=self.constituents,
+            scalars=np.array([self.average, self.slope]),
+            dates=_pack_dates(self.start, self.end),
+        )
+
+    @classmethod
+    def load(cls, filename):
+        """Read a result written by save."""
+        with np.load(filename) as data:
+            start, end = _unpack_dates(data["dates"])
+            return cls(
+                data["constituents"],
+                data["scalars"][0],
+                slope=data["scalars"][1],
+                start=start,
+                end=end,
+            )
+
+
+class HarmonicResults:
+    """Results of the harmonic analysis of several series on the same dates.
+
+    Attributes
+    ----------
+    constituents : structured array
+        One row per constituent sorted by speed with the fields "name",
+        "speed", and "inferred" of HarmonicResult.constituents.
+    amplitude, phase : array
+        (series, constituent) arrays of the amplitude and the phase in
+        degrees, the columns in the order of `constituents`.
+    average, slope : array
+        The average (Z0) and the slope of the linear trend of each series.
+    start, end : numpy.datetime64
+        The first and last observation times.
+    """
+
+    __slots__ = (
+        "constituents",
+        "amplitude",
+        "phase",
+        "average",
+        "slope",
+        "start",
+        "end",
+    )
+
+    def __init__(
+        self, constituents, amplitude, phase, average, slope, start=None, end=None
+    ):
+        self.constituents = constituents
+        self.amplitude = amplitude
+        self.phase = phase
+        self.average = average
+        self.slope = slope
+        self.start = _date(start)
+        self.end = _date(end)
+
+    @classmethod
+    def from_arrays(
+        cls, names, speed, inferred, amplitude, phase, average, slope, **kwds
+    ):
+        """Build the results from constituent `names`, their `speed` in
+        degrees per hour, the collection of `inferred` names, and
+        (series, constituent) `amplitude` and `phase` arrays in the order
+        of `names`.
+        """
+        order = np.argsort(speed, kind="stable")
+        length = max((len(name) for name in names), default=1)
+        dtype = np.dtype(
+            [
+                (field, constituent_dtype(length)[field])
+                for field in ("name", "speed", "inferred")
+            ]
+        )
+        constituents = np.empty(len(names), dtype=dtype)
+        constituents["name"] = np.asarray(names)[order]
+        constituents["speed"] = np.asarray(speed)[order]
+        constituents["inferred"] = [names[i] in inferred for i in order]
+        return cls(
+            constituents,
+            np.asarray(amplitude)[:, order],
+            np.asarray(phase)[:, order],
+            np.asarray(average, dtype="f8"),
+            np.asarray(slope, dtype="f8"),
+            **kwds,
+        )
+
+    def __len__(self):
+        return len(self.average)
+
+    def __getitem__(self, series):
+        """Return the HarmonicResult of the series number `series`."""
+        length = self.constituents.dtype["name"].itemsize // 4
+        constituents = np.empty(
+            len(self.constituents), dtype=constituent_dtype(length)
+        )
+        for field in ("name", "speed", "inferred"):
+            constituents[field] = self.constituents[field]
+        constituents["amplitude"] = self.amplitude[series]
+        constituents["phase"] = self.phase[series]
+        return HarmonicResult(
+            constituents,
+            self.average[series],
+            slope=self.slope[series],
+            start=self.start,
+            end=self.end,
+        )
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({len(self)} series, "
+            f"{len(self.constituents)} constituents, "
+            f"start={self.start}, end={self.end})"
+        )
+
+    def save(self, filename):
+        """Write the results to the binary ".npz" file `filename`."""
+        np.savez(
+            filename,
+            constituents=self.constituents,
+            amplitude=self.amplitude,
+            phase=self.phase,
+            average=self.average,
+            slope=self.slope,
+            dates=_pack_dates(self.start, self.end),
+        )
+
+    @classmethod
+    def load(cls, filename):
+        """Read results written by save."""
+        with np.load(filename) as data:
+            start, end = _unpack_dates(data["dates"])
+            return cls(
+                data["constituents"],
+                data["amplitude"],
+                data["phase"],
+                data["average"],
+                data["slope"],
+                start=start,
+                end=end,
+            )
@@ -47,6 +47,9 @@ from pathlib import Path
 import numpy as np
 
 from .analysis import analysis
+from .batch import batch_analysis
+from .incremental import update
+from .moving import moving_analysis
 from .prediction import prediction
 from .toolbox_utils.src.toolbox_utils import tsutils
 
@@ -69,7 +72,15 @@ def main():
     @cltoolbox.command("prediction")
     @tsutils.copy_doc(prediction)
     def prediction_cli(
-        xml_filename, start_date, end_date, interval, include_inferred=True, fname="-"
+        xml_filename,
+        start_date,
+        end_date,
+        interval,
+        include_inferred=True,
+        fname="-",
+        node_interval=None,
+        phasor=False,
+        decimals=None,
     ):
         prediction(
             xml_filename,
@@ -78,6 +89,9 @@ def main():
             interval,
             include_inferred=include_inferred,
             fname=fname,
+            node_interval=node_interval,
+            phasor=phasor,
+            decimals=decimals,
         )
 
     # =============================
@@ -89,6 +103,7 @@ def main():
         quiet=False,
         debug=False,
         outputts=False,
+        outputts_file=None,
         outputxml="",
         ephemeris=False,
         rayleigh=1.0,
@@ -100,6 +115,12 @@ def main():
         filter=None,
         pad_filters=None,
         include_inferred=True,
+        node_interval=None,
+        parse_workers=None,
+        cache_dir=None,
+        cache_size=1024.0,
+        cache_mtime=False,
+        out_of_core=False,
         xmlname="A port in a storm",
         xmlcountry="A man without a country",
         xmllatitude=0.0,
@@ -116,6 +137,7 @@ def main():
                 quiet=quiet,
                 debug=debug,
                 outputts=outputts,
+                outputts_file=outputts_file,
                 outputxml=outputxml,
                 ephemeris=ephemeris,
                 rayleigh=rayleigh,
@@ -127,6 +149,12 @@ def main():
                 filter=filter,
                 pad_filters=pad_filters,
                 include_inferred=include_inferred,
+                node_interval=node_interval,
+                parse_workers=parse_workers,
+                cache_dir=cache_dir,
+                cache_size=cache_size,
+                cache_mtime=cache_mtime,
+                out_of_core=out_of_core,
                 xmlname=xmlname,
                 xmlcountry=xmlcountry,
                 xmllatitude=xmllatitude,
@@ -138,6 +166,116 @@ def main():
             )
         )
 
+    # =============================
+    @cltoolbox.command("batch-analysis")
+    @tsutils.copy_doc(batch_analysis)
+    def batch_analysis_cli(
+        manifest,
+        output_dir=".",
+        output_format="xml",
+        summary="summary.csv",
+        workers=None,
+        rayleigh=1.0,
+        missing_data="ignore",
+        linear_trend=False,
+        remove_extreme=False,
+        zero_ts=None,
+        include_inferred=True,
+        node_interval=None,
+        cache_dir=None,
+        cache_size=1024.0,
+        cache_mtime=False,
+        xmlunits="m",
+        xmldecimalplaces="full",
+    ):
+        batch_analysis(
+            manifest,
+            output_dir=output_dir,
+            output_format=output_format,
+            summary=summary,
+            workers=workers,
+            rayleigh=rayleigh,
+            missing_data=missing_data,
+            linear_trend=linear_trend,
+            remove_extreme=remove_extreme,
+            zero_ts=zero_ts,
+            include_inferred=include_inferred,
+            node_interval=node_interval,
+            cache_dir=cache_dir,
+            cache_size=cache_size,
+            cache_mtime=cache_mtime,
+            xmlunits=xmlunits,
+            xmldecimalplaces=xmldecimalplaces,
+        )
+
+    # =============================
+    @cltoolbox.command("moving-analysis")
+    @tsutils.copy_doc(moving_analysis)
+    def moving_analysis_cli(
+        data_filename,
+        def_filename=None,
+        window=720.0,
+        step=24.0,
+        output="moving.csv",
+        rayleigh=1.0,
+        linear_trend=False,
+        include_inferred=True,
+        node_interval=None,
+        parse_workers=None,
+        cache_dir=None,
+        cache_size=1024.0,
+        cache_mtime=False,
+    ):
+        moving_analysis(
+            data_filename,
+            def_filename=def_filename,
+            window=window,
+            step=step,
+            output=output,
+            rayleigh=rayleigh,
+            linear_trend=linear_trend,
+            include_inferred=include_inferred,
+            node_interval=node_interval,
+            parse_workers=parse_workers,
+            cache_dir=cache_dir,
+            cache_size=cache_size,
+            cache_mtime=cache_mtime,
+        )
+
+    # =============================
+    @cltoolbox.command("update")
+    @tsutils.copy_doc(update)
+    def update_cli(
+        state_filename,
+        data_filename,
+        def_filename=None,
+        quiet=False,
+        rayleigh=1.0,
+        linear_trend=False,
+        include_inferred=True,
+        node_interval=None,
+        forgetting=None,
+        outputxml="",
+        xmlname="A port in a storm",
+        xmlunits="m",
+        xmldecimalplaces="full",
+    ):
+        update(
+            state_filename,
+            data_filename,
+            def_filename=def_filename,
+            quiet=quiet,
+            rayleigh=rayleigh,
+            linear_trend=linear_trend,
+            include_inferred=include_inferred,
+            node_interval=node_interval,
+            forgetting=forgetting,
+            outputxml=outputxml,
+            xmlname=xmlname,
+            xmlunits=xmlunits,
+            xmldecimalplaces=xmldecimalplaces,
+        )
+
     cltoolbox.main()
 
 
@@ -78,7 +78,7 @@ def fft_lowpass(nelevation, low_bound, high_bound):
         result = F.rfft(nelevation, len(nelevation))
     else:
         result = F.rfft(nelevation)
-    freq = F.fftfreq(len(nelevation))[: len(nelevation) / 2]
+    freq = F.rfftfreq(len(nelevation))
     factor = np.ones_like(result)
     factor[freq > low_bound] = 0.0
 
@@ -95,7 +95,5 @@ def fft_lowpass(nelevation, low_bound, high_bound):
     factor[sl] = a
 
     result = result * factor
-    print("result=", len(result))
     relevation = F.irfft(result, len(nelevation))
-    print("result=", len(relevation))
     return relevation
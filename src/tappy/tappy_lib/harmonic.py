@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+
+"""
+NAME:
+    harmonic.py
+
+SYNOPSIS:
+    harmonic.py is only an importable library
+
+DESCRIPTION:
+    Linear least squares machinery for harmonic analysis.
+
+    Each constituent is represented by an in-phase and a quadrature column
+
+        f(t) * cos(speed * t)  and  f(t) * sin(speed * t)
+
+    so that H * f * cos(speed * t - phase) = a * f * cos(speed * t) +
+    b * f * sin(speed * t) with a = H * cos(phase) and b = H * sin(phase).
+    The fit becomes linear in (a, b) and is solved from the normal equations,
+    which are accumulated in blocks of time so that the full design matrix
+    never has to be held in memory.
+
+OPTIONS:
+    None - import only
+
+EXAMPLES:
+    As library
+        from tappy.tappy_lib import harmonic
+        ...
+
+#Copyright (C) 2026  Tim Cera timcera@earthlink.net
+#
+#
+#    This program is free software; you can redistribute it and/or modify it
+#    under the terms of the GNU General Public License as published by the Free
+#    Software Foundation; either version 2 of the License, or (at your option)
+#    any later version.
+#
+#    This program is distributed in the hope that it will be useful, but
+#    WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+#    or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+#    for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    675 Mass Ave, Cambridge, MA 02139, USA.
+"""
+
+import numpy as np
+
+modname = "harmonic"
+
+# Number of time steps in each block of the design matrix.  Keeps the
+# temporary cos/sin arrays small enough to stay in cache.
+block_size = 8192
+
+
+def design_block(hours, speeds, ff=None, linear_trend=False):
+    """Return the design matrix for a block of times.
+
+    Parameters
+    ----------
+    hours : array
+        Times in hours from the start of the analysis.
+    speeds : array
+        Constituent speeds in radians per hour.
+    ff : sequence, optional
+        Node factor for each constituent.  Each item can be a scalar or an
+        array the same length as `hours`.
+    linear_trend : bool, optional
+        Add a column for a linear trend after the constant column.
+
+    Returns
+    -------
+    array
+        Columns are the K in-phase terms, the K quadrature terms, a
+        constant, and if `linear_trend` the hours.
+    """
+    hours = np.asarray(hours, dtype="f8")
+    speeds = np.asarray(speeds, dtype="f8")
+    nspeeds = len(speeds)
+    ncols = 2 * nspeeds + 1 + int(bool(linear_trend))
+
+    design = np.empty((len(hours), ncols))
+    arg = np.multiply.outer(hours, speeds)
+    np.cos(arg, out=design[:, :nspeeds])
+    np.sin(arg, out=design[:, nspeeds : 2 * nspeeds])
+    if ff is not None:
+        for index, factor in enumerate(ff):
+            design[:, index] *= factor
+            design[:, index + nspeeds] *= factor
+    design[:, 2 * nspeeds] = 1.0
+    if linear_trend:
+        design[:, 2 * nspeeds + 1] = hours
+    return design
+
+
+def normal_equations(
+    hours, elevation, speeds, ff=None, linear_trend=False, weights=None
+):
+    """Accumulate the normal equations of the harmonic model.
+
+    The design matrix is built and reduced one block of `block_size` times at
+    a time.
+
+    Parameters
+    ----------
+    hours : array
+        Times in hours from the start of the analysis.
+    elevation : array
+        Observed water levels at `hours`.  A 2-D (time, series) array
+        accumulates one right hand side for each series.  Only one block is
+        converted to float64 at a time, so `elevation` can be memory mapped.
+    speeds : array
+        Constituent speeds in radians per hour.
+    ff : sequence, optional
+        Node factor for each constituent, scalar or full length array.
+    linear_trend : bool, optional
+        Include a linear trend column.
+    weights : array, optional
+        Weight of each time in the least squares fit.
+
+    Returns
+    -------
+    tuple
+        (ata, aty) where ata is the cross product of the design matrix and
+        aty is the design matrix transposed times `elevation`, with a
+        column for each series if `elevation` is 2-D.
+    """
+    hours = np.asarray(hours, dtype="f8")
+    elevation = np.asarray(elevation)
+    ncols = 2 * len(speeds) + 1 + int(bool(linear_trend))
+    ata = np.zeros((ncols, ncols))
+    aty = np.zeros((ncols,) + elevation.shape[1:])
+    for start in range(0, len(hours), block_size):
+        sl = slice(start, start + block_size)
+        bff = None
+        if ff is not None:
+            bff = [f[sl] if np.ndim(f) else f for f in ff]
+        design = design_block(hours[sl], speeds, ff=bff, linear_trend=linear_trend)
+        weighted = design.T if weights is None else design.T * weights[sl]
+        ata += weighted @ design
+        aty += weighted @ np.asarray(elevation[sl], dtype="f8")
+    return ata, aty
+
+
+def shift_origin(ata, aty, speeds, hours, linear_trend=False):
+    """Move the time origin of the normal equations `hours` later.
+
+    Returns the (ata, aty) that `normal_equations` would give for times
+    measured from the new origin, without going back to the observations.
+    The design matrix of the new origin is the old one times a matrix that
+    rotates the in-phase and quadrature columns of each constituent by
+    speed * hours and, with `linear_trend`, subtracts `hours` times the
+    constant column from the trend column.
+    """
+    speeds = np.asarray(speeds, dtype="f8")
+    nspeeds = len(speeds)
+    index = np.arange(nspeeds)
+    cos = np.cos(speeds * hours)
+    sin = np.sin(speeds * hours)
+    transform = np.eye(len(aty))
+    transform[index, index] = cos
+    transform[index + nspeeds, index] = sin
+    transform[index, index + nspeeds] = -sin
+    transform[index + nspeeds, index + nspeeds] = cos
+    if linear_trend:
+        transform[2 * nspeeds, 2 * nspeeds + 1] = -hours
+    return transform.T @ ata @ transform, transform.T @ aty
+
+
+def solve(ata, aty):
+    """Solve the normal equations.
+
+    `aty` can have a column for each of several series, which are all
+    solved with one factorization.  Falls back to a minimum norm solution
+    if the system is singular, for example when two constituents cannot be
+    separated by the record.
+    """
+    try:
+        return np.linalg.solve(ata, aty)
+    except np.linalg.LinAlgError:
+        return np.linalg.lstsq(ata, aty, rcond=None)[0]
+
+
+def amplitude_phase(coef, nspeeds):
+    """Convert in-phase/quadrature coefficients to amplitude and phase.
+
+    Parameters
+    ----------
+    coef : array
+        Coefficients ordered as the columns of `design_block`.
+    nspeeds : int
+        Number of constituents.
+
+    Returns
+    -------
+    tuple
+        (amplitude, phase) with the phase in radians.
+    """
+    a = coef[:nspeeds]
+    b = coef[nspeeds : 2 * nspeeds]
+    return np.hypot(a, b), np.arctan2(b, a)
+
+
+def root_factor(ata, aty):
+    """Factor the normal equations into an equivalent small residual.
+
+    Returns (root, rhs) such that for any coefficient vector x
+
+        |design @ x - elevation|**2 = |root @ x - rhs|**2 + constant
+
+    Used to minimize nonlinear functions of the coefficients without going
+    back to the full length time series.  If `aty` has a column for each of
+    several series `rhs` has a matching column, and `root` is shared.
+    """
+    eigval, eigvec = np.linalg.eigh(ata)
+    keep = eigval > eigval.max() * len(eigval) * np.finfo("f8").eps
+    scale = np.sqrt(eigval[keep])
+    root = scale[:, None] * eigvec[:, keep].T
+    shape = (-1,) + (1,) * (np.ndim(aty) - 1)
+    rhs = (eigvec[:, keep].T @ aty) / scale.reshape(shape)
+    return root, rhs
+
+
+def synthesize(
+    hours,
+    speeds,
+    amplitude,
+    phase,
+    ff=None,
+    amplitude_offset=None,
+    phase_offset=None,
+):
+    """Sum the constituent signals at `hours`.
+
+    Evaluates
+
+        sum(amplitude * ff * cos(speeds * hours - phase))
+
+    one block of `block_size` times at a time as a matrix vector product,
+    accumulating in float64.
+
+    Parameters
+    ----------
+    hours : array
+        Times in hours.
+    speeds : array
+        Constituent speeds in radians per hour.
+    amplitude : array
+        Amplitude of each constituent.
+    phase : array
+        Phase of each constituent in radians.
+    ff : sequence, optional
+        Node factor for each constituent, scalar or full length array.
+    amplitude_offset : array, optional
+        Added to the amplitude of every constituent at each time.
+    phase_offset : array, optional
+        Added to the phase, in radians, of every constituent at each time.
+
+    Returns
+    -------
+    array
+        The float64 sum, the same length as `hours`.
+    """
+    hours = np.asarray(hours, dtype="f8")
+    speeds = np.asarray(speeds, dtype="f8")
+    amplitude = np.asarray(amplitude, dtype="f8")
+    phase = np.asarray(phase, dtype="f8")
+    total = np.zeros(len(hours))
+    if len(speeds) == 0:
+        return total
+    for start in range(0, len(hours), block_size):
+        sl = slice(start, start + block_size)
+        arg = np.multiply.outer(hours[sl], speeds)
+        arg -= phase
+        if phase_offset is not None:
+            arg -= phase_offset[sl, None]
+        signal = np.cos(arg, out=arg)
+        if ff is not None:
+            for index, factor in enumerate(ff):
+                signal[:, index] *= factor[sl] if np.ndim(factor) else factor
+        if amplitude_offset is None:
+            total[sl] = signal @ amplitude
+        else:
+            total[sl] = signal @ amplitude + signal.sum(axis=1) * amplitude_offset[sl]
+    return total
+
+
+def synthesize_regular(
+    start, step, count, speeds, amplitude, phase, ff=None, reanchor=64
+):
+    """Sum the constituent signals at the evenly spaced hours
+    start + step * arange(count).
+
+    Same result as `synthesize`, but no trigonometric function is evaluated
+    per time.  A table of the phasors exp(i * speeds * step * j) for one
+    block of times is made once.  Each block is the table rotated by the
+    phasor of the block start, which is advanced from block to block by
+    complex multiplication and recomputed exactly every `reanchor` blocks
+    so rounding errors cannot accumulate.
+
+    Parameters
+    ----------
+    start : float
+        First time in hours.
+    step : float
+        Time step in hours.
+    count : int
+        Number of times.
+    speeds : array
+        Constituent speeds in radians per hour.
+    amplitude : array
+        Amplitude of each constituent.
+    phase : array
+        Phase of each constituent in radians.
+    ff : sequence, optional
+        Node factor for each constituent, scalar or `count` length array.
+    reanchor : int, optional
+        Number of blocks between exact evaluations of the block phasor.
+
+    Returns
+    -------
+    array
+        The float64 sum, `count` long.
+    """
+    speeds = np.asarray(speeds, dtype="f8")
+    amplitude = np.asarray(amplitude, dtype="f8")
+    phase = np.asarray(phase, dtype="f8")
+    total = np.zeros(count)
+    if len(speeds) == 0 or count == 0:
+        return total
+    nblock = min(block_size, count)
+    rotation = np.exp(1j * np.multiply.outer(np.arange(nblock) * step, speeds))
+    advance = np.exp(1j * speeds * step * nblock)
+    for number, first in enumerate(range(0, count, nblock)):
+        if number % reanchor == 0:
+            anchor = np.exp(1j * (speeds * (start + first * step) - phase))
+        else:
+            anchor *= advance
+        sl = slice(first, first + nblock)
+        weight = amplitude * anchor
+        nrows = len(total[sl])
+        if ff is None:
+            total[sl] = (rotation[:nrows] @ weight).real
+            continue
+        signal = (rotation[:nrows] * weight).real
+        for index, factor in enumerate(ff):
+            signal[:, index] *= factor[sl] if np.ndim(factor) else factor
+        total[sl] = signal.sum(axis=1)
+    return total
@@ -1,5 +1,7 @@
 import math as m
 
+import numpy as np
+
 letter_to_factor_map = {
     "Z": 0,
     "Y": -1,
@@ -8,6 +10,8 @@ letter_to_factor_map = {
     "V": -4,
     "U": -5,
     "T": -6,
+    "S": -7,
+    "R": -8,
     "A": 1,
     "B": 2,
     "C": 3,
@@ -2093,3 +2097,38 @@ _master_speed_dict = {
         "aka": [],
     },
 }
+
+# Compiled form of _master_speed_dict.  The extended Doodson numbers are held
+# as a (K x 7) integer matrix, in the same order as constituent_names, so that
+# speeds or equilibrium arguments for any selection of constituents are one
+# matrix-vector product.
+constituent_names = tuple(_master_speed_dict)
+constituent_index = {name: index for index, name in enumerate(constituent_names)}
+edn_matrix = np.array(
+    [
+        [letter_to_factor_map[letter] for letter in value["edn"]]
+        for value in _master_speed_dict.values()
+    ],
+    dtype="i8",
+)
+edn_matrix.setflags(write=False)
+
+
+def select(names):
+    """Return the row indices of the named constituents."""
+    return np.array([constituent_index[name] for name in names], dtype="i8")
+
+
+def doodson_sum(args, index=None):
+    """Sum of the extended Doodson numbers times the astronomical arguments.
+
+    Parameters
+    ----------
+    args : array
+        The seven astronomical arguments (or their speeds) in the order of
+        the extended Doodson number: T - s + h, s, h, p, N, p1, 90 degrees.
+    index : array, optional
+        Rows to use, from 'select'.  All constituents if not given.
+    """
+    edn = edn_matrix if index is None else edn_matrix[index]
+    return edn @ np.asarray(args, dtype="f8")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+"""
+NAME:
+    series_cache.py
+
+SYNOPSIS:
+    series_cache.py is only an importable library
+
+DESCRIPTION:
+    On disk cache of parsed water level series.
+
+    Each entry is an uncompressed ".npz" file holding the "dates" and
+    "elevation" arrays that were parsed from a data file.  The entry name is
+    a hash of the data file, either of its content or of its resolved path,
+    size, and modification time, together with the content of the
+    definition file used to parse it, so changing either one misses the
+    cache.
+
+    Loading an entry touches its modification time.  After an entry is
+    stored the least recently used entries are removed until the total size
+    of the cache is within the limit.
+
+OPTIONS:
+    None - import only
+
+EXAMPLES:
+    As library
+        from tappy.tappy_lib import series_cache
+        ...
+
+#Copyright (C) 2026  Tim Cera timcera@earthlink.net
+#
+#
+#    This program is free software; you can redistribute it and/or modify it
+#    under the terms of the GNU General Public License as published by the Free
+#    Software Foundation; either version 2 of the License, or (at your option)
+#    any later version.
+#
+#    This program is distributed in the hope that it will be useful, but
+#    WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+#    or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License
+#    for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    675 Mass Ave, Cambridge, MA 02139, USA.
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+modname = "series_cache"
+
+# Bump when the layout of an entry or the parsed result changes so that old
+# entries are never loaded.
+version = b"1"
+
+suffix = ".npz"
+
+read_size = 1 << 20
+
+
+def _update(digest, filename):
+    with open(filename, "rb") as fp:
+        for block in iter(lambda: fp.read(read_size), b""):
+            digest.update(block)
+
+
+def cache_key(filename, def_filename=None, mtime=False):
+    """Return the name of the cache entry for `filename`.
+
+    Parameters
+    ----------
+    filename : str or Path
+        The data file.
+    def_filename : str or Path, optional
+        The definition file used to parse `filename`.  Its content is always
+        part of the key.
+    mtime : bool, optional
+        Key on the resolved path, size, and modification time of `filename`
+        instead of hashing its content.  Much faster for large files, but
+        misses the cache for a copy of the same data.
+
+    Returns
+    -------
+    str or None
+        None if `filename` is not a regular file, for example a tstoolbox
+        specification with options.
+    """
+    filename = Path(filename)
+    if not filename.is_file():
+        return None
+    digest = hashlib.sha256(version)
+    if mtime:
+        stat = filename.stat()
+        digest.update(
+            f"{filename.resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}".encode()
+        )
+    else:
+        _update(digest, filename)
+    digest.update(b"\0")
+    if def_filename is not None:
+        _update(digest, def_filename)
+    return digest.hexdigest()
+
+
+def load(cache_dir, key):
+    """Return (dates, elevation) stored under `key`, or None if missing."""
+    path = Path(cache_dir) / f"{key}{suffix}"
+    try:
+        with np.load(path) as entry:
+            dates = entry["dates"]
+            elevation = entry["elevation"]
+    except (OSError, KeyError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return dates, elevation
+
+
+def store(cache_dir, key, dates, elevation, max_bytes):
+    """Store `dates` and `elevation` under `key` and evict old entries.
+
+    The entry is written to a temporary file and renamed into place so that
+    concurrent runs never see a partial entry.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmpname = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            np.savez(fp, dates=dates, elevation=elevation)
+        os.replace(tmpname, cache_dir / f"{key}{suffix}")
+    except BaseException:
+        Path(tmpname).unlink(missing_ok=True)
+        raise
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir, max_bytes):
+    """Remove least recently used entries until the cache fits `max_bytes`."""
+    entries = []
+    for path in Path(cache_dir).glob(f"*{suffix}"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
@@ -13,6 +13,12 @@ DESCRIPTION:
     what is expected, and the order, for each line of text.  All of the heavy
     lifting is handled by pyparsing (http://pyparsing.sf.net).
 
+    For speed, compile_definition translates the definition file into a
+    single regular expression that parses a whole file at once.
+
+    Files ending in '.gz', '.bz2', '.xz', or '.lzma' are decompressed while
+    they are read.
+
 OPTIONS:
     -h,--help        this message
     -v,--version     version
@@ -43,11 +49,16 @@ EXAMPLES:
 #    675 Mass Ave, Cambridge, MA 02139, USA.
 """
 
+import bz2
 import datetime
 import getopt
+import gzip
+import lzma
+import re
 import sys
 from pathlib import Path
 
+import numpy as np
 import pyparsing
 
 # ===globals======================
@@ -68,6 +79,52 @@ pargs = []
 
 
 # ===utilities====================
+
+
+# Decompressing openers by file name suffix.
+_openers = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+    ".lzma": lzma.open,
+}
+
+# Number of characters of decompressed text parsed at a time.
+block_size = 1 << 24
+
+
+def is_compressed(filename):
+    """Return True if `filename` is decompressed by open_text."""
+    return Path(filename).suffix.lower() in _openers
+
+
+def open_text(filename, mode="r"):
+    """Open `filename` as text, decompressing according to its suffix."""
+    opener = _openers.get(Path(filename).suffix.lower(), open)
+    return opener(
+        filename, mode.replace("t", "") + "t", encoding="utf-8", errors="replace"
+    )
+
+
+def text_blocks(filename, size=None):
+    """Yield the text of `filename` in blocks of whole lines.
+
+    Each block is about `size` characters, default `block_size`, and all
+    but the last end with a new line.
+    """
+    size = size or block_size
+    rest = ""
+    with open_text(filename) as fpi:
+        while block := fpi.read(size):
+            block = rest + block
+            end = block.rfind("\n") + 1
+            rest = block[end:]
+            if end:
+                yield block[:end]
+        if rest:
+            yield rest
+
+
 def msg(txt):
     """Send message to stdout."""
     sys.stdout.write(txt)
@@ -408,12 +465,13 @@ class ParseFileLineByLine:
     calling readline(), readlines(), and write()), but can also be used as
     sequences of lines in for-loops.
 
-    If the 'filelike' module is available ParseFileLineByLine objects also
-    handles compression transparently. i.e. it is possible to read lines from a
-    compressed text file as if it were not compressed.  Compression is deduced
-    from the file name suffixes '.Z' (compress/uncompress), '.gz'
-    (gzip/gunzip), and '.bz2' (bzip2).  With 'filelike' you can also pass a URL
-    as filename and ParseFileLineByLine will download data from the URL.
+    ParseFileLineByLine objects handle compression transparently. i.e. it is
+    possible to read lines from a compressed text file as if it were not
+    compressed.  Compression is deduced from the file name suffixes '.gz'
+    (gzip/gunzip), '.bz2' (bzip2), and '.xz' or '.lzma' (xz).  If the
+    'filelike' module is available '.Z' (compress/uncompress) files are also
+    supported, and you can pass a URL as filename and ParseFileLineByLine will
+    download data from the URL.
 
     The parse definition file name is developed based on the input file name.
     If the input file name is 'basename.ext', then the definition file is
@@ -437,14 +495,18 @@ class ParseFileLineByLine:
         filen = Path(filename)
         def_filename = Path(def_filename)
 
-        # I use filelike which allows you to open up compressed files and urls
-        # as files.  Test to see whether it is available.
-        try:
-            import filelike
+        # Compressed files are decompressed with the standard library.  For
+        # anything else use filelike if available, which also opens '.Z'
+        # files and urls as files.
+        if is_compressed(filename):
+            tmp_open = open_text
+        else:
+            try:
+                import filelike
 
-            tmp_open = filelike.open
-        except ImportError:
-            tmp_open = open
+                tmp_open = filelike.open
+            except ImportError:
+                tmp_open = open
 
         self.file = tmp_open(filename, mode)
 
@@ -556,6 +618,460 @@ class ParseFileLineByLine:
         self.file.flush()
 
 
+class DefinitionNotCompilableError(Exception):
+    """The definition file uses something compile_definition cannot
+    translate to a regular expression."""
+
+
+_sign_patterns = {"": "", "+": r"\+?", "-": "-", "- +": "[-+]?"}
+
+_exponent = r"(?:[EeDd][-+]?[0-9]+)?"
+
+_quoted = (
+    r"'(?:[^'\n\r\\]|''|\\(?:[^x]|x[0-9a-fA-F]+))*'"
+    r'|"(?:[^"\n\r\\]|""|\\(?:[^x]|x[0-9a-fA-F]+))*"'
+)
+
+_iso = (
+    r"([0-9]+)\s*-\s*([0-9]+)\s*-\s*([0-9]+)\s*T"
+    r"\s*([0-9]+)\s*:\s*([0-9]+)\s*:\s*([0-9]+)"
+)
+
+_time_units = {
+    "weeks": 7 * 86400000000,
+    "days": 86400000000,
+    "hours": 3600000000,
+    "minutes": 60000000,
+    "seconds": 1000000,
+    "milliseconds": 1000,
+    "microseconds": 1,
+}
+
+
+def _sign(sign, default):
+    """Return the regular expression for the `sign` argument of a parse
+    function."""
+    if sign is None:
+        return _sign_patterns[default]
+    if isinstance(sign, str) and sign in _sign_patterns:
+        return _sign_patterns[sign]
+    raise DefinitionNotCompilableError(f"sign={sign!r}")
+
+
+def _digits(minimum, maximum, exact):
+    """Return the repeat count of a pyparsing Word."""
+    if exact:
+        return f"{{{int(exact)}}}"
+    if maximum:
+        return f"{{{int(minimum)},{int(maximum)}}}"
+    return f"{{{int(minimum)},}}"
+
+
+class CompiledDefinition:
+    """
+    A definition file compiled into one regular expression that is applied
+    to all of the lines of a file at once.
+
+    Each item of the definition file 'parse' list is matched as
+    ParseFileLineByLine matches it: the first item at the start of the line
+    after white space, every other item at the first place after the
+    previous item where it matches, without backtracking.
+
+    Attributes
+    ----------
+    names : list
+        The names of the parsed items in order.
+    regex : re.Pattern
+        Matches one line, or the empty string if the line does not parse.
+    extra : dict
+        The values from 'insert' that are added to every parsed line.
+    """
+
+    def __init__(self, fields, extra):
+        self.names = [field[0] for field in fields]
+        self.extra = dict(extra)
+        self._fields = []
+        pattern = []
+        group = 0
+        for number, (name, token, kind, options) in enumerate(fields):
+            skip = r"[ \t\r]*" if number == 0 else ".*?"
+            # The lookahead finds the item, then the back references
+            # consume it.  Python does not backtrack into a lookahead, so
+            # this is an atomic match like pyparsing.
+            pattern.append(f"(?=({skip})({token}))\\{group + 1}\\{group + 2}")
+            self._fields.append((name, group + 2, kind, options))
+            group += 2 + re.compile(token).groups
+        self.regex = re.compile(f"^(?:{''.join(pattern)})?.*$", re.MULTILINE)
+
+    def parse_text(self, text):
+        """Parse all of the lines in `text`.
+
+        Returns
+        -------
+        tuple
+            (columns, line_numbers, unparsed) where columns is a dictionary
+            of the parsed item name to an array with a value for each parsed
+            line, line_numbers the 1 based numbers of the parsed lines, and
+            unparsed the numbers of the lines that did not parse.
+        """
+        rows = self.regex.findall(text)
+        if text.endswith("\n"):
+            # '$' also matches after the final new line.
+            rows = rows[:-1]
+        if not self._fields:
+            return {}, np.arange(1, len(rows) + 1), np.array([], dtype="i8")
+        first = self._fields[0][1] - 1
+        parsed = np.array([bool(row[first]) for row in rows], dtype=bool)
+        line_numbers = np.flatnonzero(parsed) + 1
+        unparsed = np.flatnonzero(~parsed) + 1
+        rows = [row for row, ok in zip(rows, parsed) if ok]
+        columns = {}
+        for name, index, kind, options in self._fields:
+            if kind == "iso":
+                columns[name] = to_datetime64(
+                    *(_to_int([row[index + i] for row in rows]) for i in range(6))
+                )
+                continue
+            values = [row[index - 1] for row in rows]
+            if kind == "int":
+                columns[name] = _to_int(values)
+            elif kind == "float":
+                columns[name] = _to_float(values)
+            elif kind == "offset":
+                origin, unit = options
+                offset = np.round(_to_float(values) * _time_units[unit])
+                columns[name] = np.datetime64(origin, "us") + offset.astype(
+                    "timedelta64[us]"
+                )
+            else:
+                columns[name] = np.array(values, dtype=object)
+        for name, value in self.extra.items():
+            columns[name] = np.full(len(rows), value)
+        return columns, line_numbers, unparsed
+
+    def read(self, filename, workers=None):
+        """Read and parse the file `filename`, see parse_text.
+
+        If `workers` is more than 1 the file is split into chunks at line
+        boundaries that are parsed by a pool of `workers` processes.  The
+        chunks are merged in order and the line numbers are those of the
+        whole file.
+
+        Compressed files, see is_compressed, are decompressed as they are
+        read and parsed one block of `block_size` characters at a time, so
+        the decompressed text is never all in memory.
+        """
+        workers = int(workers) if workers else 1
+        if is_compressed(filename):
+            blocks = text_blocks(filename)
+            if workers <= 1:
+                return _merge([_parse_block(self, text) for text in blocks])
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Submit as blocks are decompressed, but only keep a few
+                # blocks per worker waiting.
+                pending = []
+                parts = []
+                for text in blocks:
+                    pending.append(pool.submit(_parse_block, self, text))
+                    if len(pending) > 2 * workers:
+                        parts.append(pending.pop(0).result())
+                parts.extend(future.result() for future in pending)
+            return _merge(parts)
+
+        size = Path(filename).stat().st_size
+        if workers <= 1 or size < 2 * min_chunk_size:
+            with open(filename, encoding="utf-8", errors="replace") as fpi:
+                return self.parse_text(fpi.read())
+
+        chunk_size = max(min_chunk_size, size // (4 * workers) + 1)
+        bounds = [0]
+        with open(filename, "rb") as fpi:
+            while bounds[-1] < size:
+                fpi.seek(min(bounds[-1] + chunk_size, size))
+                fpi.readline()
+                bounds.append(min(fpi.tell(), size))
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(
+                pool.map(
+                    _parse_range,
+                    [self] * (len(bounds) - 1),
+                    [filename] * (len(bounds) - 1),
+                    bounds[:-1],
+                    bounds[1:],
+                )
+            )
+        return _merge(parts)
+
+    def read_blocks(self, filename, size=None):
+        """Yield the parsed blocks of the file `filename`, see parse_text.
+
+        The file, decompressed if needed, is read and parsed one block of
+        about `size` characters, default `block_size`, at a time.  The line
+        numbers are those of the whole file.
+        """
+        offset = 0
+        for text in text_blocks(filename, size=size):
+            columns, line_numbers, unparsed, nlines = _parse_block(self, text)
+            yield columns, line_numbers + offset, unparsed + offset
+            offset += nlines
+
+
+# Smallest chunk, in bytes, given to a process by CompiledDefinition.read.
+min_chunk_size = 1 << 22
+
+
+def _parse_block(definition, text):
+    """Parse `text` with `definition`.
+
+    Returns the result of CompiledDefinition.parse_text and the number of
+    lines in `text`.
+    """
+    nlines = text.count("\n") + (not text.endswith("\n"))
+    return (*definition.parse_text(text), nlines)
+
+
+def _parse_range(definition, filename, start, stop):
+    """Parse the bytes from `start` to `stop` of `filename`, see
+    _parse_block.
+    """
+    with open(filename, "rb") as fpi:
+        fpi.seek(start)
+        text = fpi.read(stop - start).decode("utf-8", errors="replace")
+    return _parse_block(definition, text)
+
+
+def _merge(parts):
+    """Join the results of _parse_block for consecutive blocks of a file."""
+    if not parts:
+        return {}, np.array([], dtype="i8"), np.array([], dtype="i8")
+    offset = 0
+    line_numbers = []
+    unparsed = []
+    for _, numbers, bad, nlines in parts:
+        line_numbers.append(numbers + offset)
+        unparsed.append(bad + offset)
+        offset += nlines
+    columns = {
+        name: np.concatenate([part[0][name] for part in parts])
+        for name in parts[0][0]
+    }
+    return columns, np.concatenate(line_numbers), np.concatenate(unparsed)
+
+
+def _to_int(values):
+    """Convert a list of integer strings to an int64 array."""
+    return np.fromiter(map(int, values), dtype="i8", count=len(values))
+
+
+_fortran_exponent = str.maketrans("Dd", "Ee")
+
+
+def _to_float(values):
+    """Convert a list of real number strings, which can have a Fortran "D"
+    exponent, to a float64 array."""
+    joined = "".join(values)
+    if "D" in joined or "d" in joined:
+        values = [value.translate(_fortran_exponent) for value in values]
+    return np.fromiter(map(float, values), dtype="f8", count=len(values))
+
+
+def to_datetime64(year, month, day, hour=0, minute=0, second=0):
+    """Combine arrays of date and time fields into datetime64[ns].
+
+    Raises ValueError, like datetime.datetime, if a field is out of range.
+    """
+    fields = (year, month, day, hour, minute, second)
+    year, month, day, hour, minute, second = np.broadcast_arrays(
+        *(np.asarray(i, dtype="i8") for i in fields)
+    )
+    months = (year - 1970) * 12 + (month - 1)
+    first = months.astype("datetime64[M]")
+    days_in_month = (first + 1).astype("datetime64[D]") - first.astype(
+        "datetime64[D]"
+    )
+    bad = (
+        (month < 1)
+        | (month > 12)
+        | (day < 1)
+        | (day > days_in_month.astype("i8"))
+        | (hour < 0)
+        | (hour > 23)
+        | (minute < 0)
+        | (minute > 59)
+        | (second < 0)
+        | (second > 59)
+    )
+    if bad.any():
+        index = np.flatnonzero(bad)[0]
+        raise ValueError(
+            "date or time out of range: "
+            f"{year[index]}-{month[index]}-{day[index]} "
+            f"{hour[index]}:{minute[index]}:{second[index]}"
+        )
+    return (
+        first.astype("datetime64[ns]")
+        + (day - 1).astype("timedelta64[D]")
+        + hour.astype("timedelta64[h]")
+        + minute.astype("timedelta64[m]")
+        + second.astype("timedelta64[s]")
+    )
+
+
+def compile_definition(def_filename):
+    """Compile a definition file into a CompiledDefinition.
+
+    The definition file is run with parse functions that record the
+    regular expression of each item instead of building a pyparsing
+    grammar.  Raises DefinitionNotCompilableError if the definition file
+    uses options that have no regular expression equivalent.
+    """
+    fields = []
+    extra = {}
+
+    def add(name, token, kind, options=None):
+        fields.append((name, token, kind, options))
+
+    def integer_token(minimum, maximum, exact, sign, default):
+        return _sign(sign, default) + "[0-9]" + _digits(minimum, maximum, exact)
+
+    def real_token(required_decimal, sign, default):
+        if required_decimal:
+            number = r"[0-9]*\.[0-9]*"
+        else:
+            number = f"[0-9{re.escape(decimal_sep)}]+"
+        return _sign(sign, default) + number + _exponent
+
+    def integer(name, minimum=1, maximum=0, exact=0, sign=None, parseAct=None):
+        if parseAct not in (None, toInteger, toString):
+            raise DefinitionNotCompilableError(f"parseAct={parseAct!r}")
+        token = integer_token(minimum, maximum, exact, sign, "- +")
+        add(name, token, "str" if parseAct is toString else "int")
+
+    def positive_integer(name, minimum=1, maximum=0, exact=0):
+        add(name, integer_token(minimum, maximum, exact, None, "+"), "int")
+
+    def negative_integer(name, minimum=1, maximum=0, exact=0):
+        add(name, integer_token(minimum, maximum, exact, None, "-"), "int")
+
+    def real(
+        name,
+        required_decimal=True,
+        sign=None,
+        parseAct=None,
+        minimum=1,
+        maximum=0,
+        exact=0,
+    ):
+        if parseAct not in (None, toFloat, toString):
+            raise DefinitionNotCompilableError(f"parseAct={parseAct!r}")
+        token = real_token(required_decimal, sign, "- +")
+        add(name, token, "str" if parseAct is toString else "float")
+
+    def positive_real(name, minimum=1, maximum=0, exact=0):
+        add(name, real_token(True, None, "+"), "float")
+
+    def negative_real(name, minimum=1, maximum=0, exact=0):
+        add(name, real_token(True, None, "-"), "float")
+
+    def real_as_string(
+        name, minimum=1, maximum=0, exact=0, sign=None, parseAct=None
+    ):
+        add(name, real_token(True, sign, "- +"), "str")
+
+    def integer_as_string(
+        name, minimum=1, maximum=0, exact=0, sign=None, parseAct=None
+    ):
+        add(name, integer_token(minimum, maximum, exact, sign, "- +"), "str")
+
+    def isoformat_as_datetime(name, parseAct=None):
+        add(name, _iso, "iso")
+
+    def real_as_datetime(
+        name,
+        sign=None,
+        origin=datetime.datetime(1900, 1, 1),
+        unit="days",
+        parseAct=None,
+    ):
+        # ParseFileLineByLine uses the literal sign "- +" here.
+        add(name, r"(?:- \+)?" + real_token(True, "", ""), "offset")
+        set_origin(origin, unit)
+
+    def integer_as_datetime(
+        name,
+        minimum=1,
+        maximum=0,
+        exact=0,
+        sign=None,
+        origin=datetime.datetime(1900, 1, 1),
+        unit="days",
+        parseAct=None,
+    ):
+        add(name, integer_token(minimum, maximum, exact, sign, "- +"), "offset")
+        set_origin(origin, unit)
+
+    def set_origin(origin, unit):
+        # Like the _origin and _unit globals, the last origin and unit apply
+        # to all of the date items.
+        if unit not in _time_units:
+            raise DefinitionNotCompilableError(f"unit={unit!r}")
+        for number, field in enumerate(fields):
+            if field[2] == "offset":
+                fields[number] = field[:3] + ((origin, unit),)
+
+    def qstring(name):
+        add(name, _quoted, "str")
+
+    def delimited_as_string(name):
+        add(name, "[A-Za-z0-9]+", "str")
+
+    def number_as_real(name, sign=None, parseAct=None):
+        add(name, real_token(False, None, "- +"), "float")
+
+    def number_as_integer(
+        name, minimum=1, maximum=0, exact=0, sign=None, parseAct=None
+    ):
+        add(name, integer_token(minimum, maximum, exact, sign, "- +"), "int")
+
+    def number_as_string(
+        name, minimum=1, maximum=None, exact=0, sign=None, parseAct=None
+    ):
+        add(name, real_token(True, sign, "- +"), "str")
+
+    def insert(name, value):
+        extra[name] = value
+
+    namespace = {
+        "datetime": datetime,
+        "integer": integer,
+        "positive_integer": positive_integer,
+        "negative_integer": negative_integer,
+        "real": real,
+        "positive_real": positive_real,
+        "negative_real": negative_real,
+        "real_as_string": real_as_string,
+        "integer_as_string": integer_as_string,
+        "isoformat_as_datetime": isoformat_as_datetime,
+        "real_as_datetime": real_as_datetime,
+        "integer_as_datetime": integer_as_datetime,
+        "qstring": qstring,
+        "delimited_as_string": delimited_as_string,
+        "number_as_real": number_as_real,
+        "number_as_integer": number_as_integer,
+        "number_as_string": number_as_string,
+        "insert": insert,
+    }
+    try:
+        exec(Path(def_filename).read_text(), namespace)
+    except NameError as exc:
+        raise DefinitionNotCompilableError(str(exc)) from exc
+    return CompiledDefinition(fields, extra)
+
+
 # =============================
 def main(pargs):
     """This should only be used for testing. The primary mode of operation is
@@ -40,6 +40,7 @@ EXAMPLES:
 
 """
 
+import contextlib
 import datetime
 import operator
 import sys
@@ -50,9 +51,9 @@ from numpy import pad
 from scipy.optimize import leastsq
 from skyfield import api
 
-from tappy.tappy_lib import sparser
-from tappy.tappy_lib.parameter_database import _master_speed_dict, letter_to_factor_map
+from tappy.tappy_lib import harmonic, parameter_database, series_cache, sparser
 
+from .result import HarmonicResult
 from .toolbox_utils.src.toolbox_utils import tsutils
 
 ts = api.load.timescale()
@@ -92,64 +93,89 @@ def usage():
     print(__doc__)
 
 
-def interpolate(data, start, stop, iavg):
-    """Linearly interpolate across a section of a vector.
-
-    A function used by zone_calculations.
+def gap_index(dates, interval=None):
+    """Place the dates on a regular time grid and locate the gaps.
 
     Parameters
     ----------
-    data : array
-        The data to be interpolated.
-    start : int
-        The starting index of the section to be interpolated.
-    stop : int
-        The ending index of the section to be interpolated.
-    iavg : int
-        The number of points to average on either side of the section to be
-        interpolated.
+    dates : array
+        Increasing dates of the observations.
+    interval : timedelta64, optional
+        Spacing of the grid.  Defaults to the median spacing of `dates`.
+
+    Returns
+    -------
+    tuple
+        (dates_filled, position, starts, lengths) where dates_filled is the
+        regular grid from the first to the last date, position is the grid
+        index of each observation (-1 if it is not on the grid), and starts
+        and lengths are the grid index and number of missing values of each
+        run of missing values.
     """
-    ssl = slice(0, start) if start < iavg else slice(start - iavg, start)
-    if stop > (len(data) - iavg):
-        stop_sl = slice(stop + 1, len(data))
+    dates = as_datetime64(dates)
+    ticks = (dates - dates[0]).astype("i8")
+    if interval is None:
+        interval = np.sort(np.diff(ticks))[(len(ticks) - 1) // 2]
     else:
-        stop_sl = slice(stop + 1, stop + iavg)
+        interval = np.timedelta64(interval, "ns").astype("i8")
+
+    dates_filled = dates[0] + np.arange(ticks[-1] // interval + 1) * np.timedelta64(
+        interval, "ns"
+    )
 
-    deltay = np.average(data[stop_sl]) - np.average(data[ssl])
-    numx = stop - start + 2.0
-    m = deltay / numx
-    b = np.average(data[ssl]) - m * (start - 1)
-    for i in range(start, stop + 1):
-        data[i] = m * i + b
+    position = ticks // interval
+    position[ticks % interval != 0] = -1
 
+    missing = np.ones(len(dates_filled), dtype="i1")
+    missing[position[position >= 0]] = 0
+    edges = np.diff(np.concatenate(([0], missing, [0])))
+    starts = np.flatnonzero(edges == 1)
+    lengths = np.flatnonzero(edges == -1) - starts
+    return dates_filled, position, starts, lengths
 
-def zone_calculations(zftn, data, mask, limit=25):
-    """Apply a function across the patches (zones) of missing values.
 
-    Used to fill missing or bad data.
+def interpolate_gaps(data, starts, lengths, iavg=25):
+    """Linearly interpolate across runs of missing values.
+
+    Each run is bridged between the average of up to `iavg` values before
+    it and `iavg` - 1 values after it.  Values inside other runs are not
+    included in the averages.
 
     Parameters
     ----------
-    zftn : function
-        The function to be applied to the data.
     data : array
-        The data to be processed.
-    mask : array
-        A boolean array with True values where the data is missing or bad.
-    limit : int
-        The maximum number of points to be processed by the function.
+        The data to be interpolated.  Changed in place.
+    starts : array
+        The starting index of each run of missing values.
+    lengths : array
+        The number of missing values in each run.
+    iavg : int
+        The number of points to average on either side of each run.
     """
-    start = None
-    stop = None
-    for index, val in enumerate(mask):
-        if val and not start:
-            start = index
-        if not val and start:
-            stop = index - 1
-        if start and stop:
-            zftn(data, start, stop, limit)
-            start = None
-            stop = None
+    if len(starts) == 0:
+        return data
+    stops = starts + lengths
+    offset = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    index = np.repeat(starts, lengths) + offset
+
+    good = np.ones(len(data), dtype="bool")
+    good[index] = False
+    csum = np.concatenate(([0.0], np.cumsum(np.where(good, data, 0.0))))
+    ccount = np.concatenate(([0], np.cumsum(good)))
+
+    lower = np.maximum(starts - iavg, 0)
+    upper = np.minimum(stops + iavg - 1, len(data))
+    nleft = ccount[starts] - ccount[lower]
+    nright = ccount[upper] - ccount[stops]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        left = (csum[starts] - csum[lower]) / nleft
+        right = (csum[upper] - csum[stops]) / nright
+    left = np.where(nleft > 0, left, right)
+    right = np.where(nright > 0, right, left)
+
+    slope = (right - left) / (lengths + 1)
+    data[index] = np.repeat(left, lengths) + np.repeat(slope, lengths) * (offset + 1)
+    return data
 
 
 def node_factor_73(ii):
@@ -208,11 +234,237 @@ def node_factor_235(ii, nu):
     ) ** 0.5  # eq 235 schureman
 
 
+# Number of rows formatted and written at once by Util.write_rows.
+write_block = 65536
+
+_unix_epoch = np.datetime64("1970-01-01T00:00:00", "ns")
+_unix_epoch_jd = 2440587.5
+
+
+def as_datetime64(dates):
+    """Return `dates` as a datetime64[ns] array.
+
+    Accepts a sequence of datetime.datetime, a numpy datetime64 array, or a
+    pandas DatetimeIndex.  Time zone aware dates are converted to UTC.
+    Returns None if `dates` are not dates.
+    """
+    tz = getattr(dates, "tz", None)
+    if tz is not None:
+        dates = dates.tz_convert("UTC").tz_localize(None)
+    dates = np.asarray(dates)
+    if dates.dtype.kind == "M":
+        return dates.astype("datetime64[ns]", copy=False)
+    if dates.dtype.kind == "O" and len(dates) and isinstance(
+        dates.flat[0], datetime.datetime
+    ):
+        if dates.flat[0].tzinfo is not None:
+            dates = np.array(
+                [
+                    d.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+                    for d in dates
+                ]
+            )
+        return dates.astype("datetime64[ns]")
+    return None
+
+
+# Number of observations of which the node factors and the design matrix
+# are made at a time by Tappy.add_observations, and of the chunks of
+# read_binary_chunks.
+chunk_size = 1 << 16
+
+# Shortest record, in hours, from which any constituent (M2) can be
+# calculated, see Util.select_constituents.
+min_hours = 13
+
+# Suffixes of the binary formats read directly by Tappy.open.
+binary_suffixes = (".npy", ".npz", ".h5", ".hdf5", ".parquet", ".feather")
+
+_date_names = ("Datetime", "datetime", "dates")
+_level_names = ("water_level", "elevation")
+
+
+def _pick(names, choices, position):
+    """Return the first of `choices` in `names`, else names[position]."""
+    for name in choices:
+        if name in names:
+            return name
+    return names[position]
+
+
+def read_binary(filename):
+    """Read dates and water levels from a binary columnar file.
+
+    Parameters
+    ----------
+    filename : Path
+        One of
+        ".npy": a structured array with a datetime64 and a water level
+        field, or a water level array with the datetime64 array in the
+        companion file "{stem}_dates.npy".  Both are memory mapped.
+        ".npz": a NumPy archive with a datetime64 and a water level array.
+        ".h5" or ".hdf5": a pandas HDF5 table with a DatetimeIndex.
+        ".parquet" or ".feather": a table with a DatetimeIndex or a date
+        column.  Needs pyarrow.
+        The dates are the "Datetime", "datetime", or "dates" field or
+        column, else the first, and the water levels the "water_level" or
+        "elevation" field or column, else the last.
+
+    Returns
+    -------
+    tuple
+        (dates, elevation) as datetime64[ns] and contiguous float64 arrays.
+    """
+    dates, elevation = _binary_columns(filename)
+    return as_datetime64(dates), np.ascontiguousarray(elevation, dtype="float64")
+
+
+def read_binary_chunks(filename, chunk_size):
+    """Yield the dates and water levels of a binary columnar file, see
+    read_binary, `chunk_size` values at a time.
+
+    ".npy" files are memory mapped, so only one chunk is converted and in
+    memory at a time.  The other formats are read whole first.
+    """
+    dates, elevation = _binary_columns(filename)
+    for start in range(0, len(elevation), chunk_size):
+        sl = slice(start, start + chunk_size)
+        yield (
+            as_datetime64(dates[sl]),
+            np.ascontiguousarray(elevation[sl], dtype="float64"),
+        )
+
+
+def _binary_columns(filename):
+    """Return the (dates, elevation) columns of a binary columnar file as
+    stored, see read_binary.
+    """
+    suffix = filename.suffix.lower()
+    if suffix == ".npy":
+        data = np.load(filename, mmap_mode="r")
+        if data.dtype.names:
+            names = list(data.dtype.names)
+            dates = data[_pick(names, _date_names, 0)]
+            elevation = data[_pick(names, _level_names, -1)]
+        else:
+            elevation = data
+            dates = np.load(
+                filename.with_name(f"{filename.stem}_dates.npy"), mmap_mode="r"
+            )
+    elif suffix == ".npz":
+        with np.load(filename) as data:
+            names = list(data.files)
+            dates = data[_pick(names, _date_names, 0)]
+            elevation = data[_pick(names, _level_names, -1)]
+    else:
+        import pandas as pd
+
+        if suffix in (".h5", ".hdf5"):
+            df = pd.read_hdf(filename)
+        elif suffix == ".parquet":
+            df = pd.read_parquet(filename)
+        else:
+            df = pd.read_feather(filename)
+        if not isinstance(df.index, pd.DatetimeIndex):
+            df = df.set_index(_pick(list(df.columns), _date_names, 0))
+        dates = df.index
+        elevation = df[_pick(list(df.columns), _level_names, -1)].values
+    return dates, elevation
+
+
+def isoformat(dates):
+    """Return the ISO 8601 strings of a datetime64 array (or scalar)."""
+    return np.datetime_as_string(dates, unit="s")
+
+
+# Constituents inferred from the fitted constituents when the record is too
+# short to separate them.  Keyed by the (reference, other) pair that must be
+# in the fit, each entry is (name, amplitude reference, ratio, factor) with
+#     H[name] = ratio * H[amplitude reference]
+#     phase[name] = phase[reference] + factor * (phase[reference] - phase[other])
+_inferred_table = {
+    ("K1", "O1"): (
+        ("J1", "O1", 0.079, 0.496),
+        # How should I handle this?  Shureman seems to confuse M1 and NO1
+        ("M1", "O1", 0.071, -0.5),
+        ("OO1", "O1", 0.043, 1.0),
+        ("P1", "K1", 0.331, -0.075),
+        ("Q1", "O1", 0.194, -1.496),
+        ("2Q1", "O1", 0.026, -1.992),
+        ("rho1", "O1", 0.038, -1.429),
+    ),
+    ("S2", "M2"): (
+        ("K2", "S2", 0.272, 0.081),
+        ("L2", "M2", 0.028, -0.464),
+        ("N2", "M2", 0.194, -1.536),
+        ("2N2", "M2", 0.026, -2.072),
+        ("R2", "S2", 0.008, 0.040),
+        ("T2", "S2", 0.059, -0.040),
+        ("lambda2", "M2", 0.007, -0.536),
+        ("mu2", "M2", 0.024, -2.0),
+        ("nu2", "M2", 0.038, -1.464),
+    ),
+}
+
+
+def _companion_def(filename):
+    """Return the definition file in the same directory as the data file
+    `filename`, "{stem}_def{suffix}", or None if there isn't one.
+    """
+    test_filename = filename.with_name(f"{filename.stem}_def{filename.suffix}")
+    if test_filename.exists():
+        return test_filename
+    return None
+
+
+def _finite(dates, elevation):
+    """Return the datetime64 `dates` and float64 `elevation` where the
+    elevation is finite.
+    """
+    dates = as_datetime64(dates)
+    elevation = np.asarray(elevation, dtype="float64")
+    good = np.isfinite(elevation)
+    if good.all():
+        return dates, elevation
+    return dates[good], elevation[good]
+
+
+class _Constituent(dict):
+    """A tidal_dict entry that evaluates the node factor when first used.
+
+    The "FF" item of the entry passed in is a function of no arguments that
+    returns the node factor on the node grid.  If `expand` is given it
+    interpolates from the node grid to the observation times.
+    """
+
+    def __init__(self, entry, expand=None):
+        super().__init__(entry)
+        self._ff = self.pop("FF")
+        self._expand = expand
+        self._grid_ff = None
+
+    def grid_ff(self):
+        """Return the node factor on the node grid."""
+        if self._grid_ff is None:
+            self._grid_ff = self._ff()
+        return self._grid_ff
+
+    def __missing__(self, key):
+        if key != "FF":
+            raise KeyError(key)
+        ff = self.grid_ff()
+        if self._expand is not None:
+            ff = self._expand(ff)
+        self["FF"] = ff
+        return ff
+
+
 # ====================================
 class Util:
-    def __init__(self, r, phase):
+    def __init__(self, r, phase, node_interval=None):
         self.r = r
         self.phase = phase
+        self.node_interval = node_interval
 
     def sum_signals(self, skey_list, hours, speed_dict, amp=None, phase=None):
         """Sum the signals for a list of constituents.
@@ -229,45 +481,83 @@ class Util:
             The amplitudes of the constituents.
         phase : array
             The phases of the constituents.
+
+        All constituents are evaluated together in blocks of time, see
+        `harmonic.synthesize`, and the float64 sum is returned.
         """
-        total = np.zeros(len(hours), dtype="f")
-        if isinstance(hours[0], datetime.datetime):
-            hours = self.dates2jd(hours)
-            hours = (hours - hours[0]) * 24
-        for i in skey_list:
-            R = self.r[i] if amp is None else (amp - np.average(amp)) + self.r[i]
-            if phase is None:
-                p = self.phase[i]
-            else:
-                p = (phase - np.average(phase)) + self.phase[i]
-            component = (
-                R
-                * speed_dict[i]["FF"]
-                * np.cos(
-                    speed_dict[i]["speed"] * hours
-                    - (p - speed_dict[i]["VAU"]) * deg2rad
-                )
-            )
-            total = total + component
-        return total
+        if as_datetime64(hours) is not None:
+            hours = self.dates2hours(hours)
+            hours = hours - hours[0]
+        skey_list = list(skey_list)
+        amplitude_offset = None
+        if amp is not None:
+            amplitude_offset = amp - np.average(amp)
+        phase_offset = None
+        if phase is not None:
+            phase_offset = (phase - np.average(phase)) * deg2rad
+        return harmonic.synthesize(
+            hours,
+            [speed_dict[i]["speed"] for i in skey_list],
+            [self.r[i] for i in skey_list],
+            [(self.phase[i] - speed_dict[i]["VAU"]) * deg2rad for i in skey_list],
+            ff=[speed_dict[i]["FF"] for i in skey_list],
+            amplitude_offset=amplitude_offset,
+            phase_offset=phase_offset,
+        )
+
+    def sum_signals_regular(self, skey_list, step, count, speed_dict, start=0.0):
+        """Sum the signals for a list of constituents at `count` times,
+        `step` hours apart, starting at hour `start`.
+
+        Uses the phasor recurrence of `harmonic.synthesize_regular` instead
+        of evaluating a cosine for every time and constituent.
+        """
+        skey_list = list(skey_list)
+        return harmonic.synthesize_regular(
+            start,
+            step,
+            count,
+            [speed_dict[i]["speed"] for i in skey_list],
+            [self.r[i] for i in skey_list],
+            [(self.phase[i] - speed_dict[i]["VAU"]) * deg2rad for i in skey_list],
+            ff=[speed_dict[i]["FF"] for i in skey_list],
+        )
 
     def dates2jd(self, dates):
         """
         Given a dates vector will return a vector of Julian days as required
         by astronomia.
+
+        The dates can be a sequence of datetime.datetime, a numpy datetime64
+        array, or a pandas DatetimeIndex, and are taken as UTC.  The Julian
+        days are in Terrestrial Time (TT) and are calculated with array
+        arithmetic, adding TT - UTC from the skyfield leap second table.
+        Anything else is assumed to already be Julian days.
         """
+        dates64 = as_datetime64(dates)
+        if dates64 is None:
+            return dates
 
-        if isinstance(dates[0], datetime.datetime):
-            jd = [
-                ts.tt(i.year, i.month, i.day, i.hour, i.minute, i.second).tt
-                for i in dates
-            ]
-            jd = np.array(jd).flatten()
-        else:
-            jd = dates
-        return jd
+        jd = (dates64 - _unix_epoch).astype("i8") / 86400.0e9 + _unix_epoch_jd
+        return jd + self.tt_minus_utc(jd) / 86400.0
+
+    def tt_minus_utc(self, jd):
+        """Return TT - UTC in seconds at the UTC Julian days `jd`.
+
+        TT - UTC = (TAI - UTC) + 32.184 seconds, with TAI - UTC from the
+        skyfield leap second table.  Before the first leap second TAI - UTC
+        was 10 seconds.
+        """
+        tai_utc = np.concatenate(([ts.leap_offsets[0] - 1], ts.leap_offsets))
+        tai_utc = tai_utc[np.searchsorted(ts.leap_dates, jd, side="right")]
+        return tai_utc + 32.184
 
-    def write_file(self, x, y, fname="-"):
+    def dates2hours(self, dates):
+        """Return the dates as float hours since 1970-01-01T00:00:00."""
+        dates64 = as_datetime64(dates)
+        return (dates64 - _unix_epoch).astype("i8") / 3600.0e9
+
+    def write_file(self, x, y, fname="-", decimals=None):
         """Write the data to a file.
 
         Parameters
@@ -276,28 +566,116 @@ class Util:
             The time-series of dates.
         y : array
             The time-series of water levels.
+        decimals : int, optional
+            Write the water levels with this many decimal places instead of
+            full precision.
         """
         if isinstance(y, dict):
             for key in list(y.keys()):
                 fname = Path(fname)
                 nfname = fname.with_name(f"{fname.stem}_{key}.dat")
-                self.write_file(x, y[key], fname=nfname)
-        elif fname == "-":
-            print("Datetime,water_level")
-            for d, v in zip(x, y):
-                print(f"{d.isoformat()},{v}")
+                self.write_file(x, y[key], fname=nfname, decimals=decimals)
         else:
+            with self.open_output(fname) as fpo:
+                self.write_rows(fpo, x, y, decimals=decimals)
+
+    def write_table(self, x, columns, fname, decimals=None):
+        """Write several time-series that share the dates `x` to one file.
+
+        Parameters
+        ----------
+        x : array
+            The time-series of dates.
+        columns : dict
+            Column name to time-series of values, in column order.
+        fname : str
+            Output file name.  The format is taken from the extension:
+            ".npz" is a compressed NumPy archive with a "Datetime" array and
+            one array per column, ".h5" or ".hdf5" is an HDF5 table under
+            the key "outts", and anything else is CSV with a "Datetime"
+            column.
+        decimals : int, optional
+            Number of decimal places for the CSV values.
+        """
+        dates = as_datetime64(x)
+        suffix = Path(fname).suffix.lower()
+        if suffix == ".npz":
+            np.savez_compressed(fname, Datetime=dates, **columns)
+        elif suffix in (".h5", ".hdf5"):
+            import pandas as pd
+
+            index = pd.DatetimeIndex(dates, name="Datetime")
+            pd.DataFrame(columns, index=index).to_hdf(
+                fname, key="outts", mode="w", complevel=5, complib="zlib"
+            )
+        else:
+            if decimals is None:
+                fmt = str
+            else:
+                fmt = f"{{:.{int(decimals)}f}}".format
             with open(fname, mode="w", encoding="ascii") as fpo:
-                fpo.write("Datetime,water_level\n")
-                for d, v in zip(x, y):
-                    fpo.write(f"{d.isoformat()},{v}\n")
+                fpo.write(",".join(["Datetime", *columns]) + "\n")
+                for start in range(0, len(dates), write_block):
+                    sl = slice(start, start + write_block)
+                    rows = zip(
+                        isoformat(dates[sl]).tolist(),
+                        *(
+                            map(fmt, np.asarray(y)[sl].tolist())
+                            for y in columns.values()
+                        ),
+                    )
+                    fpo.write("".join([",".join(row) + "\n" for row in rows]))
 
-    def astronomic(self, dates):
+    @contextlib.contextmanager
+    def open_output(self, fname="-"):
+        """Open `fname` for output and write the "Datetime,water_level"
+        header.  If `fname` is "-" the output goes to standard output.
+        """
+        fpo = sys.stdout if fname == "-" else open(fname, mode="w", encoding="ascii")
+        try:
+            fpo.write("Datetime,water_level\n")
+            yield fpo
+        finally:
+            if fpo is not sys.stdout:
+                fpo.close()
+
+    def write_rows(self, fpo, x, y, decimals=None):
+        """Write the dates `x` and water levels `y` as rows to the open
+        file `fpo`.
+
+        The rows are formatted as whole arrays and written `write_block`
+        rows at a time.
+        """
+        values = np.asarray(y)
+        if decimals is None:
+            fmt = str
+        else:
+            fmt = f"{{:.{int(decimals)}f}}".format
+        for start in range(0, len(values), write_block):
+            sl = slice(start, start + write_block)
+            dates = isoformat(as_datetime64(x[sl])).tolist()
+            levels = map(fmt, values[sl].tolist())
+            fpo.write("".join([f"{d},{v}\n" for d, v in zip(dates, levels)]))
+
+    def astronomic(self, dates, node_interval=None):
         """
         Calculates all of the required astronomic parameters needed for the
         tidal analysis.  The node factor is returned as a vector equal in
         length to the dates vector whereas V + u is returned for the first date
         in the dates vector.
+
+        If `node_interval` (hours) is given, everything except the Julian
+        days is evaluated on a node grid of evenly spaced times, about
+        `node_interval` apart, from the first to the last date.  The node
+        factors are then evaluated on the grid and linearly interpolated to
+        the dates by `tidal_constituents`.  The node factors vary with the
+        18.61 year lunar node and the 8.85 year lunar perigee, so the
+        interpolation error is about (node_interval * omega)**2 / 8 times
+        the amplitude of the variation, where omega is the angular speed of
+        2 * perigee (about 0.00016 radians/hour).  For a daily grid the
+        largest relative error, for L2, is about 2.5e-6 of the node factor,
+        far below what any record can resolve.  The grid is only used if it
+        is shorter than the dates.
         """
 
         from astronomia import lunar as elp
@@ -307,11 +685,20 @@ class Util:
         solar_eph = sun.Sun()
 
         jd = self.dates2jd(dates)
+        if node_interval:
+            span = (jd[-1] - jd[0]) * 24.0
+            npoints = int(np.ceil(span / float(node_interval))) + 1
+            if npoints < len(jd):
+                package = self.astronomic(np.linspace(jd[0], jd[-1], npoints))
+                return package[:9] + (jd,) + package[10:]
+
         Nv = lunar_eph.mean_longitude_ascending_node(jd)
         p = lunar_eph.mean_longitude_perigee(jd)
         s = lunar_eph.mean_longitude(jd)
         h = solar_eph.mean_longitude(jd)
         p1 = solar_eph.mean_longitude_perigee(jd)
+        # astronomia returns scalars for a single date.
+        (Nv, p, s, h, p1) = (np.atleast_1d(i) for i in (Nv, p, s, h, p1))
 
         # Calculate constants for V+u
         # I, inclination of Moon's orbit, pg 156, Schureman
@@ -333,8 +720,14 @@ class Util:
         const_2 = np.sin(i) ** 2 * np.cos(2.0 * nu) + 0.0727
         nupp = 0.5 * np.arctan2(const_1, const_2)  # eq 232
 
-        # hour = jd[0] - int(jd[0])
-        hour = jd[0] - 2400000.5
+        # T, the hour angle of the mean sun, follows the rotation of the
+        # Earth, so it is taken from UT (as UTC) and not from the TT Julian
+        # days used for the mean longitudes above.
+        # The leap second table is in UTC, so look up the offset again at
+        # the approximate UTC time.
+        jd_utc = jd - self.tt_minus_utc(jd) / 86400.0
+        jd_utc = jd - self.tt_minus_utc(jd_utc) / 86400.0
+        hour = jd_utc - 2400000.5
 
         kap_p = p - zeta  # eq 191
 
@@ -355,13 +748,35 @@ class Util:
         # the larger sized vector when filling missing values.
         return (zeta, nu, nup, nupp, kap_p, i, R, Q, T, jd, s, h, Nv, p, p1)
 
-    def which_constituents(self, length, package, rayleigh_comp=1.0):
+    def tidal_constituents(self, length, package, every_date=False):
         """
-        Establishes which constituents are able to be determined according to
-        the length of the water elevation vector.
+        Returns the tidal_dict of all constituents for the time base of
+        `package`.  The node factor "FF" of each constituent is only
+        evaluated, once, when it is first used.
+
+        V + u ("VAU") is for the first time of `package`, or with
+        `every_date` an array of V + u at every time of `package`, which
+        must not be on a node grid.
         """
 
         (zeta, nu, nup, nupp, kap_p, ii, R, Q, T, jd, s, h, Nv, p, p1) = package
+
+        # V + u is usually only needed at the first time.  The node factors
+        # need nu at every time of the node grid.
+        nu_t = nu
+        expand = None
+        if np.size(ii) < np.size(jd):
+            grid = np.linspace(jd[0], jd[-1], len(ii))
+
+            def expand(ff):
+                return np.interp(jd, grid, ff)
+
+        if not every_date:
+            (zeta, nu, nup, nupp, R, Q, T, s, h, p, p1, Nv) = (
+                np.ravel(i)[0]
+                for i in (zeta, nu, nup, nupp, R, Q, T, s, h, p, p1, Nv)
+            )
+
         # Set data into speed_dict depending on length of time series
         # Required length of time series depends on Raleigh criteria to
         # differentiate beteen constituents of simmilar speed.
@@ -372,149 +787,149 @@ class Util:
 
         # TASK has the following constituents
         #  MSN6       87.4238337
-        self.tidal_dict = {
+        tidal_dict = {
             "M2": {
                 "ospeed": 28.984104252 * deg2rad,
                 "VAU": 2 * (T - s + h + zeta - nu),
                 "u": 2 * (zeta - nu),
-                "FF": node_factor_78(ii),
+                "FF": lambda: node_factor_78(ii),
             }
         }
 
-        self.tidal_dict["K1"] = {
+        tidal_dict["K1"] = {
             "ospeed": 15.041068632 * deg2rad,
             "VAU": T + h - 90 * deg2rad - nup,
             "u": -nup,
-            "FF": node_factor_227(ii, nu),
+            "FF": lambda: node_factor_227(ii, nu_t),
         }
-        self.tidal_dict["M3"] = {
+        tidal_dict["M3"] = {
             "ospeed": 43.476156360 * deg2rad,
             "VAU": 3 * (T - s + h + zeta - nu),
             "u": 3 * (zeta - nu),
-            "FF": node_factor_149(ii),
+            "FF": lambda: node_factor_149(ii),
         }
-        self.tidal_dict["M4"] = {
+        tidal_dict["M4"] = {
             "ospeed": 57.968208468 * deg2rad,
-            "VAU": 2.0 * self.tidal_dict["M2"]["VAU"],
-            "FF": self.tidal_dict["M2"]["FF"] ** 2,
+            "VAU": 2.0 * tidal_dict["M2"]["VAU"],
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 2,
         }
-        self.tidal_dict["M6"] = {
+        tidal_dict["M6"] = {
             "ospeed": 86.952312720 * deg2rad,
-            "VAU": 3.0 * self.tidal_dict["M2"]["VAU"],
+            "VAU": 3.0 * tidal_dict["M2"]["VAU"],
             # Parker, et. al node factor for M6 is square of M2.  This is
             # inconsistent with IHOTC, Schureman, and FF of M4 and M8.
-            "FF": self.tidal_dict["M2"]["FF"] ** 3,
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 3,
         }
-        self.tidal_dict["M8"] = {
+        tidal_dict["M8"] = {
             "ospeed": 115.936416972 * deg2rad,
-            "VAU": 4.0 * self.tidal_dict["M2"]["VAU"],
-            "FF": self.tidal_dict["M2"]["FF"] ** 4,
+            "VAU": 4.0 * tidal_dict["M2"]["VAU"],
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 4,
         }
-        self.tidal_dict["S6"] = {
+        tidal_dict["S6"] = {
             "ospeed": 90.0 * deg2rad,
             "VAU": 6 * T,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["O1"] = {
+        tidal_dict["O1"] = {
             "ospeed": 13.943035584 * deg2rad,
             "VAU": T - 2 * s + h + 90 * deg2rad + 2 * zeta - nu,
             "u": 2 * zeta - nu,
-            "FF": node_factor_75(ii),
+            "FF": lambda: node_factor_75(ii),
         }
-        self.tidal_dict["S2"] = {
+        tidal_dict["S2"] = {
             "ospeed": 30.0000000 * deg2rad,
             "VAU": 2 * T,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["2MS6"] = {
+        tidal_dict["2MS6"] = {
             "ospeed": 87.968208492 * deg2rad,  # ?
-            "VAU": (2.0 * self.tidal_dict["M2"]["VAU"] + self.tidal_dict["S2"]["VAU"]),
-            "FF": self.tidal_dict["M2"]["FF"] ** 2,
+            "VAU": (2.0 * tidal_dict["M2"]["VAU"] + tidal_dict["S2"]["VAU"]),
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 2,
         }
-        self.tidal_dict["2SM6"] = {
+        tidal_dict["2SM6"] = {
             "ospeed": 88.984104228 * deg2rad,  # ?
-            "VAU": (2.0 * self.tidal_dict["S2"]["VAU"] + self.tidal_dict["M2"]["VAU"]),
-            "FF": self.tidal_dict["M2"]["FF"],
+            "VAU": (2.0 * tidal_dict["S2"]["VAU"] + tidal_dict["M2"]["VAU"]),
+            "FF": lambda: tidal_dict["M2"].grid_ff(),
         }
-        self.tidal_dict["MSf"] = {
+        tidal_dict["MSf"] = {
             "ospeed": 1.0158957720 * deg2rad,
             "VAU": 2.0 * (s - h),
-            "FF": node_factor_75(ii),
+            "FF": lambda: node_factor_75(ii),
         }
-        self.tidal_dict["SK3"] = {
+        tidal_dict["SK3"] = {
             "ospeed": 45.041068656 * deg2rad,
-            "VAU": self.tidal_dict["S2"]["VAU"] + self.tidal_dict["K1"]["VAU"],
-            "FF": self.tidal_dict["K1"]["FF"],
+            "VAU": tidal_dict["S2"]["VAU"] + tidal_dict["K1"]["VAU"],
+            "FF": lambda: tidal_dict["K1"].grid_ff(),
         }
         # Might need to move this to another time span - couldn't find this
         # in Foreman for Rayleigh comparison pair.
-        self.tidal_dict["2SM2"] = {
+        tidal_dict["2SM2"] = {
             "ospeed": 31.01589576 * deg2rad,
-            "VAU": (2.0 * self.tidal_dict["S2"]["VAU"] - self.tidal_dict["M2"]["VAU"]),
-            "FF": self.tidal_dict["M2"]["FF"],
+            "VAU": (2.0 * tidal_dict["S2"]["VAU"] - tidal_dict["M2"]["VAU"]),
+            "FF": lambda: tidal_dict["M2"].grid_ff(),
         }
-        self.tidal_dict["MS4"] = {
+        tidal_dict["MS4"] = {
             "ospeed": 58.984104240 * deg2rad,
-            "VAU": (self.tidal_dict["M2"]["VAU"] + self.tidal_dict["S2"]["VAU"]),
-            "FF": self.tidal_dict["M2"]["FF"] ** 2,
+            "VAU": (tidal_dict["M2"]["VAU"] + tidal_dict["S2"]["VAU"]),
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 2,
         }
-        self.tidal_dict["S4"] = {
+        tidal_dict["S4"] = {
             "ospeed": 60.0 * deg2rad,
             "VAU": 4 * T,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["OO1"] = {
+        tidal_dict["OO1"] = {
             "ospeed": 16.139101680 * deg2rad,
             "VAU": T + 2 * s + h - 90 * deg2rad - 2 * zeta - nu,
-            "FF": node_factor_77(ii),
+            "FF": lambda: node_factor_77(ii),
         }
-        self.tidal_dict["MK3"] = {
+        tidal_dict["MK3"] = {
             "ospeed": 44.025172884 * deg2rad,
-            "VAU": self.tidal_dict["M2"]["VAU"] + self.tidal_dict["K1"]["VAU"],
-            "FF": self.tidal_dict["M2"]["FF"] * self.tidal_dict["K1"]["FF"],
+            "VAU": tidal_dict["M2"]["VAU"] + tidal_dict["K1"]["VAU"],
+            "FF": lambda: tidal_dict["M2"].grid_ff() * tidal_dict["K1"].grid_ff(),
         }
         # Seems like 2MK3 in Schureman is equivalent to MO3 in Foreman
-        self.tidal_dict["MO3"] = {
+        tidal_dict["MO3"] = {
             "ospeed": 42.927139836 * deg2rad,
-            "VAU": (2 * self.tidal_dict["M2"]["VAU"] - self.tidal_dict["K1"]["VAU"]),
-            "FF": self.tidal_dict["M2"]["FF"] ** 2 * self.tidal_dict["K1"]["FF"],
+            "VAU": (2 * tidal_dict["M2"]["VAU"] - tidal_dict["K1"]["VAU"]),
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 2 * tidal_dict["K1"].grid_ff(),
         }
-        self.tidal_dict["N2"] = {
+        tidal_dict["N2"] = {
             "ospeed": 28.439729568 * deg2rad,
             "VAU": 2 * T - 3 * s + 2 * h + p + 2 * zeta - 2 * nu,
-            "FF": self.tidal_dict["M2"]["FF"],
+            "FF": lambda: tidal_dict["M2"].grid_ff(),
         }
-        self.tidal_dict["2MN6"] = {
+        tidal_dict["2MN6"] = {
             "ospeed": 86.407938036 * deg2rad,
-            "VAU": (2 * self.tidal_dict["M2"]["VAU"] + self.tidal_dict["N2"]["VAU"]),
-            "FF": self.tidal_dict["M2"]["FF"] ** 3,
+            "VAU": (2 * tidal_dict["M2"]["VAU"] + tidal_dict["N2"]["VAU"]),
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 3,
         }
-        self.tidal_dict["2Q1"] = {
+        tidal_dict["2Q1"] = {
             "ospeed": 12.854286252 * deg2rad,
             "VAU": T - 4 * s + h + 2 * p + 90 * deg2rad + 2 * zeta - nu,
-            "FF": self.tidal_dict["O1"]["FF"],
+            "FF": lambda: tidal_dict["O1"].grid_ff(),
         }
-        self.tidal_dict["Q1"] = {
+        tidal_dict["Q1"] = {
             "ospeed": 13.3986609 * deg2rad,
             "VAU": T - 3 * s + h + p + 90 * deg2rad + 2 * zeta - nu,
-            "FF": self.tidal_dict["O1"]["FF"],
+            "FF": lambda: tidal_dict["O1"].grid_ff(),
         }
-        self.tidal_dict["J1"] = {
+        tidal_dict["J1"] = {
             "ospeed": 15.5854433 * deg2rad,
             "VAU": T + s + h - p - 90 * deg2rad - nu,
-            "FF": node_factor_76(ii),
+            "FF": lambda: node_factor_76(ii),
         }
         # Seems like KJ2 in Schureman is equivalent to eta2 in Foreman
-        self.tidal_dict["eta2"] = {
+        tidal_dict["eta2"] = {
             "ospeed": 30.626511948 * deg2rad,
             "VAU": 2 * T + s + 2 * h - p - 2 * nu,
-            "FF": node_factor_79(ii),
+            "FF": lambda: node_factor_79(ii),
         }
         # Seems like KQ1 in Schureman is equivalent to ups1 in Foreman
-        self.tidal_dict["ups1"] = {
+        tidal_dict["ups1"] = {
             "ospeed": 16.683476328 * deg2rad,
             "VAU": T + 3 * s + h - p - 90 * deg2rad - 2 * zeta - nu,
-            "FF": node_factor_77(ii),
+            "FF": lambda: node_factor_77(ii),
         }
         #
         # The M1/NO1 curse.
@@ -552,39 +967,39 @@ class Util:
         # M1            14.492052126  From Schureman A71
         # NO1           14.496693984  From Schureman M1
 
-        self.tidal_dict["M1"] = {
+        tidal_dict["M1"] = {
             "ospeed": 14.4920521 * deg2rad,
             "VAU": T - s + h + zeta + nu,  # term A71 in Schureman
-            "FF": node_factor_144(ii),
+            "FF": lambda: node_factor_144(ii),
         }
-        self.tidal_dict["NO1"] = {
+        tidal_dict["NO1"] = {
             "ospeed": 14.496693984 * deg2rad,
             "VAU": T - s + h - 90 * deg2rad + zeta - nu + Q,
             # 2.307**0.5 factor was missed in Darwin's  and the wrong
             # factor was used for M1 for many years.  Indicates how unimportant
             # M1 and NO1 are!  As with many constituents listed here, I have
             # included them for completeness rather than necessity.
-            "FF": (
-                self.tidal_dict["O1"]["FF"]
+            "FF": lambda: (
+                tidal_dict["O1"].grid_ff()
                 * (2.31 + 1.435 * np.cos(2.0 * kap_p)) ** 0.5
                 / 2.307**0.5
             ),
         }
-        self.tidal_dict["MN4"] = {
+        tidal_dict["MN4"] = {
             "ospeed": 57.423833820 * deg2rad,  # From TASK
-            "VAU": self.tidal_dict["M2"]["VAU"] + self.tidal_dict["N2"]["VAU"],
-            "FF": self.tidal_dict["M2"]["FF"] ** 2,
+            "VAU": tidal_dict["M2"]["VAU"] + tidal_dict["N2"]["VAU"],
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 2,
         }
-        self.tidal_dict["Mm"] = {
+        tidal_dict["Mm"] = {
             "ospeed": 0.5443747 * deg2rad,
             "VAU": s - p,
-            "FF": node_factor_73(ii),
+            "FF": lambda: node_factor_73(ii),
         }
-        self.tidal_dict["L2"] = {
+        tidal_dict["L2"] = {
             "ospeed": 29.5284789 * deg2rad,
             "VAU": 2 * T - s + 2 * h - p + 180 * deg2rad + 2 * zeta - 2 * nu - R,
-            "FF": (
-                self.tidal_dict["M2"]["FF"]
+            "FF": lambda: (
+                tidal_dict["M2"].grid_ff()
                 / (
                     1.0
                     / (
@@ -596,160 +1011,160 @@ class Util:
                 )
             ),  # eq 215, schureman
         }
-        self.tidal_dict["mu2"] = {
+        tidal_dict["mu2"] = {
             "ospeed": 27.9682084 * deg2rad,
             "VAU": 2 * T - 4 * s + 4 * h + 2 * zeta - 2 * nu,
-            "FF": self.tidal_dict["M2"]["FF"],
+            "FF": lambda: tidal_dict["M2"].grid_ff(),
         }
-        #        self.tidal_dict["ALPHA1"] =
+        #        tidal_dict["ALPHA1"] =
         # eps2 = MNS2
-        self.tidal_dict["MNS2"] = {
+        tidal_dict["MNS2"] = {
             "ospeed": 27.423833796 * deg2rad,
             "VAU": 2 * T - 5 * s + 4 * h + p + 4 * zeta - 4 * nu,  # verify
-            "FF": self.tidal_dict["M2"]["FF"] ** 2,
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 2,
         }
-        self.tidal_dict["SN4"] = {
+        tidal_dict["SN4"] = {
             "ospeed": 58.4397295560 * deg2rad,
             "VAU": 2 * T - 5 * s + 4 * h + p + 4 * zeta - 4 * nu,
-            "FF": self.tidal_dict["M2"]["FF"] ** 2,
+            "FF": lambda: tidal_dict["M2"].grid_ff() ** 2,
         }
-        self.tidal_dict["Ssa"] = {
+        tidal_dict["Ssa"] = {
             "ospeed": 0.0821373 * deg2rad,
             "VAU": 2.0 * h,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["Mf"] = {
+        tidal_dict["Mf"] = {
             "ospeed": 1.0980331 * deg2rad,
             "VAU": 2.0 * (s - zeta),
-            "FF": node_factor_74(ii),
+            "FF": lambda: node_factor_74(ii),
         }
-        self.tidal_dict["P1"] = {
+        tidal_dict["P1"] = {
             "ospeed": 14.9589314 * deg2rad,
             "VAU": T - h + 90 * deg2rad,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["K2"] = {
+        tidal_dict["K2"] = {
             "ospeed": 30.0821373 * deg2rad,
             "VAU": 2 * (T + h - nupp),
-            "FF": node_factor_235(ii, nu),
+            "FF": lambda: node_factor_235(ii, nu_t),
         }
-        self.tidal_dict["SO3"] = {
+        tidal_dict["SO3"] = {
             "ospeed": 43.9430356 * deg2rad,
             "VAU": 3 * T - 2 * s + h + 90 * deg2rad + 2 * zeta - nu,
-            "FF": self.tidal_dict["O1"]["FF"],
+            "FF": lambda: tidal_dict["O1"].grid_ff(),
         }
-        self.tidal_dict["phi1"] = {
+        tidal_dict["phi1"] = {
             "ospeed": 15.1232059 * deg2rad,
             "VAU": T + 3 * h - 90 * deg2rad,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["SO1"] = {
+        tidal_dict["SO1"] = {
             "ospeed": 16.0569644 * deg2rad,
             "VAU": T + 2 * s - h - 90 * deg2rad - nu,
-            "FF": self.tidal_dict["J1"]["FF"],
+            "FF": lambda: tidal_dict["J1"].grid_ff(),
         }
         # Seems like A54 in Schureman is equivalent to MKS2 in Foreman
-        self.tidal_dict["MKS2"] = {
+        tidal_dict["MKS2"] = {
             "ospeed": 29.066241528 * deg2rad,
             "VAU": 2 * T - 2 * s + 4 * h - 2 * nu,
-            "FF": self.tidal_dict["eta2"]["FF"],
+            "FF": lambda: tidal_dict["eta2"].grid_ff(),
         }
         # Seems like MP1 in Schureman is equivalent to tau1 in Foreman
-        self.tidal_dict["MP1"] = {
+        tidal_dict["MP1"] = {
             "ospeed": 14.025172896 * deg2rad,
             "VAU": T - 2 * s + 3 * h - 90 * deg2rad - nu,
-            "FF": self.tidal_dict["J1"]["FF"],
+            "FF": lambda: tidal_dict["J1"].grid_ff(),
         }
         # Seems like A19 in Schureman is equivalent to BET1 in Foreman
         # Can't find BET1 in eXtended Doodson numbers
-        #        self.tidal_dict["beta1"] = {
+        #        tidal_dict["beta1"] = {
         #            'ospeed': 14.414556708*deg2rad,
         #            'VAU': T - s - h + p - 90*deg2rad - 2*zeta - nu,
-        #            'FF': self.tidal_dict['O1']['FF']
+        #            'FF': tidal_dict['O1']['FF']
         #        }
-        self.tidal_dict["MK4"] = {
+        tidal_dict["MK4"] = {
             "ospeed": 59.066241516 * deg2rad,
-            "VAU": self.tidal_dict["M2"]["VAU"] + self.tidal_dict["K2"]["VAU"],
-            "FF": self.tidal_dict["M2"]["FF"] * self.tidal_dict["K2"]["FF"],
+            "VAU": tidal_dict["M2"]["VAU"] + tidal_dict["K2"]["VAU"],
+            "FF": lambda: tidal_dict["M2"].grid_ff() * tidal_dict["K2"].grid_ff(),
         }
-        self.tidal_dict["MSN2"] = {
+        tidal_dict["MSN2"] = {
             "ospeed": 30.544374672 * deg2rad,
-            "VAU": self.tidal_dict["M2"]["VAU"] + self.tidal_dict["K2"]["VAU"],
-            "FF": self.tidal_dict["M2"]["FF"] * self.tidal_dict["K2"]["FF"],
+            "VAU": tidal_dict["M2"]["VAU"] + tidal_dict["K2"]["VAU"],
+            "FF": lambda: tidal_dict["M2"].grid_ff() * tidal_dict["K2"].grid_ff(),
         }
-        self.tidal_dict["2N2"] = {
+        tidal_dict["2N2"] = {
             "ospeed": 27.8953548 * deg2rad,
             "VAU": 2 * (T - 2 * s + h + p + zeta - nu),
-            "FF": self.tidal_dict["M2"]["FF"],
+            "FF": lambda: tidal_dict["M2"].grid_ff(),
         }
-        self.tidal_dict["nu2"] = {
+        tidal_dict["nu2"] = {
             "ospeed": 28.5125831 * deg2rad,
             "VAU": 2 * T - 3 * s + 4 * h - p + 2 * zeta - 2 * nu,
-            "FF": self.tidal_dict["M2"]["FF"],
+            "FF": lambda: tidal_dict["M2"].grid_ff(),
         }
         # Seems like A4 in Schureman is equivalent to MSm in Foreman
-        self.tidal_dict["MSm"] = {
+        tidal_dict["MSm"] = {
             "ospeed": 0.4715210880 * deg2rad,
             "VAU": s - 2 * h + p,
-            "FF": self.tidal_dict["Mm"]["FF"],
+            "FF": lambda: tidal_dict["Mm"].grid_ff(),
         }
         # nuJ1 = sigma1
-        self.tidal_dict["nuJ1"] = {
+        tidal_dict["nuJ1"] = {
             "ospeed": 12.9271398 * deg2rad,
             "VAU": T - 4 * s + 3 * h + 90 * deg2rad + 2 * zeta - nu,
-            "FF": self.tidal_dict["O1"]["FF"],
+            "FF": lambda: tidal_dict["O1"].grid_ff(),
         }
-        self.tidal_dict["rho1"] = {
+        tidal_dict["rho1"] = {
             "ospeed": 13.4715145 * deg2rad,
             "VAU": T - 3 * s + 3 * h - p + 90 * deg2rad + 2 * zeta - nu,
-            "FF": self.tidal_dict["O1"]["FF"],
+            "FF": lambda: tidal_dict["O1"].grid_ff(),
         }
-        self.tidal_dict["chi1"] = {
+        tidal_dict["chi1"] = {
             "ospeed": 14.5695476 * deg2rad,
             "VAU": T - s + 3 * h - p - 90 * deg2rad - nu,
-            "FF": self.tidal_dict["J1"]["FF"],
+            "FF": lambda: tidal_dict["J1"].grid_ff(),
         }
-        self.tidal_dict["theta1"] = {
+        tidal_dict["theta1"] = {
             "ospeed": 15.5125897 * deg2rad,
             "VAU": T + s - h + p - 90 * deg2rad - nu,
-            "FF": self.tidal_dict["J1"]["FF"],
+            "FF": lambda: tidal_dict["J1"].grid_ff(),
         }
-        #        self.tidal_dict["OQ2"] =
-        self.tidal_dict["lambda2"] = {
+        #        tidal_dict["OQ2"] =
+        tidal_dict["lambda2"] = {
             "ospeed": 29.4556253 * deg2rad,
             "VAU": 2 * T - s + p + 180 * deg2rad,
-            "FF": self.tidal_dict["M2"]["FF"],
+            "FF": lambda: tidal_dict["M2"].grid_ff(),
         }
-        self.tidal_dict["Sa"] = {
+        tidal_dict["Sa"] = {
             "ospeed": 0.0410686 * deg2rad,
             "VAU": h,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["S1"] = {
+        tidal_dict["S1"] = {
             "ospeed": 15.0000000 * deg2rad,
             "VAU": T,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["T2"] = {
+        tidal_dict["T2"] = {
             "ospeed": 29.9589333 * deg2rad,
             "VAU": 2 * T - h + p1,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["R2"] = {
+        tidal_dict["R2"] = {
             "ospeed": 30.0410667 * deg2rad,
             "VAU": 2 * T + h - p1 + 180 * deg2rad,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
         }
-        self.tidal_dict["pi1"] = {
+        tidal_dict["pi1"] = {
             "ospeed": 14.9178647 * deg2rad,
             "VAU": T - 2 * h + p1 + 90 * deg2rad,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
             #'pi1': [1, 'AAWZZAY', [1, 1, -3, 0, 0, 1, -1]],
         }
-        self.tidal_dict["psi1"] = {
+        tidal_dict["psi1"] = {
             "ospeed": 15.0821352 * deg2rad,
             "VAU": T + 2 * h - p1 - 90 * deg2rad,
-            "FF": np.ones(length),
+            "FF": lambda: np.ones(len(ii)),
             #'psi1': [1, 'AAAZZYA', [1, 1, 1, 0, 0, -1, 1]],
         }
 
@@ -772,7 +1187,7 @@ class Util:
             pbeg,
             p1beg,
         ) = self.astronomic(
-            [self.dates[0], self.dates[0] + datetime.timedelta(hours=1)]
+            as_datetime64(self.dates[:1]) + np.array([0, 1], dtype="timedelta64[h]")
         )
         Tspeed = 15.0 * deg2rad
         sspeed = sbeg[1] - sbeg[0]
@@ -798,41 +1213,68 @@ class Util:
         # The equilibrium arguments can be for the first time only since the
         # VAU argument as it progresses will be at the same speed.
         vw1 = [
-            (15.0 * deg2rad + h[0] - s[0]),
-            s[0],
-            h[0],
-            p[0],
-            Nv[0],
-            p1[0],
+            (15.0 * deg2rad + h - s),
+            s,
+            h,
+            p,
+            Nv,
+            p1,
             90 * deg2rad,
         ]
-        vw1 = np.array(vw1)
-
-        for key in self.tidal_dict:
-            # Calculate speeds
-            constituent_factors = [
-                letter_to_factor_map[i] for i in _master_speed_dict[key]["edn"]
-            ]
-            self.tidal_dict[key]["speed"] = np.sum(np.array(constituent_factors) * w)
-            self.tidal_dict[key]["speed"] = np.mod(self.tidal_dict[key]["speed"], 360)
-            self.tidal_dict[key]["speed"] = self.tidal_dict[key]["speed"] * deg2rad
+        vw1 = np.array(np.broadcast_arrays(*vw1))
 
-            self.tidal_dict[key]["V"] = np.sum(np.array(constituent_factors) * vw1)
-            self.tidal_dict[key]["V"] = self.tidal_dict[key]["V"] * rad2deg
-            self.tidal_dict[key]["V"] = np.mod(self.tidal_dict[key]["V"], 360)
+        keys = list(tidal_dict)
+        index = parameter_database.select(keys)
+        speeds = np.mod(parameter_database.doodson_sum(w, index), 360) * deg2rad
+        vees = np.mod(parameter_database.doodson_sum(vw1, index) * rad2deg, 360)
+        for key, speed, vee in zip(keys, speeds, vees):
+            tidal_dict[key] = _Constituent(tidal_dict[key], expand=expand)
+            tidal_dict[key]["speed"] = speed
+            tidal_dict[key]["V"] = vee
 
             # Change VAU to degree and between 0 and 360
-            self.tidal_dict[key]["VAU"] = self.tidal_dict[key]["VAU"] * rad2deg
-            try:
-                self.tidal_dict[key]["VAU"] = np.mod(self.tidal_dict[key]["VAU"], 360)[
-                    0
-                ]
-            except IndexError:
-                self.tidal_dict[key]["VAU"] = np.mod(self.tidal_dict[key]["VAU"], 360)
+            tidal_dict[key]["VAU"] = np.mod(tidal_dict[key]["VAU"] * rad2deg, 360)
 
-        num_hours = (jd[-1] - jd[0]) * 24
-        len(jd) * 0.5 * rayleigh_comp
-        if num_hours < 13:
+        return tidal_dict
+
+    def vau_table(self, dates, keys):
+        """Return V + u, in degrees, of the constituents `keys` at each of
+        the `dates` as a (date, key) array.
+
+        The astronomic arguments of all of the dates are evaluated at once,
+        instead of a tidal_dict for each date.
+        """
+        dates = as_datetime64(dates)
+        package = self.astronomic(dates)
+        tidal_dict = self.tidal_constituents(len(dates), package, every_date=True)
+        return np.stack(
+            [np.broadcast_to(tidal_dict[key]["VAU"], len(dates)) for key in keys],
+            axis=1,
+        )
+
+    def which_constituents(self, length, package, rayleigh_comp=1.0):
+        """
+        Establishes which constituents are able to be determined according to
+        the length of the water elevation vector.
+
+        The tidal_dict is only rebuilt when the time base changes.
+        """
+
+        jd = package[9]
+        time_base = (length, np.size(package[5]), jd[0], jd[-1])
+        if getattr(self, "_time_base", None) != time_base:
+            self.tidal_dict = self.tidal_constituents(length, package)
+            self._time_base = time_base
+
+        return self.select_constituents((jd[-1] - jd[0]) * 24, rayleigh_comp)
+
+    def select_constituents(self, num_hours, rayleigh_comp=1.0):
+        """
+        Returns (speed_dict, key_list) of the constituents of self.tidal_dict
+        that can be separated by a record `num_hours` long.
+        """
+
+        if num_hours < min_hours:
             print("Cannot calculate any constituents from this record length")
             sys.exit()
         speed_dict = {"M2": self.tidal_dict["M2"]}
@@ -989,70 +1431,198 @@ class Tappy(Util):
         self.filter = kwds.pop("filter")
         self.pad_filters = kwds.pop("pad_filters")
         self.include_inferred = kwds.pop("include_inferred")
+        self.node_interval = kwds.pop("node_interval", None)
+        self.parse_workers = kwds.pop("parse_workers", None)
+        self.cache_dir = kwds.pop("cache_dir", None)
+        self.cache_size = kwds.pop("cache_size", 1024.0)
+        self.cache_mtime = kwds.pop("cache_mtime", False)
 
         # ---instance variables---
         self.speed_dict = {}
         self.elevation = []
         self.dates = []
+        self.gaps = None
 
     def open(self, filename, def_filename=None):
         """Open the water level data file"""
-        # Test to make sure there isn't a definition file in the same directory
-        # as the data file.
         filename = Path(filename)
+        if def_filename is None and filename.suffix.lower() in binary_suffixes:
+            self.dates, self.elevation = read_binary(filename)
+            return
         if def_filename is None:
-            test_filename = filename.with_name(f"{filename.stem}_def{filename.suffix}")
-            if test_filename.exists():
-                def_filename = test_filename
+            def_filename = _companion_def(filename)
+        key = None
+        if self.cache_dir:
+            key = series_cache.cache_key(
+                filename, def_filename=def_filename, mtime=self.cache_mtime
+            )
+        if key is not None:
+            cached = series_cache.load(self.cache_dir, key)
+            if cached is not None:
+                self.dates, self.elevation = cached
+                return
         # Read and parse data filename
         if def_filename is None:
             df = tsutils.common_kwds(filename)
             self.elevation = df.iloc[:, 0].astype("float64").values
-            self.dates = df.index.to_pydatetime()
+            self.dates = as_datetime64(df.index)
         else:
-            fp = sparser.ParseFileLineByLine(
-                filename, def_filename=def_filename, mode="r"
-            )
-            for line in fp:
-                if "water_level" not in list(line.parsed_dict.keys()):
-                    print(
-                        f"Warning: record {line.line_number} did not parse according to the supplied definition file"
-                    )
-                    continue
-                if "datetime" in list(line.parsed_dict.keys()):
-                    self.dates.append(line.parsed_dict["datetime"])
-                elif (
-                    "year" in list(line.parsed_dict.keys())
-                    and "month" in list(line.parsed_dict.keys())
-                    and "day" in list(line.parsed_dict.keys())
-                    and "hour" in list(line.parsed_dict.keys())
-                ):
-                    line.parsed_dict.setdefault("minute", 0)
-                    line.parsed_dict.setdefault("second", 0)
-                    self.dates.append(
-                        datetime.datetime(
-                            line.parsed_dict["year"],
-                            line.parsed_dict["month"],
-                            line.parsed_dict["day"],
-                            line.parsed_dict["hour"],
-                            line.parsed_dict["minute"],
-                            line.parsed_dict["second"],
-                        )
-                    )
-                else:
-                    print(
-                        f"Warning: record {line.line_number} did not parse the date and time according to the supplied definition file"
-                    )
-                    print(
-                        'Requires "year", "month", "day", and "hour" ("minute" and "second" are optional and default to zero) OR a Julian date/time'
-                    )
-                    continue
-                self.elevation.append(line.parsed_dict["water_level"])
+            try:
+                definition = sparser.compile_definition(def_filename)
+            except sparser.DefinitionNotCompilableError:
+                definition = None
+            if definition is not None:
+                self.dates, self.elevation = self.read_definition(
+                    filename, definition
+                )
+            else:
+                self.read_line_by_line(filename, def_filename)
             if len(self.elevation) == 0:
                 print("No data was found in the input file.")
                 sys.exit()
             self.elevation = np.array(self.elevation)
-            self.dates = np.array(self.dates)
+            self.dates = as_datetime64(self.dates)
+        if key is not None:
+            series_cache.store(
+                self.cache_dir,
+                key,
+                self.dates,
+                self.elevation,
+                float(self.cache_size) * 2**20,
+            )
+
+    def load(self, dates, elevation):
+        """Use the `dates` and `elevation` arrays as the observations.
+
+        The arrays are used without a copy if `dates` are datetime64[ns]
+        and `elevation` is float64.
+        """
+        self.dates = as_datetime64(dates)
+        if self.dates is None:
+            raise ValueError("The dates must be datetime64 or datetime.datetime")
+        self.elevation = np.asarray(elevation, dtype="float64")
+        if self.elevation.shape != self.dates.shape:
+            raise ValueError("The dates and elevation must have the same length")
+
+    def read_chunks(self, filename, def_filename=None):
+        """Yield the (dates, elevation) of the water level data file in
+        chunks, for `constituents_streaming`.
+
+        Binary ".npy" files are memory mapped, see read_binary_chunks, and
+        text files with a definition file that can be compiled are read and
+        parsed one block of text at a time, see
+        sparser.CompiledDefinition.read_blocks, so neither is ever all in
+        memory.  Any other file is read whole with `open`.
+        """
+        filename = Path(filename)
+        if def_filename is None and filename.suffix.lower() in binary_suffixes:
+            yield from read_binary_chunks(filename, chunk_size)
+            return
+        if def_filename is None:
+            def_filename = _companion_def(filename)
+        definition = None
+        if def_filename is not None:
+            try:
+                definition = sparser.compile_definition(def_filename)
+            except sparser.DefinitionNotCompilableError:
+                pass
+        if definition is None:
+            self.open(filename, def_filename=def_filename)
+            yield self.dates, self.elevation
+            return
+        for block in definition.read_blocks(filename):
+            dates, elevation = self.definition_series(*block)
+            if len(elevation):
+                yield as_datetime64(dates), elevation
+
+    def read_definition(self, filename, definition):
+        """Read `filename` in bulk with a sparser.CompiledDefinition.
+
+        Returns
+        -------
+        tuple
+            (dates, elevation) arrays of the lines that have a water level
+            and a date.
+        """
+        return self.definition_series(
+            *definition.read(filename, workers=self.parse_workers)
+        )
+
+    def definition_series(self, columns, line_numbers, unparsed):
+        """Return the (dates, elevation) arrays of the result of
+        sparser.CompiledDefinition.parse_text, printing a warning for each
+        line that did not parse.
+        """
+        if "water_level" not in columns:
+            unparsed = np.union1d(unparsed, line_numbers)
+        for number in unparsed:
+            print(
+                f"Warning: record {number} did not parse according to the supplied definition file"
+            )
+        if "water_level" not in columns:
+            return [], []
+        if "datetime" in columns:
+            dates = columns["datetime"]
+        elif all(i in columns for i in ("year", "month", "day", "hour")):
+            dates = sparser.to_datetime64(
+                columns["year"],
+                columns["month"],
+                columns["day"],
+                columns["hour"],
+                columns.get("minute", 0),
+                columns.get("second", 0),
+            )
+        else:
+            for number in line_numbers:
+                print(
+                    f"Warning: record {number} did not parse the date and time according to the supplied definition file"
+                )
+                print(
+                    'Requires "year", "month", "day", and "hour" ("minute" and "second" are optional and default to zero) OR a Julian date/time'
+                )
+            return [], []
+        return dates, columns["water_level"].astype("float64")
+
+    def read_line_by_line(self, filename, def_filename):
+        """Read `filename` one line at a time with the pyparsing grammar of
+        the definition file, for definition files that cannot be compiled.
+        """
+        fp = sparser.ParseFileLineByLine(filename, def_filename=def_filename, mode="r")
+        for line in fp:
+            if "water_level" not in list(line.parsed_dict.keys()):
+                print(
+                    f"Warning: record {line.line_number} did not parse according to the supplied definition file"
+                )
+                continue
+            if "datetime" in list(line.parsed_dict.keys()):
+                self.dates.append(line.parsed_dict["datetime"])
+            elif (
+                "year" in list(line.parsed_dict.keys())
+                and "month" in list(line.parsed_dict.keys())
+                and "day" in list(line.parsed_dict.keys())
+                and "hour" in list(line.parsed_dict.keys())
+            ):
+                line.parsed_dict.setdefault("minute", 0)
+                line.parsed_dict.setdefault("second", 0)
+                self.dates.append(
+                    datetime.datetime(
+                        line.parsed_dict["year"],
+                        line.parsed_dict["month"],
+                        line.parsed_dict["day"],
+                        line.parsed_dict["hour"],
+                        line.parsed_dict["minute"],
+                        line.parsed_dict["second"],
+                    )
+                )
+            else:
+                print(
+                    f"Warning: record {line.line_number} did not parse the date and time according to the supplied definition file"
+                )
+                print(
+                    'Requires "year", "month", "day", and "hour" ("minute" and "second" are optional and default to zero) OR a Julian date/time'
+                )
+                continue
+            self.elevation.append(line.parsed_dict["water_level"])
 
     def missing(self, task, dates, elev):
         """
@@ -1068,33 +1638,21 @@ class Tappy(Util):
         if task == "ignore":
             return (dates, elev)
 
-        interval = dates[1:] - dates[:-1]
+        dates = as_datetime64(dates)
+        interval = np.diff(dates)
 
-        if np.any(interval > datetime.timedelta(seconds=3600)) and task == "fail":
+        if np.any(interval > np.timedelta64(1, "h")) and task == "fail":
             print("There is a difference of greater than one hour between values")
             sys.exit()
 
-        if task == "fill":
-            # Create real dates
-            dates[0]
-            # Dominant interval
-            interval = sorted(interval)
-            interval = interval[len(interval) // 2]
-
-            dt = dates[0]
-            dates_filled = []
-            while dt <= (dates[-1] + datetime.timedelta(minutes=1)):
-                dates_filled.append(dt)
-                dt = dt + interval
-
-            dates_filled = np.array(dates_filled)
-
-            where_good = np.zeros(len(dates_filled), dtype="bool")
+        if task == "fail":
+            return (dates, elev)
 
-            for dt in dates:
-                where_good[dates_filled == dt] = True
+        if task == "fill":
+            dates_filled, position, starts, lengths = gap_index(dates)
+            self.gaps = (dates_filled[starts], lengths)
 
-            if np.all(where_good):
+            if len(starts) == 0:
                 return (dates, elev)
 
             # Had to make this 'f8' in order to match 'total' and
@@ -1103,7 +1661,7 @@ class Tappy(Util):
             residuals = np.ones(len(dates_filled), dtype="f8") * -99999.0
 
             # This is to get FF to be all of the filled dates
-            package = self.astronomic(dates_filled)
+            package = self.astronomic(dates_filled, node_interval=self.node_interval)
             (self.speed_dict, self.key_list) = self.which_constituents(
                 len(dates_filled), package
             )
@@ -1128,12 +1686,10 @@ class Tappy(Util):
             # self.constituents()
             total = self.sum_signals(self.key_list, dates_filled, self.speed_dict)
 
-            residuals[where_good] = elev - total[where_good]
+            good = position >= 0
+            residuals[position[good]] = elev[good] - total[position[good]]
 
-            # Might be able to use np.piecewise, but have to rethink
-            # np.piecewise gives the piece of the array to the function
-            #  but I want to use the border values of the array zone
-            zone_calculations(interpolate, residuals, residuals == -99999)
+            interpolate_gaps(residuals, starts, lengths)
             return (dates_filled, residuals + total)
 
     def remove_extreme_values(self):
@@ -1174,107 +1730,10 @@ class Tappy(Util):
         self.inferred_r = {}
         self.inferred_phase = {}
         if self.include_inferred:
-            if "O1" in key_list and "K1" in key_list:
-                if "J1" not in key_list:
-                    self.inferred_key_list.append("J1")
-                    self.inferred_r["J1"] = H["J1"] = 0.079 * H["O1"]
-                    self.inferred_phase["J1"] = phase["J1"] = phase["K1"] + 0.496 * (
-                        phase["K1"] - phase["O1"]
-                    )
-                # How should I handle this?  Shureman seems to confuse M1 and NO1
-                if "M1" not in key_list:
-                    self.inferred_key_list.append("M1")
-                    self.inferred_r["M1"] = H["M1"] = 0.071 * H["O1"]
-                    self.inferred_phase["M1"] = phase["M1"] = phase["K1"] - 0.5 * (
-                        phase["K1"] - phase["O1"]
-                    )
-                if "OO1" not in key_list:
-                    self.inferred_key_list.append("OO1")
-                    self.inferred_r["OO1"] = H["OO1"] = 0.043 * H["O1"]
-                    self.inferred_phase["OO1"] = phase["OO1"] = phase["K1"] + 1.0 * (
-                        phase["K1"] - phase["O1"]
-                    )
-                if "P1" not in key_list:
-                    self.speed_dict["P1"] = self.tidal_dict["P1"]
-                    self.inferred_key_list.append("P1")
-                    self.inferred_r["P1"] = H["P1"] = 0.331 * H["K1"]
-                    self.inferred_phase["P1"] = phase["P1"] = phase["K1"] - 0.075 * (
-                        phase["K1"] - phase["O1"]
-                    )
-                if "Q1" not in key_list:
-                    self.inferred_key_list.append("Q1")
-                    self.inferred_r["Q1"] = H["Q1"] = 0.194 * H["O1"]
-                    self.inferred_phase["Q1"] = phase["Q1"] = phase["K1"] - 1.496 * (
-                        phase["K1"] - phase["O1"]
-                    )
-                if "2Q1" not in key_list:
-                    self.inferred_key_list.append("2Q1")
-                    self.inferred_r["2Q1"] = H["2Q1"] = 0.026 * H["O1"]
-                    self.inferred_phase["2Q1"] = phase["2Q1"] = phase["K1"] - 1.992 * (
-                        phase["K1"] - phase["O1"]
-                    )
-                if "rho1" not in key_list:
-                    self.inferred_key_list.append("rho1")
-                    self.inferred_r["rho1"] = H["rho1"] = 0.038 * H["O1"]
-                    self.inferred_phase["rho1"] = phase["rho1"] = phase[
-                        "K1"
-                    ] - 1.429 * (phase["K1"] - phase["O1"])
-            if "S2" in key_list and "M2" in key_list:
-                if "K2" not in key_list:
-                    self.inferred_key_list.append("K2")
-                    self.inferred_r["K2"] = H["K2"] = 0.272 * H["S2"]
-                    self.inferred_phase["K2"] = phase["K2"] = phase["S2"] + 0.081 * (
-                        phase["S2"] - phase["M2"]
-                    )
-                if "L2" not in key_list:
-                    self.inferred_key_list.append("L2")
-                    self.inferred_r["L2"] = H["L2"] = 0.028 * H["M2"]
-                    self.inferred_phase["L2"] = phase["L2"] = phase["S2"] - 0.464 * (
-                        phase["S2"] - phase["M2"]
-                    )
-                if "N2" not in key_list:
-                    self.inferred_key_list.append("N2")
-                    self.inferred_r["N2"] = H["N2"] = 0.194 * H["M2"]
-                    self.inferred_phase["N2"] = phase["N2"] = phase["S2"] - 1.536 * (
-                        phase["S2"] - phase["M2"]
-                    )
-                if "2N2" not in key_list:
-                    self.inferred_key_list.append("2N2")
-                    self.inferred_r["2N2"] = H["2N2"] = 0.026 * H["M2"]
-                    self.inferred_phase["2N2"] = phase["2N2"] = phase["S2"] - 2.072 * (
-                        phase["S2"] - phase["M2"]
-                    )
-                if "R2" not in key_list:
-                    self.inferred_key_list.append("R2")
-                    self.inferred_r["R2"] = H["R2"] = 0.008 * H["S2"]
-                    self.inferred_phase["R2"] = phase["R2"] = phase["S2"] + 0.040 * (
-                        phase["S2"] - phase["M2"]
-                    )
-                if "T2" not in key_list:
-                    self.inferred_key_list.append("T2")
-                    self.inferred_r["T2"] = H["T2"] = 0.059 * H["S2"]
-                    self.inferred_phase["T2"] = phase["T2"] = phase["S2"] - 0.040 * (
-                        phase["S2"] - phase["M2"]
-                    )
-                if "lambda2" not in key_list:
-                    self.inferred_key_list.append("lambda2")
-                    self.inferred_r["lambda2"] = H["lambda2"] = 0.007 * H["M2"]
-                    self.inferred_phase["lambda2"] = phase["lambda2"] = phase[
-                        "S2"
-                    ] - 0.536 * (phase["S2"] - phase["M2"])
-                if "mu2" not in key_list:
-                    self.inferred_key_list.append("mu2")
-                    self.inferred_r["mu2"] = H["mu2"] = 0.024 * H["M2"]
-                    self.inferred_phase["mu2"] = phase["mu2"] = phase["S2"] - 2.0 * (
-                        phase["S2"] - phase["M2"]
-                    )
-                if "nu2" not in key_list:
-                    self.inferred_key_list.append("nu2")
-                    self.inferred_r["nu2"] = H["nu2"] = 0.038 * H["M2"]
-                    self.inferred_phase["nu2"] = phase["nu2"] = phase["S2"] - 1.464 * (
-                        phase["S2"] - phase["M2"]
-                    )
+            self.inferred_key_list = self.infer(H, phase, key_list)
             for key in self.inferred_key_list:
+                self.inferred_r[key] = H[key]
+                self.inferred_phase[key] = phase[key]
                 if self.inferred_r[key] < 0:
                     self.inferred_r[key] = abs(self.inferred_r[key])
                     self.inferred_phase[key] = self.inferred_phase[key] + 180.0
@@ -1300,59 +1759,605 @@ class Tappy(Util):
 
         return self.err
 
+    def inferred_keys(self, key_list):
+        """Return the constituents that will be inferred for `key_list`."""
+        inferred = []
+        for (ref, other), relations in _inferred_table.items():
+            if ref not in key_list or other not in key_list:
+                continue
+            inferred.extend(
+                key for key, _, _, _ in relations if key not in key_list
+            )
+        return inferred
+
+    def inferred_relations(self, key_list):
+        """Return the relations used by `infer` as arrays.
+
+        Returns (ref, other, amp_ref, ratio, factor), one item for each of
+        `inferred_keys`, where ref, other, and amp_ref are indices into
+        `key_list`.
+        """
+        table = [
+            (ref, other, amp_ref, ratio, factor)
+            for (ref, other), relations in _inferred_table.items()
+            if ref in key_list and other in key_list
+            for key, amp_ref, ratio, factor in relations
+            if key not in key_list
+        ]
+        indices = (
+            np.array([key_list.index(row[i]) for row in table], dtype=int)
+            for i in range(3)
+        )
+        return (*indices, *(np.array([row[i] for row in table]) for i in (3, 4)))
+
+    def infer(self, H, phase, key_list):
+        """Add the inferred constituents to the amplitude and phase dicts.
+
+        Returns the list of inferred constituents.
+        """
+        inferred = []
+        for (ref, other), relations in _inferred_table.items():
+            if ref not in key_list or other not in key_list:
+                continue
+            for key, amp_ref, ratio, factor in relations:
+                if key in key_list:
+                    continue
+                if key == "P1":
+                    self.speed_dict["P1"] = self.tidal_dict["P1"]
+                inferred.append(key)
+                H[key] = ratio * H[amp_ref]
+                phase[key] = phase[ref] + factor * (phase[ref] - phase[other])
+        return inferred
+
     def constituents(self):
-        """Determine the tidal constituents from the data."""
-        difference = self.dates[1:] - self.dates[:-1]
-        if np.any(difference < datetime.timedelta(seconds=0)):
+        """Determine the tidal constituents from the data.
+
+        The in-phase and quadrature coefficients of each constituent, with
+        the node factors folded into the design matrix, are found with one
+        linear least squares solve.  Inferred constituents are nonlinear
+        functions of the fitted ones, so when they are included the solution
+        is refined against the factored normal equations, which only costs
+        work proportional to the number of constituents.
+        """
+        difference = np.diff(self.dates)
+        if np.any(difference < np.timedelta64(0)):
             print("Let's do the time warp again!")
             print("The date values reverse - they must be constantly increasing.")
             sys.exit()
 
-        p0 = [1.0] * (len(self.speed_dict) * 2 + 2)
-        p0[-2] = 0.0
-        p0[-1] = np.average(self.elevation)
         self.ntimes = (self.jd - self.jd[0]) * 24
 
-        lsfit = leastsq(
-            self.residuals,
-            p0,
-            args=(
-                np.array(self.elevation),
-                np.array(self.ntimes),
-                np.array(self.key_list),
-            ),
+        key_list = list(self.key_list)
+        inferred = self.inferred_keys(key_list) if self.include_inferred else []
+        all_keys = key_list + inferred
+
+        ata, aty = harmonic.normal_equations(
+            self.ntimes,
+            self.elevation,
+            [self.tidal_dict[key]["speed"] for key in all_keys],
+            ff=[self.tidal_dict[key]["FF"] for key in all_keys],
+            linear_trend=self.linear_trend,
         )
+        H, phase, average, slope = self.solve_constituents(
+            ata, aty, key_list, inferred, average=np.average(self.elevation)
+        )
+        self.set_constituents(H, phase, inferred, average, slope)
 
+    def set_constituents(self, H, phase, inferred, average, slope):
+        """Keep the solution of `solve_constituents` as the amplitudes and
+        phases, in degrees, of the fitted and the inferred constituents.
+        """
+        all_keys = list(self.key_list) + list(inferred)
         self.r = {}
         self.phase = {}
-        for index, key in enumerate(self.key_list):
-            self.r[key] = lsfit[0][index]
-            self.phase[key] = lsfit[0][index + len(self.key_list)] * rad2deg
+        self.inferred_key_list = inferred
+        self.inferred_r = {}
+        self.inferred_phase = {}
+        for key in all_keys:
+            r, phase_deg = self.amplitude_phase(key, H[key], phase[key])
+            if key in inferred:
+                self.inferred_r[key] = r
+                self.inferred_phase[key] = phase_deg
+            else:
+                self.r[key] = r
+                self.phase[key] = phase_deg
 
-            if self.r[key] < 0:
-                self.r[key] = abs(self.r[key])
-                self.phase[key] = self.phase[key] + 180
-            try:
-                self.phase[key] = np.mod(
-                    self.phase[key] + self.speed_dict[key]["VAU"], 360
-                )[0]
-            except IndexError:
-                self.phase[key] = np.mod(
-                    self.phase[key] + self.speed_dict[key]["VAU"], 360
+        self.fitted_average = average
+        self.slope = slope
+        # Should probably return something rather than change self.*
+
+    def solve_constituents(
+        self, ata, aty, key_list, inferred, factor=None, average=None, start=None
+    ):
+        """Solve the normal equations of the constituents.
+
+        The columns of `ata` and `aty` are those of `harmonic.design_block`
+        for the constituents `key_list` + `inferred`.  Without inferred
+        constituents the solution is linear.  Otherwise the amplitudes and
+        phases of `key_list` are refined against the factored normal
+        equations, `factor` if given, see `harmonic.root_factor`, starting
+        from `average`, by default the average found from the constant
+        column, and the (H, phase) dicts `start` of a nearby solution if
+        given.
+
+        Returns
+        -------
+        tuple
+            (H, phase, average, slope) where H and phase are dicts of the
+            amplitude and the phase, in radians, of every constituent.
+        """
+        all_keys = list(key_list) + list(inferred)
+        nkeys = len(key_list)
+        if not inferred:
+            coef = harmonic.solve(ata, aty)
+            H, phase = harmonic.amplitude_phase(coef, nkeys)
+            H = dict(zip(key_list, H))
+            phase = dict(zip(key_list, phase))
+            average = coef[2 * nkeys]
+            slope = coef[2 * nkeys + 1] if self.linear_trend else 0.0
+            return H, phase, average, slope
+
+        # Same parameters as the amplitude/phase fit in 'residuals', but
+        # the misfit is evaluated against the factored normal equations.
+        root, rhs = factor if factor is not None else harmonic.root_factor(ata, aty)
+
+        ref, other, amp_ref, ratio, factor = self.inferred_relations(key_list)
+
+        def expand(p):
+            amp = p[:nkeys]
+            pha = p[nkeys : 2 * nkeys]
+            amp = np.concatenate((amp, ratio * amp[amp_ref]))
+            pha = np.concatenate((pha, pha[ref] + factor * (pha[ref] - pha[other])))
+            full = np.concatenate((amp * np.cos(pha), amp * np.sin(pha), [p[-1]]))
+            if self.linear_trend:
+                full = np.append(full, p[-2])
+            return full
+
+        def jacobian(p):
+            amp = p[:nkeys]
+            pha = p[nkeys : 2 * nkeys]
+            ncoef = len(all_keys)
+            cos = np.cos(pha)
+            sin = np.sin(pha)
+            jac = np.zeros((2 * ncoef + 1 + int(bool(self.linear_trend)), len(p)))
+            fitted = np.arange(nkeys)
+            jac[fitted, fitted] = cos
+            jac[fitted, nkeys + fitted] = -amp * sin
+            jac[ncoef + fitted, fitted] = sin
+            jac[ncoef + fitted, nkeys + fitted] = amp * cos
+            iamp = ratio * amp[amp_ref]
+            ipha = pha[ref] + factor * (pha[ref] - pha[other])
+            icos = np.cos(ipha)
+            isin = np.sin(ipha)
+            rows = nkeys + np.arange(len(ref))
+            np.add.at(jac, (rows, amp_ref), ratio * icos)
+            np.add.at(jac, (rows, nkeys + ref), -iamp * isin * (1 + factor))
+            np.add.at(jac, (rows, nkeys + other), iamp * isin * factor)
+            np.add.at(jac, (ncoef + rows, amp_ref), ratio * isin)
+            np.add.at(jac, (ncoef + rows, nkeys + ref), iamp * icos * (1 + factor))
+            np.add.at(jac, (ncoef + rows, nkeys + other), -iamp * icos * factor)
+            jac[2 * ncoef, -1] = 1.0
+            if self.linear_trend:
+                jac[2 * ncoef + 1, -2] = 1.0
+            return root @ jac
+
+        if average is None:
+            # The constant column is all ones.
+            const = 2 * len(all_keys)
+            average = aty[const] / ata[const, const]
+        p0 = [1.0] * (nkeys * 2 + 2)
+        p0[-2] = 0.0
+        p0[-1] = average
+        if start is not None:
+            p0[:nkeys] = [start[0][key] for key in key_list]
+            p0[nkeys : 2 * nkeys] = [start[1][key] for key in key_list]
+        lsfit = leastsq(lambda p: root @ expand(p) - rhs, p0, Dfun=jacobian)
+        H = dict(zip(key_list, lsfit[0][:nkeys]))
+        phase = dict(zip(key_list, lsfit[0][nkeys : 2 * nkeys]))
+        self.infer(H, phase, key_list)
+        average = lsfit[0][-1]
+        slope = lsfit[0][-2] if self.linear_trend else 0.0
+        return H, phase, average, slope
+
+    def amplitude_phase(self, key, H, phase, vau=None):
+        """Return the amplitude and the phase in degrees, referenced to V + u
+        of the first date, or `vau` in degrees if given, of a fitted
+        amplitude `H` and phase in radians.  `H`, `phase`, and `vau` can be
+        arrays.
+        """
+        if vau is None:
+            vau = self.tidal_dict[key]["VAU"]
+        phase = phase * rad2deg + np.where(H < 0, 180.0, 0.0)
+        return np.abs(H), np.mod(phase + vau, 360)
+
+    def constituents_many(self, elevation):
+        """Determine the tidal constituents of several series on the dates.
+
+        `elevation` is a 2-D (time, series) array, which can be memory
+        mapped.  The design matrix is built and the normal equations are
+        factored once, and every series is solved as another right hand
+        side.  The series must not have missing values.
+
+        Returns
+        -------
+        tuple
+            (keys, amplitude, phase, average, slope) where keys are the
+            constituents, fitted then inferred, in the column order of the
+            (series, constituent) amplitude and phase (degrees) arrays, and
+            average and slope have a value for each series.
+        """
+        self.ntimes = (self.jd - self.jd[0]) * 24
+
+        key_list = list(self.key_list)
+        inferred = self.inferred_keys(key_list) if self.include_inferred else []
+        all_keys = key_list + inferred
+        nkeys = len(all_keys)
+
+        ata, aty = harmonic.normal_equations(
+            self.ntimes,
+            elevation,
+            [self.tidal_dict[key]["speed"] for key in all_keys],
+            ff=[self.tidal_dict[key]["FF"] for key in all_keys],
+            linear_trend=self.linear_trend,
+        )
+        nseries = aty.shape[1]
+        if not inferred:
+            coef = harmonic.solve(ata, aty)
+            H, phase = harmonic.amplitude_phase(coef, nkeys)
+            average = coef[2 * nkeys]
+            slope = coef[2 * nkeys + 1] if self.linear_trend else np.zeros(nseries)
+        else:
+            root, rhs = harmonic.root_factor(ata, aty)
+            H = np.empty((nkeys, nseries))
+            phase = np.empty((nkeys, nseries))
+            average = np.empty(nseries)
+            slope = np.empty(nseries)
+            for series in range(nseries):
+                h, p, average[series], slope[series] = self.solve_constituents(
+                    ata,
+                    aty[:, series],
+                    key_list,
+                    inferred,
+                    factor=(root, rhs[:, series]),
                 )
+                H[:, series] = [h[key] for key in all_keys]
+                phase[:, series] = [p[key] for key in all_keys]
+        self.inferred_key_list = inferred
+        for index, key in enumerate(all_keys):
+            H[index], phase[index] = self.amplitude_phase(key, H[index], phase[index])
+        return all_keys, H.T, phase.T, average, slope
+
+    def start_normal_equations(self, date):
+        """Start accumulating the normal equations of observations from the
+        datetime64 `date` on, see add_observations.
+
+        `date` is the epoch of the analysis.  Every constituent of the
+        tidal_dict is a column of the normal equations, the constituents
+        that are solved for are chosen by solve_normal_equations from the
+        span of the observations.  The columns can be limited by setting
+        candidate_keys and calling reset_normal_equations.
+        """
+        self.dates = as_datetime64(np.atleast_1d(date))[:1]
+        self.tidal_dict = self.tidal_constituents(1, self.astronomic(self.dates))
+        self._time_base = None
+        self.candidate_keys = sorted(self.tidal_dict)
+        self.jd0 = self.dates2jd(self.dates)[0]
+        self.reset_normal_equations()
+
+    def reset_normal_equations(self):
+        """Remove all observations from the normal equations, keeping the
+        epoch.
+        """
+        ncols = 2 * len(self.candidate_keys) + 1 + int(bool(self.linear_trend))
+        self.ata = np.zeros((ncols, ncols))
+        self.aty = np.zeros(ncols)
+        self.nobs = 0
+        self.weight = 0.0
+        self.total = 0.0
+        self.last_date = self.dates[0]
+
+    def add_observations(self, dates, elevation, forgetting=None):
+        """Add observations after the last ones to the normal equations.
+
+        The node factors and the design matrix are made for `chunk_size`
+        observations at a time, reduced into the normal equations, and
+        discarded, so memory does not grow with the number of
+        observations.  Values that are not finite are skipped.
+
+        With a `forgetting` factor between 0 and 1 the weight of every
+        observation in the fit is multiplied by `forgetting` for each hour
+        it is older than the last observation, so the fit follows slow
+        changes of the tide.
+        """
+        dates, elevation = _finite(dates, elevation)
+        if len(dates) == 0:
+            return
+        if dates[0] < self.last_date or np.any(np.diff(dates) < np.timedelta64(0)):
+            print("Let's do the time warp again!")
+            print("The date values reverse - they must be constantly increasing.")
+            sys.exit()
 
-        self.fitted_average = p0[-1]
-        self.slope = p0[-2]
-        # Should probably return something rather than change self.*
+        weights = None
+        if forgetting:
+            decay = np.log(float(forgetting)) * 24
+            jd_last = self.dates2jd(np.array([self.last_date, dates[-1]]))
+            scale = np.exp(decay * (jd_last[1] - jd_last[0]))
+            self.ata *= scale
+            self.aty *= scale
+            self.weight *= scale
+            self.total *= scale
+            weights = np.exp(decay * (jd_last[1] - self.dates2jd(dates)))
+
+        self._accumulate(dates, elevation, weights)
+        self.nobs += len(elevation)
+        if weights is None:
+            self.weight += len(elevation)
+            self.total += elevation.sum()
+        else:
+            self.weight += weights.sum()
+            self.total += weights @ elevation
+        self.last_date = dates[-1]
+
+    def _accumulate(self, dates, elevation, weights=None):
+        """Add the normal equations of the observations, with the `weights`
+        if given, for the candidate_keys.
+        """
+        speeds = [self.tidal_dict[key]["speed"] for key in self.candidate_keys]
+        for start in range(0, len(dates), chunk_size):
+            sl = slice(start, start + chunk_size)
+            package = self.astronomic(dates[sl], node_interval=self.node_interval)
+            chunk_dict = self.tidal_constituents(len(elevation[sl]), package)
+            ff = [chunk_dict[key]["FF"] for key in self.candidate_keys]
+            # The node factor functions refer to the dict, so clear it to
+            # free the node factors now rather than at a garbage collection.
+            chunk_dict.clear()
+            ata, aty = harmonic.normal_equations(
+                (package[9] - self.jd0) * 24,
+                elevation[sl],
+                speeds,
+                ff=ff,
+                linear_trend=self.linear_trend,
+                weights=None if weights is None else weights[sl],
+            )
+            self.ata += ata
+            self.aty += aty
+
+    def solve_normal_equations(self, rayleigh_comp=1.0, max_hours=None):
+        """Determine the tidal constituents, see constituents, from the
+        normal equations accumulated by add_observations.
+
+        The constituents are chosen for the span of the observations, or
+        `max_hours` if that is shorter.
+        """
+        if self.nobs == 0:
+            print("No data was found in the input file.")
+            sys.exit()
+        self.dates = np.array([self.dates[0], self.last_date])
+        jd = self.dates2jd(self.dates)
+        num_hours = (jd[-1] - jd[0]) * 24
+        if max_hours:
+            num_hours = min(num_hours, max_hours)
+        (self.speed_dict, self.key_list) = self.select_constituents(
+            num_hours, rayleigh_comp
+        )
+
+        key_list = list(self.key_list)
+        inferred = self.inferred_keys(key_list) if self.include_inferred else []
+        index = [self.candidate_keys.index(key) for key in key_list + inferred]
+        ncandidates = len(self.candidate_keys)
+        columns = (
+            index
+            + [ncandidates + i for i in index]
+            + list(range(2 * ncandidates, len(self.aty)))
+        )
+        H, phase, average, slope = self.solve_constituents(
+            self.ata[np.ix_(columns, columns)],
+            self.aty[columns],
+            key_list,
+            inferred,
+            average=self.total / self.weight,
+        )
+        self.set_constituents(H, phase, inferred, average, slope)
+
+    def constituents_streaming(self, chunks, rayleigh_comp=1.0):
+        """Determine the tidal constituents from the (dates, elevation)
+        `chunks`, for example from read_chunks, in increasing order of
+        time.
+
+        Only the normal equations of the candidate constituents are kept
+        between chunks, so memory does not depend on the length of the
+        record.  The record is only seen once, so missing values cannot be
+        filled and extreme values are not removed, and the constituents are
+        chosen after all of the chunks from the span of the record.
+        """
+        started = False
+        for dates, elevation in chunks:
+            if len(dates) == 0:
+                continue
+            if not started:
+                self.start_normal_equations(dates[0])
+                started = True
+            self.add_observations(dates, elevation)
+        if not started:
+            print("No data was found in the input file.")
+            sys.exit()
+        self.solve_normal_equations(rayleigh_comp)
+
+    def constituents_moving(
+        self, dates, elevation, window, step, rayleigh_comp=1.0, recompute=64
+    ):
+        """Determine the tidal constituents in a window of `window` hours
+        moved along the record `step` hours at a time.
+
+        The node factors and the times of the whole record are made once.
+        The normal equations of the first window are accumulated, and each
+        following window adds the observations that enter it and removes
+        those that leave it, so every observation is only reduced twice.
+        Every `recompute` windows, and whenever a window does not overlap
+        the one before, the normal equations are accumulated from scratch
+        so rounding errors cannot build up.  The normal equations are moved
+        to the first observation of each window, see harmonic.shift_origin,
+        before they are solved, and the phases use V + u of that time, see
+        vau_table, like an analysis of the window alone.  With inferred
+        constituents the nonlinear fit of each window starts from the
+        solution of the window before.  The constituents are those a record
+        `window` hours long can separate, the same for every window.
+
+        Returns
+        -------
+        tuple
+            (starts, keys, amplitude, phase, average, slope, nobs) where
+            starts are the first observation time of each window, or its
+            start if it has no observations, keys the
+            constituents, fitted then inferred, in the column order of the
+            (window, constituent) amplitude and phase (degrees) arrays, and
+            average, slope, and nobs have a value for each window.  Windows
+            without observations are NaN.
+        """
+        dates, elevation = _finite(dates, elevation)
+        if len(dates) == 0:
+            print("No data was found in the input file.")
+            sys.exit()
+        if np.any(np.diff(dates) < np.timedelta64(0)):
+            print("Let's do the time warp again!")
+            print("The date values reverse - they must be constantly increasing.")
+            sys.exit()
+        window = float(window)
+        step = float(step)
+        span = (dates[-1] - dates[0]) / np.timedelta64(1, "h")
+        if span < window:
+            print(f"The record of {span} hours is shorter than the window.")
+            sys.exit()
+
+        # Windows are [start, start + window) and all within the record.
+        offsets = np.arange(0.0, span - window + step * 1e-9, step)
+        starts = dates[0] + np.round(offsets * 3600.0e9).astype("timedelta64[ns]")
+        lows = np.searchsorted(dates, starts)
+        highs = np.searchsorted(
+            dates, starts + np.timedelta64(round(window * 3600.0e9), "ns")
+        )
+
+        self.start_normal_equations(dates[0])
+        (self.speed_dict, self.key_list) = self.select_constituents(
+            window, rayleigh_comp
+        )
+        key_list = list(self.key_list)
+        inferred = self.inferred_keys(key_list) if self.include_inferred else []
+        self.inferred_key_list = inferred
+        keys = key_list + inferred
+        self.candidate_keys = keys
+        speeds = np.array([self.tidal_dict[key]["speed"] for key in keys])
+
+        package = self.astronomic(dates, node_interval=self.node_interval)
+        record_dict = self.tidal_constituents(len(dates), package)
+        ff = [record_dict[key]["FF"] for key in keys]
+        record_dict.clear()
+        hours = (package[9] - self.jd0) * 24
+
+        def accumulate(low, high, sign=1.0):
+            ata, aty = harmonic.normal_equations(
+                hours[low:high],
+                elevation[low:high],
+                speeds,
+                ff=[i[low:high] for i in ff],
+                linear_trend=self.linear_trend,
+            )
+            self.ata += sign * ata
+            self.aty += sign * aty
+            self.nobs += int(sign) * (high - low)
+            self.weight += sign * (high - low)
+            self.total += sign * elevation[low:high].sum()
+
+        H = np.full((len(starts), len(keys)), np.nan)
+        pha = np.full((len(starts), len(keys)), np.nan)
+        average = np.full(len(starts), np.nan)
+        slope = np.full(len(starts), np.nan)
+        nobs = np.zeros(len(starts), dtype=int)
+        low_before = high_before = 0
+        solution = None
+        origin = 0.0
+        for number, (low, high) in enumerate(zip(lows, highs)):
+            if number % recompute == 0 or low >= high_before:
+                self.reset_normal_equations()
+                accumulate(low, high)
+            else:
+                accumulate(high_before, high)
+                accumulate(low_before, low, sign=-1.0)
+            low_before, high_before = low, high
+            nobs[number] = self.nobs
+            if self.nobs == 0:
+                continue
+
+            ata, aty = harmonic.shift_origin(
+                self.ata,
+                self.aty,
+                speeds,
+                hours[low],
+                linear_trend=self.linear_trend,
+            )
+            start = None
+            if solution is not None:
+                # The phases of the window before, moved to this origin.
+                moved = speeds * (hours[low] - origin)
+                start = (
+                    solution[0],
+                    {key: solution[1][key] - moved[i] for i, key in enumerate(keys)},
+                )
+            solution = self.solve_constituents(
+                ata,
+                aty,
+                key_list,
+                inferred,
+                average=self.total / self.weight,
+                start=start,
+            )
+            H[number] = [solution[0][key] for key in keys]
+            pha[number] = [solution[1][key] for key in keys]
+            average[number], slope[number] = solution[2:]
+            origin = hours[low]
+
+        first = dates[np.minimum(lows, len(dates) - 1)]
+        vau = np.full((len(starts), len(keys)), np.nan)
+        solved = nobs > 0
+        vau[solved] = self.vau_table(first[solved], keys)
+        amplitude = np.empty_like(H)
+        phase = np.empty_like(pha)
+        for index, key in enumerate(keys):
+            amplitude[:, index], phase[:, index] = self.amplitude_phase(
+                key, H[:, index], pha[:, index], vau=vau[:, index]
+            )
+        return (
+            np.where(solved, first, starts),
+            keys,
+            amplitude,
+            phase,
+            average,
+            slope,
+            nobs,
+        )
+
+    def result(self):
+        """Return the result of `constituents` as a HarmonicResult."""
+        speed = {
+            key: self.tidal_dict[key]["speed"] * rad2deg
+            for key in self.key_list + self.inferred_key_list
+        }
+        return HarmonicResult.from_dicts(
+            speed,
+            {**self.r, **self.inferred_r},
+            {**self.phase, **self.inferred_phase},
+            self.inferred_key_list,
+            self.fitted_average,
+            slope=self.slope,
+            start=self.dates[0],
+            end=self.dates[-1],
+        )
 
     def cat_dates(self, dates, len_dates):
         """Pad the dates array with dates before and after the data."""
-        interval = dates[1:] - dates[:-1]
-        interval = sorted(interval)
-        interval = interval[len(interval) // 2]
-        cnt = np.arange(1, len_dates + 1) * datetime.timedelta(
-            minutes=interval.seconds / 60
-        )
+        interval = np.diff(dates)
+        interval = np.sort(interval)[len(interval) // 2]
+        cnt = np.arange(1, len_dates + 1) * interval
         bdate = dates[0] - cnt[::-1]
         edate = dates[-1] + cnt
         return np.concatenate((bdate, dates, edate))
@@ -1372,10 +2377,8 @@ class Tappy(Util):
                     np.array([np.average(nelevation[-half_kern:])]),
                 )
             )
-            interval = ndates[1:] - ndates[:-1]
-            interval = sorted(interval)
-            interval = interval[len(interval) // 2]
-            deltat = datetime.timedelta(minutes=interval.seconds / 60)
+            interval = np.diff(ndates)
+            deltat = np.sort(interval)[len(interval) // 2]
             tndates = np.concatenate(
                 (
                     np.array([ndates[0] - blen * deltat]),
@@ -1414,41 +2417,36 @@ class Tappy(Util):
 
     def filters(self, nstype, dates, elevation, pad_type=None):
         """Apply filters to the data."""
-        delta_dt = datetime.timedelta(hours=1)
+        delta_dt = np.timedelta64(1, "h")
 
         # For the time being the filters and padding can only work on hourly data.
 
         # Current implementation:
         # Determines the average hourly elevation.
-        interval = sorted(dates[1:] - dates[:-1])
+        dates = as_datetime64(dates)
+        interval = np.diff(dates)
 
         dates_filled = dates
         nelevation = elevation
         if np.any(interval < delta_dt):
-            # Probably the worst way you can get the average for the hour...
-
-            dt = dates[0]
-            dates_filled = []
-            while dt <= (dates[-1] + datetime.timedelta(minutes=1)):
-                dates_filled.append(dt)
-                dt = dt + delta_dt
-            dates_filled = np.array(dates_filled)
-
-            new_elev = []
-            ind = []
-            for index, d in enumerate(dates_filled):
-                sl = np.logical_and(
-                    dates
-                    > datetime.datetime(d.year, d.month, d.day, d.hour) - delta_dt / 2,
-                    dates <= d + delta_dt / 2,
-                )
-                if len(elevation[sl]) == 0:
-                    continue
-                ind.append(index)
-                new_elev.append(np.average(elevation[sl]))
+            count = (dates[-1] + np.timedelta64(1, "m") - dates[0]) // delta_dt + 1
+            dates_filled = dates[0] + np.arange(count) * delta_dt
+
+            # Average of the elevations in (hour - 30 minutes, date + 30
+            # minutes] for each hourly date, from cumulative sums.
+            lower = np.searchsorted(
+                dates,
+                dates_filled.astype("datetime64[h]") - delta_dt / 2,
+                side="right",
+            )
+            upper = np.searchsorted(dates, dates_filled + delta_dt / 2, side="right")
+            csum = np.concatenate(([0.0], np.cumsum(elevation, dtype="f8")))
+            ind = upper > lower
 
             dates_filled = dates_filled[ind]
-            nelevation = np.array(new_elev)
+            nelevation = (csum[upper[ind]] - csum[lower[ind]]) / (
+                upper[ind] - lower[ind]
+            )
         dates_filled, nelevation = self.missing("fill", dates_filled, nelevation)
         relevation = np.empty_like(nelevation)
 
@@ -1466,7 +2464,7 @@ class Tappy(Util):
                 3) cosine-Lanczos squared filter
                 4) cosine-Lanczos filter
             """
-            from . import filter
+            from .tappy_lib import filter
 
             return dates_filled, filter.fft_lowpass(nelevation, 1 / 30.0, 1 / 40.0)
 
@@ -1698,9 +2696,9 @@ class Tappy(Util):
             p0[-2] = 0.0
             new_dates = np.concatenate(
                 (
-                    [dates_filled[0] - datetime.timedelta(hours=blen)],
+                    [dates_filled[0] - np.timedelta64(blen, "h")],
                     dates_filled,
-                    [dates_filled[-1] + datetime.timedelta(hours=blen)],
+                    [dates_filled[-1] + np.timedelta64(blen, "h")],
                 )
             )
             new_elevation = np.concatenate(
@@ -1812,6 +2810,14 @@ class Tappy(Util):
         if self.linear_trend:
             print("# SLOPE OF REMOVED LINEAR TREND = ", self.slope)
 
+    def print_gaps(self):
+        """Print out the runs of missing values that were filled."""
+        print("\n# FILLED GAPS")
+        print("#%20s %12s" % ("START", "LENGTH"))
+        print("#%20s %12s" % ("=====", "======"))
+        for start, length in zip(isoformat(self.gaps[0]), self.gaps[1]):
+            print(" %20s %12i" % (start, length))
+
     def print_ephemeris_table(self):
         """Print out the ephemeris table."""
         h_schureman = {
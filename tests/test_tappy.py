@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import glob
+import gzip
 import os
 import re
 import shlex
@@ -8,11 +9,18 @@ import shutil
 import subprocess
 import tempfile
 import unittest
+import xml.etree.ElementTree as ET
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal
 
+from tappy.analysis import analyze, analyze_many
+from tappy.incremental import IncrementalAnalysis
+from tappy.moving import analyze_moving
+from tappy.result import HarmonicResult
+
 # directory dance to find tappy.py module in directory above
 # test_tappy.py
 file_loc = Path(__file__).resolve()
@@ -52,6 +60,384 @@ class TappyTest(unittest.TestCase):
             blines = pd.read_csv(Path(f"outts_{i}.dat"))
             assert_frame_equal(alines, blines, atol=1e-4)
 
+    def test_node_interval(self):
+        os.chdir(self.tmpdir)
+        for f in glob.glob("*.dat"):
+            os.remove(f)
+        inputf = self.cwd / "example" / "mayport_florida_8720220_data.txt"
+        _ = subprocess.call(
+            shlex.split(
+                f"tappy analysis {inputf} --outputts --include_inferred --node_interval 24",
+                posix=(os.name == "posix"),
+            )
+        )
+        for i in ["M2", "M8"]:
+            alines = pd.read_csv(self.cwd / "tests" / "output_ts" / f"outts_{i}.dat")
+            blines = pd.read_csv(Path(f"outts_{i}.dat"))
+            assert_frame_equal(alines, blines, atol=1e-4)
+
+    def test_outputts_file(self):
+        os.chdir(self.tmpdir)
+        inputf = self.cwd / "example" / "mayport_florida_8720220_data.txt"
+        _ = subprocess.call(
+            shlex.split(
+                f"tappy analysis {inputf} --outputts_file outts.csv --include_inferred",
+                posix=(os.name == "posix"),
+            )
+        )
+        table = pd.read_csv("outts.csv")
+        for i in ["M2", "M8"]:
+            alines = pd.read_csv(self.cwd / "tests" / "output_ts" / f"outts_{i}.dat")
+            blines = pd.DataFrame(
+                {"Datetime": table["Datetime"], "water_level": table[i]}
+            )
+            assert_frame_equal(alines, blines, atol=1e-4)
+
+    def test_binary_input(self):
+        os.chdir(self.tmpdir)
+        original = pd.read_csv("outts_original.dat", parse_dates=["Datetime"])
+        np.savez(
+            "original.npz",
+            Datetime=original["Datetime"].values,
+            water_level=original["water_level"].values,
+        )
+        for f in glob.glob("*.dat"):
+            os.remove(f)
+        _ = subprocess.call(
+            shlex.split(
+                "tappy analysis original.npz --outputts --include_inferred",
+                posix=(os.name == "posix"),
+            )
+        )
+        for i in ["M2", "M8"]:
+            alines = pd.read_csv(self.cwd / "tests" / "output_ts" / f"outts_{i}.dat")
+            blines = pd.read_csv(Path(f"outts_{i}.dat"))
+            assert_frame_equal(alines, blines, atol=1e-4)
+
+    def test_cache(self):
+        os.chdir(self.tmpdir)
+        inputf = self.cwd / "example" / "mayport_florida_8720220_data.txt"
+        for _ in range(2):
+            for f in glob.glob("*.dat"):
+                os.remove(f)
+            _ = subprocess.call(
+                shlex.split(
+                    f"tappy analysis {inputf} --outputts --include_inferred --cache_dir cache",
+                    posix=(os.name == "posix"),
+                )
+            )
+            self.assertEqual(len(glob.glob("cache/*.npz")), 1)
+            for i in ["M2", "M8"]:
+                alines = pd.read_csv(
+                    self.cwd / "tests" / "output_ts" / f"outts_{i}.dat"
+                )
+                blines = pd.read_csv(Path(f"outts_{i}.dat"))
+                assert_frame_equal(alines, blines, atol=1e-4)
+
+    def test_compressed_input(self):
+        os.chdir(self.tmpdir)
+        inputf = self.cwd / "example" / "tridentpier_florida_8721604_data.txt.gz"
+        def_filename = self.cwd / "example" / "sparse.def"
+        with gzip.open(inputf, "rb") as fpi, open("trident.txt", "wb") as fpo:
+            shutil.copyfileobj(fpi, fpo)
+        for fname, xmlname in [(inputf, "gz.xml"), ("trident.txt", "txt.xml")]:
+            _ = subprocess.call(
+                shlex.split(
+                    f"tappy analysis {fname} --def_filename {def_filename} --outputxml {xmlname} --quiet",
+                    posix=(os.name == "posix"),
+                )
+            )
+        alines = open("gz.xml", encoding="ascii").readlines()
+        blines = open("txt.xml", encoding="ascii").readlines()
+        self.assertEqual(alines, blines)
+
+    def test_analyze(self):
+        os.chdir(self.tmpdir)
+        inputf = self.cwd / "example" / "mayport_florida_8720220_data.txt"
+        _ = subprocess.call(
+            shlex.split(
+                f"tappy analysis {inputf} --outputxml testout.xml",
+                posix=(os.name == "posix"),
+            )
+        )
+        original = pd.read_csv("outts_original.dat", parse_dates=["Datetime"])
+        result = analyze(original.set_index("Datetime")["water_level"])
+        for harmonic in ET.parse("testout.xml").getroot().iter("Harmonic"):
+            name = harmonic.findtext("name")
+            if name == "Z0":
+                self.assertAlmostEqual(
+                    result.average, float(harmonic.findtext("amplitude"))
+                )
+                continue
+            row = result[name]
+            self.assertAlmostEqual(
+                row["amplitude"], float(harmonic.findtext("amplitude"))
+            )
+            self.assertAlmostEqual(
+                row["phase"], float(harmonic.findtext("phaseAngle"))
+            )
+            self.assertEqual(row["inferred"], harmonic.findtext("inferred") == "true")
+        result.save("result.npz")
+        self.assertEqual(HarmonicResult.load("result.npz"), result)
+        result.to_json("result.json")
+        self.assertEqual(HarmonicResult.from_json("result.json"), result)
+        result.to_xml("result.xml")
+        self.assertEqual(HarmonicResult.from_xml("result.xml"), result)
+
+    def test_analyze_many(self):
+        os.chdir(self.tmpdir)
+        original = pd.read_csv("outts_original.dat", parse_dates=["Datetime"])
+        elevation = original["water_level"].values
+        elevations = np.stack([elevation, 2.0 * elevation + 1.0], axis=1)
+        results = analyze_many(original["Datetime"].values, elevations)
+        self.assertEqual(len(results), 2)
+        for series in range(2):
+            result = analyze(original["Datetime"].values, elevations[:, series])
+            np.testing.assert_allclose(
+                results[series].amplitude, result.amplitude, atol=1e-5
+            )
+            self.assertAlmostEqual(results[series].average, result.average)
+
+    def test_analyze_options(self):
+        os.chdir(self.tmpdir)
+        original = pd.read_csv("outts_original.dat", parse_dates=["Datetime"])
+        dates = original["Datetime"].values
+        elevation = original["water_level"].values
+        # The part after the last gap of more than an hour.
+        gap = np.flatnonzero(np.diff(dates) > np.timedelta64(1, "h"))[-1] + 1
+        dates = dates[gap:]
+        elevation = elevation[gap:]
+        result = analyze(dates, elevation, missing_data="fail")
+        np.testing.assert_allclose(
+            result.amplitude, analyze(dates, elevation).amplitude
+        )
+        with self.assertRaises(SystemExit):
+            analyze(
+                original["Datetime"].values,
+                original["water_level"].values,
+                missing_data="fail",
+            )
+        for zero_ts in ["boxcar", "transform"]:
+            result = analyze(dates, elevation, zero_ts=zero_ts)
+            # The low frequency part, including the average, is removed.
+            self.assertLess(abs(result.average), 1e-3)
+            self.assertAlmostEqual(result["M2"]["amplitude"], 0.66, places=1)
+
+    def test_out_of_core(self):
+        os.chdir(self.tmpdir)
+        inputf = self.cwd / "example" / "mayport_florida_8720220_data.txt"
+        for xmlname, extra in [("core.xml", ""), ("stream.xml", "--out_of_core")]:
+            _ = subprocess.call(
+                shlex.split(
+                    f"tappy analysis {inputf} --outputxml {xmlname} --quiet {extra}",
+                    posix=(os.name == "posix"),
+                )
+            )
+        core = HarmonicResult.from_xml("core.xml")
+        stream = HarmonicResult.from_xml("stream.xml")
+        self.assertEqual(core.names.tolist(), stream.names.tolist())
+        # Same fit up to the tolerance of leastsq, which for the smallest
+        # constituents is a noticeable change of phase.
+        np.testing.assert_allclose(
+            stream.amplitude * np.exp(1j * np.deg2rad(stream.phase)),
+            core.amplitude * np.exp(1j * np.deg2rad(core.phase)),
+            atol=1e-5,
+        )
+        self.assertAlmostEqual(stream.average, core.average)
+
+    def test_incremental(self):
+        os.chdir(self.tmpdir)
+        original = pd.read_csv("outts_original.dat", parse_dates=["Datetime"])
+        original = original.dropna()
+        dates = original["Datetime"].values
+        elevation = original["water_level"].values
+        half = len(dates) // 2
+        state = IncrementalAnalysis()
+        state.add(dates[:half], elevation[:half])
+        state.save("state.npz")
+        state = IncrementalAnalysis.load("state.npz")
+        # The overlap with the first half is skipped.
+        result = state.update(dates[half // 2 :], elevation[half // 2 :])
+        self.assertEqual(state.nobs, len(dates))
+        core = analyze(dates, elevation)
+        self.assertEqual(result.names.tolist(), core.names.tolist())
+        np.testing.assert_allclose(
+            result.amplitude * np.exp(1j * np.deg2rad(result.phase)),
+            core.amplitude * np.exp(1j * np.deg2rad(core.phase)),
+            atol=1e-5,
+        )
+
+    def test_xml_without_inferred(self):
+        os.chdir(self.tmpdir)
+        # IHOTC files from other tools need not have the "inferred" element.
+        tree = ET.parse(self.cwd / "tests" / "mayport_baseline.xml")
+        for harmonic in tree.getroot().iter("Harmonic"):
+            harmonic.remove(harmonic.find("inferred"))
+        tree.write("plain.xml")
+        result = HarmonicResult.from_xml("plain.xml")
+        self.assertFalse(result.inferred.any())
+        result.to_xml("result.xml")
+        self.assertEqual(HarmonicResult.from_xml("result.xml"), result)
+        _ = subprocess.call(
+            shlex.split(
+                "tappy prediction plain.xml 2000-01-01T00:00:00 2000-01-02T00:00:00 60 --fname pred.out",
+                posix=(os.name == "posix"),
+            )
+        )
+        self.assertEqual(len(pd.read_csv("pred.out")), 25)
+
+    def test_moving(self):
+        os.chdir(self.tmpdir)
+        original = pd.read_csv("outts_original.dat", parse_dates=["Datetime"])
+        original = original.dropna()
+        dates = original["Datetime"].values
+        elevation = original["water_level"].values
+        # A window in the middle, after windows were added and removed, is
+        # a linear fit without inferred constituents.  With inferred
+        # constituents only the first window starts the nonlinear fit like
+        # analyze, the others start from the window before.
+        for include_inferred, row in [(False, 3), (True, 0)]:
+            table = analyze_moving(
+                dates,
+                elevation,
+                window=360,
+                step=48,
+                include_inferred=include_inferred,
+            )
+            first = table.index.values[row]
+            inside = (dates >= first) & (dates < first + np.timedelta64(360, "h"))
+            core = analyze(
+                dates[inside], elevation[inside], include_inferred=include_inferred
+            )
+            self.assertEqual(table["observations"].iloc[row], inside.sum())
+            amplitude = table[[f"{name}_amplitude" for name in core.names]]
+            phase = table[[f"{name}_phase" for name in core.names]]
+            np.testing.assert_allclose(
+                amplitude.values[row] * np.exp(1j * np.deg2rad(phase.values[row])),
+                core.amplitude * np.exp(1j * np.deg2rad(core.phase)),
+                atol=1e-8,
+            )
+            self.assertAlmostEqual(table["average"].iloc[row], core.average)
+
+    def test_batch_analysis(self):
+        os.chdir(self.tmpdir)
+        example = self.cwd / "example"
+        with open("manifest.csv", "w", encoding="ascii") as fpo:
+            fpo.write("data_filename,def_filename,name\n")
+            fpo.write(f"{example / 'mayport_florida_8720220_data.txt'},,mayport\n")
+            fpo.write(
+                f"{example / 'tridentpier_florida_8721604_data.txt.gz'},"
+                f"{example / 'sparse.def'},trident\n"
+            )
+        _ = subprocess.call(
+            shlex.split(
+                "tappy batch-analysis manifest.csv --output_dir out --output_format json --workers 2",
+                posix=(os.name == "posix"),
+            )
+        )
+        summary = pd.read_csv(Path("out") / "summary.csv")
+        self.assertEqual(list(summary["name"]), ["mayport", "trident"])
+        self.assertEqual(list(summary["status"]), ["ok", "ok"])
+        result = HarmonicResult.from_json(Path("out") / "mayport.json")
+        self.assertEqual(len(result), summary["constituents"][0])
+
+    def test_batch_options(self):
+        os.chdir(self.tmpdir)
+        example = self.cwd / "example"
+        mayport = example / "mayport_florida_8720220_data.txt"
+        trident = example / "tridentpier_florida_8721604_data.txt.gz"
+        with open("manifest.csv", "w", encoding="ascii") as fpo:
+            fpo.write("data_filename,def_filename,name,missing_data,zero_ts\n")
+            # The mayport data has a three hour gap.
+            fpo.write(f"{mayport},,mayport_fail,fail,\n")
+            fpo.write(f"{trident},{example / 'sparse.def'},trident_fail,fail,\n")
+            fpo.write(f"{mayport},,mayport_boxcar,,boxcar\n")
+        _ = subprocess.call(
+            shlex.split(
+                "tappy batch-analysis manifest.csv --output_dir out --workers 1",
+                posix=(os.name == "posix"),
+            )
+        )
+        summary = pd.read_csv(Path("out") / "summary.csv", index_col="name")
+        self.assertEqual(
+            summary.loc["mayport_fail", "status"],
+            "There is a difference of greater than one hour between values",
+        )
+        self.assertEqual(summary.loc["trident_fail", "status"], "ok")
+        self.assertEqual(summary.loc["mayport_boxcar", "status"], "ok")
+        self.assertLess(abs(summary.loc["mayport_boxcar", "average"]), 1e-3)
+
+    def test_batch_output_error(self):
+        os.chdir(self.tmpdir)
+        mayport = self.cwd / "example" / "mayport_florida_8720220_data.txt"
+        with open("manifest.csv", "w", encoding="ascii") as fpo:
+            fpo.write("data_filename,name\n")
+            for name in ["good", "sub/bad", "blocked"]:
+                fpo.write(f"{mayport},{name}\n")
+        # A directory in the way of the output file of "blocked".
+        (Path("out") / "blocked.xml").mkdir(parents=True)
+        _ = subprocess.call(
+            shlex.split(
+                "tappy batch-analysis manifest.csv --output_dir out --workers 2",
+                posix=(os.name == "posix"),
+            )
+        )
+        summary = pd.read_csv(Path("out") / "summary.csv", index_col="name")
+        self.assertEqual(list(summary.index), ["good", "sub/bad", "blocked"])
+        self.assertEqual(summary.loc["good", "status"], "ok")
+        self.assertNotEqual(summary.loc["sub/bad", "status"], "ok")
+        self.assertNotEqual(summary.loc["blocked", "status"], "ok")
+        self.assertTrue((Path("out") / "good.xml").exists())
+
+    def test_phasor(self):
+        os.chdir(self.tmpdir)
+        inputf = self.cwd / "example" / "mayport_florida_8720220_data.txt"
+        _ = subprocess.call(
+            shlex.split(
+                f"tappy analysis {inputf} --outputxml testout.xml --include_inferred",
+                posix=(os.name == "posix"),
+            )
+        )
+        for fname, extra in [("cos.out", ""), ("phasor.out", "--phasor")]:
+            _ = subprocess.call(
+                shlex.split(
+                    f"tappy prediction testout.xml 2000-01-01T00:00:00 2001-01-01T00:00:00 6 --fname {fname} {extra}",
+                    posix=(os.name == "posix"),
+                )
+            )
+        alines = pd.read_csv("cos.out")
+        blines = pd.read_csv("phasor.out")
+        assert_frame_equal(alines, blines, atol=1e-9)
+
+    def test_prediction_fixed(self):
+        # Levels predicted from a checked-in XML by the original tappy.  The
+        # only difference allowed is from the mean longitudes using TT,
+        # less than a millimeter.  V + u from TT instead of UT is off by a
+        # centimeter.
+        os.chdir(self.tmpdir)
+        inputf = self.cwd / "tests" / "mayport_baseline.xml"
+        _ = subprocess.call(
+            shlex.split(
+                f"tappy prediction {inputf} 2000-01-01T00:00:00 2000-03-01T00:00:00 60 --fname pred.out",
+                posix=(os.name == "posix"),
+            )
+        )
+        alines = pd.read_csv("pred.out", index_col="Datetime")
+        expected = {
+            "2000-01-01T00:00:00": 0.581287,
+            "2000-01-01T01:00:00": 0.304677,
+            "2000-01-01T02:00:00": 0.101118,
+            "2000-01-01T03:00:00": 0.044473,
+            "2000-01-21T20:00:00": -0.196429,
+            "2000-02-11T16:00:00": 1.168367,
+            "2000-03-01T00:00:00": 0.653960,
+        }
+        np.testing.assert_allclose(
+            alines.loc[list(expected), "water_level"].values,
+            list(expected.values()),
+            atol=5e-4,
+        )
+
     def test_closure(self):
         os.chdir(self.tmpdir)
         inputf = self.cwd / "example" / "mayport_florida_8720220_data.txt"